@@ -1,5 +1,5 @@
 from app_functions import load_data, show_main_page
 
-tfidf_vec, scaler, model, token_dictionary = load_data()
+classifier = load_data()
 
-show_main_page(tfidf_vec, scaler, model, token_dictionary)
+show_main_page(classifier)
@@ -0,0 +1,8 @@
+import sys
+import os
+
+CLIENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(1, os.path.join(CLIENT_DIR, '..', 'notebooks', 'scripts', 'development'))
+from scoring_service import main
+
+main()
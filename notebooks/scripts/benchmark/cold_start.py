@@ -0,0 +1,41 @@
+import argparse
+import statistics
+
+from import_time import time_in_subprocess
+
+# The preprocessing module is needed by both and imported before the timer starts, so only the model part is timed
+SETUP = "import warnings; warnings.simplefilter('ignore'); import preprocessing"
+
+LOAD_STATEMENTS = {
+    "pickled artifacts (TicketClassifier.from_directory)":
+        "from classifier import TicketClassifier; classifier = TicketClassifier.from_directory()",
+    "model bundle (load_bundle)":
+        "from model_bundle import load_bundle; classifier = load_bundle()",
+}
+
+FIRST_SCORE = "classifier.predict_proba(['Where is my order? I ordered 3 weeks ago'], translate=False)"
+
+
+def run(repeats):
+    """
+    Function which measures, in fresh processes, how long it takes to import and load the model from the pickled
+    artifacts and from the model bundle, and how long it takes to load it and score a first ticket.
+    :param repeats: How many processes to start for each measurement. The median is reported.
+    :return: A dictionary of measurement name -> median duration in seconds.
+    """
+    results = dict()
+    for name, statement in LOAD_STATEMENTS.items():
+        results["load " + name] = statistics.median(
+            time_in_subprocess(statement, setup=SETUP) for _ in range(repeats))
+        results["load and first score " + name] = statistics.median(
+            time_in_subprocess(statement + "\n" + FIRST_SCORE, setup=SETUP) for _ in range(repeats))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cold start of the model, pickles against bundle.")
+    parser.add_argument("--repeats", type=int, default=5, help="Number of fresh processes per measurement.")
+    args = parser.parse_args()
+
+    for name, seconds in run(args.repeats).items():
+        print("{:<75} {:8.3f} s".format(name, seconds))
@@ -0,0 +1,281 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from import_time import DEVELOPMENT_DIR
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+STAGES = ["expand_contractions", "token_loop", "email_url_regexes", "stop_words", "stemming", "preprocess_raw_text",
+          "preprocess_text_series", "tfidf_transform", "predict_proba", "translate_series_to_en"]
+
+# Stages which work on a whole batch of tickets at once. Their latency is measured per batch.
+BATCH_STAGES = {"preprocess_text_series", "tfidf_transform", "predict_proba", "translate_series_to_en"}
+
+WORDS = ["order", "parcel", "delivery", "refund", "return", "size", "shoes", "jacket", "tracking", "week", "still",
+         "received", "never", "arrived", "please", "help", "wrong", "item", "exchange", "payment", "account", "code",
+         "discount", "cancel", "address", "change", "thanks", "hello", "when", "where", "status", "waiting", "email"]
+
+CONTRACTIONS = ["I'm", "don't", "can't", "haven't", "it's", "won't", "I've", "didn't", "you're", "isn't"]
+
+
+class StubTranslationBackend:
+    """
+    Local translation backend for the benchmark: every text comes back unchanged, so translation runs offline and only
+    the language detection and the client overhead are measured.
+    """
+
+    def translate_to_en(self, text):
+        return text
+
+    async def translate_batch(self, texts, src, dest):
+        return list(texts)
+
+
+def build_corpus(size, seed=0):
+    """
+    Function which builds a fixed corpus of tickets: half are tickets of data/technical_test_data.json, half are
+    synthetic tickets with placeholder tokens, emails, URLs, contractions and numbers. Their number of words follows
+    the one of the real tickets, and one synthetic ticket in a hundred is ten times longer.
+    :param size: Number of tickets.
+    :param seed: Seed of the generator. The same size and seed always give the same corpus.
+    :return: A list of ticket texts.
+    """
+    with open(os.path.join(DATA_DIR, "technical_test_data.json"), "r", encoding="utf-8") as ticket_file:
+        real_tickets = [record["Description"] or "" for record in json.load(ticket_file)]
+    with open(os.path.join(DATA_DIR, "token_dictionary.json"), "r") as token_dict_file:
+        tokens = sorted(json.load(token_dict_file))
+
+    random_state = np.random.RandomState(seed)
+    word_counts = [len(ticket.split()) for ticket in real_tickets]
+    corpus = []
+    for position in range(size):
+        if position % 2 == 0:
+            corpus.append(real_tickets[random_state.randint(len(real_tickets))])
+            continue
+        word_count = max(3, word_counts[random_state.randint(len(word_counts))])
+        if random_state.uniform() < 0.01:
+            word_count *= 10
+        words = []
+        for _ in range(word_count):
+            kind = random_state.uniform()
+            if kind < 0.08:
+                words.append(tokens[random_state.randint(len(tokens))])
+            elif kind < 0.13:
+                words.append(CONTRACTIONS[random_state.randint(len(CONTRACTIONS))])
+            elif kind < 0.16:
+                words.append(str(random_state.randint(1, 100000)))
+            elif kind < 0.17:
+                words.append("john.doe{}@example.com".format(random_state.randint(100)))
+            elif kind < 0.18:
+                words.append("https://shop.example.com/orders/{}?ref=mail".format(random_state.randint(100000)))
+            else:
+                words.append(WORDS[random_state.randint(len(WORDS))])
+        corpus.append(" ".join(words).capitalize() + "?")
+    return corpus
+
+
+def get_stage_function(stage):
+    """
+    Function which prepares a stage: its inputs are computed before the timer starts, so only the stage is measured.
+    :param stage: One of STAGES.
+    :return: A function taking a list of raw ticket texts and returning the function to time on them, which itself
+    takes one ticket, or one batch for the stages of BATCH_STAGES.
+    """
+    import pandas as pd
+    import preprocessing
+    from async_translation import AsyncTranslationClient
+    from model_bundle import load_bundle
+    from translation import CachedTranslator, TranslationCache, set_default_translator
+
+    with open(os.path.join(DATA_DIR, "token_dictionary.json"), "r") as token_dict_file:
+        token_matcher = preprocessing.TokenMatcher(json.load(token_dict_file))
+
+    if stage == "expand_contractions":
+        return lambda texts: preprocessing.expand_contractions
+    if stage == "token_loop":
+        return lambda texts: token_matcher.count_and_strip
+    if stage == "email_url_regexes":
+        return lambda texts: lambda text: preprocessing.URL_REGEX.subn("", preprocessing.EMAIL_REGEX.subn("", text)[0])
+    if stage == "stop_words":
+        return lambda texts: lambda text: [word for word in text.lower().split() if word not in
+                                           preprocessing.STOP_WORDS]
+    if stage == "stemming":
+        def prepare_stemming(texts):
+            # A new memoized stemmer, so the words of the corpus are not already remembered
+            stem = preprocessing.MemoizedStemmer().stem
+            return lambda text: [stem(word) for word in text.lower().split()]
+        return prepare_stemming
+    if stage == "preprocess_raw_text":
+        return lambda texts: lambda text: preprocessing.preprocess_raw_text(text, token_matcher,
+                                                                           preprocessing.get_stemmer())
+    if stage == "preprocess_text_series":
+        return lambda texts: lambda batch: preprocessing.preprocess_text_series(pd.Series(batch), token_matcher)
+    if stage == "tfidf_transform":
+        def prepare_tfidf(texts):
+            from classifier import TicketClassifier
+
+            vectorizer = TicketClassifier.from_directory(DATA_DIR).tfidf_vec
+            cleaned_texts = dict(zip(texts, preprocessing.preprocess_text_batch(texts, token_matcher)[0]))
+            return lambda batch: vectorizer.transform([cleaned_texts[text] for text in batch])
+        return prepare_tfidf
+    if stage == "predict_proba":
+        def prepare_scorer(texts):
+            scorer = load_bundle()
+            return lambda batch: scorer.predict_proba(batch, translate=False)
+        return prepare_scorer
+    if stage == "translate_series_to_en":
+        def prepare_translation(texts):
+            # An in-memory cache, so every text is detected and sent to the stub instead of read from the disk cache
+            set_default_translator(CachedTranslator(StubTranslationBackend(), TranslationCache()))
+            client = AsyncTranslationClient(StubTranslationBackend())
+            return lambda batch: preprocessing.translate_series_to_en(pd.Series(batch, dtype=object), client)
+        return prepare_translation
+    raise ValueError("Unknown stage: {}".format(stage))
+
+
+def measure(stage, size, batch_size=64, seed=0):
+    """
+    Function which runs a stage on the corpus of a given size, in the current process.
+    :param stage: One of STAGES.
+    :param size: Number of tickets of the corpus.
+    :param batch_size: Number of tickets per batch for the stages of BATCH_STAGES.
+    :param seed: Seed of the corpus.
+    :return: A dictionary with the throughput in tickets per second, the latency percentiles of a ticket (or of a batch)
+    in milliseconds, the peak RSS of the process and the part of it added by the stage, in MiB.
+    """
+    corpus = build_corpus(size, seed)
+    run_stage = get_stage_function(stage)(corpus + build_corpus(16, seed + 1))
+    if stage in BATCH_STAGES:
+        units = [corpus[start:start + batch_size] for start in range(0, len(corpus), batch_size)]
+        warm_up_units = [build_corpus(16, seed + 1)]
+    else:
+        units = corpus
+        warm_up_units = build_corpus(16, seed + 1)
+    # Lazy initializations, like compiling the regexes or loading the spelling dictionaries, are not measured
+    for unit in warm_up_units:
+        run_stage(unit)
+
+    peak_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    latencies = np.empty(len(units))
+    start = time.perf_counter()
+    for position, unit in enumerate(units):
+        unit_start = time.perf_counter()
+        run_stage(unit)
+        latencies[position] = time.perf_counter() - unit_start
+    seconds = time.perf_counter() - start
+    peak_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    latencies_ms = latencies * 1000
+    # ru_maxrss is in KiB on Linux
+    return {"stage": stage, "size": size, "unit": "batch of {}".format(batch_size) if stage in BATCH_STAGES else
+            "ticket", "seconds": seconds, "tickets_per_second": size / seconds,
+            "latency_ms": {"p50": float(np.percentile(latencies_ms, 50)),
+                           "p90": float(np.percentile(latencies_ms, 90)),
+                           "p99": float(np.percentile(latencies_ms, 99)), "max": float(latencies_ms.max())},
+            "peak_rss_mib": peak_after / 1024, "peak_added_mib": (peak_after - peak_before) / 1024}
+
+
+def measure_in_subprocess(stage, size, batch_size=64, seed=0):
+    """
+    Function which runs measure in a fresh python process, so that the stages do not share caches or peak memory.
+    :return: The dictionary returned by measure.
+    """
+    process_env = dict(os.environ, PYTHONPATH=DEVELOPMENT_DIR)
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--single", stage, "--sizes", str(size),
+                             "--batch-size", str(batch_size), "--seed", str(seed)],
+                            env=process_env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def run(stages, sizes, batch_size=64, seed=0):
+    """
+    Function which measures every stage on every corpus size, each in its own process.
+    :return: A dictionary with the environment and the list of measurements.
+    """
+    return {"environment": {"python": platform.python_version(), "platform": platform.platform(),
+                            "cpu_count": os.cpu_count()},
+            "results": [measure_in_subprocess(stage, size, batch_size, seed) for size in sizes for stage in stages]}
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Function which compares measurements against a baseline and flags the regressions: a throughput lower, or a p99
+    latency or a peak RSS added by the stage higher, by more than the tolerance.
+    :param results: The output of run.
+    :param baseline: The output of a previous run.
+    :param tolerance: The relative change accepted, i.e. 0.2 for 20%.
+    :return: A list of messages, one per regression. Empty if there is none.
+    """
+    baseline_results = {(result["stage"], result["size"]): result for result in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        previous = baseline_results.get((result["stage"], result["size"]))
+        if previous is None:
+            continue
+        name = "{} on {} tickets".format(result["stage"], result["size"])
+        if result["tickets_per_second"] < previous["tickets_per_second"] * (1 - tolerance):
+            regressions.append("{}: {:.0f} tickets/s instead of {:.0f}".format(
+                name, result["tickets_per_second"], previous["tickets_per_second"]))
+        if result["latency_ms"]["p99"] > previous["latency_ms"]["p99"] * (1 + tolerance):
+            regressions.append("{}: p99 of {:.3f} ms instead of {:.3f}".format(
+                name, result["latency_ms"]["p99"], previous["latency_ms"]["p99"]))
+        # Small differences of the memory added are noise, so they are only flagged above 10 MiB
+        memory_limit = max(previous["peak_added_mib"] * (1 + tolerance), previous["peak_added_mib"] + 10)
+        if result["peak_added_mib"] > memory_limit:
+            regressions.append("{}: {:.1f} MiB added to the peak RSS instead of {:.1f}".format(
+                name, result["peak_added_mib"], previous["peak_added_mib"]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the throughput, latency and memory of every preprocessing "
+                                                 "and scoring stage on corpora of growing size.")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma separated stages to measure.")
+    parser.add_argument("--sizes", default="100,1000,10000", help="Comma separated numbers of tickets.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Number of tickets per batch of the batch stages.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the corpora.")
+    parser.add_argument("--output", default=None, help="Where to write the results as json.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="The results to compare with. Default is "
+                                                                          "baseline.json next to this script.")
+    parser.add_argument("--save-baseline", action="store_true", help="Save the results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change flagged as a regression.")
+    parser.add_argument("--single", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    if args.single is not None:
+        warnings.simplefilter("ignore")
+        print(json.dumps(measure(args.single, sizes[0], args.batch_size, args.seed)))
+        sys.exit(0)
+
+    results = run(args.stages.split(","), sizes, args.batch_size, args.seed)
+    print("{:<24} {:>7} {:>12} {:>10} {:>10} {:>10} {:>9}".format("stage", "tickets", "tickets/s", "p50 ms", "p99 ms",
+                                                                  "RSS MiB", "added"))
+    for result in results["results"]:
+        print("{:<24} {:>7} {:>12.0f} {:>10.3f} {:>10.3f} {:>10.1f} {:>9.1f}".format(
+            result["stage"], result["size"], result["tickets_per_second"], result["latency_ms"]["p50"],
+            result["latency_ms"]["p99"], result["peak_rss_mib"], result["peak_added_mib"]))
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=1)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=1)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,60 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+DEVELOPMENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "development")
+
+
+def time_in_subprocess(statement, setup="", env=None):
+    """
+    Function which runs a statement in a fresh python process and returns how long it took, so that nothing imported
+    or cached by a previous run is reused.
+    :param statement: The python statement to time.
+    :param setup: Python code run before the timer starts.
+    :param env: Extra environment variables for the process.
+    :return: The duration of the statement in seconds.
+    """
+    code = ("import time\n{}\nstart = time.perf_counter()\n{}\n"
+            "print(time.perf_counter() - start)").format(setup, statement)
+    process_env = dict(os.environ, PYTHONPATH=DEVELOPMENT_DIR, **(env or {}))
+    output = subprocess.run([sys.executable, "-c", code], env=process_env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def run(repeats, index_dir):
+    """
+    Function which measures the import time of preprocessing.py and the cost of the first correct_spelling call, both
+    when the SymSpell index has to be built and when the prebuilt index is already on disk.
+    :param repeats: How many processes to start for each measurement. The median is reported.
+    :param index_dir: Directory used for the prebuilt index. It is removed and rebuilt by the cold measurement.
+    :return: A dictionary of measurement name -> median duration in seconds.
+    """
+    env = {"SYMSPELL_INDEX_DIR": index_dir}
+    results = dict()
+    results["import preprocessing"] = statistics.median(
+        time_in_subprocess("import preprocessing", env=env) for _ in range(repeats))
+    results["eager SymSpell build (previous import cost)"] = statistics.median(
+        time_in_subprocess("spelling.build_sym_spell()", setup="import spelling", env=env) for _ in range(repeats))
+    results["first correct_spelling, no index on disk"] = time_in_subprocess(
+        "import shutil; shutil.rmtree(spelling.DEFAULT_INDEX_DIR, ignore_errors=True); "
+        "preprocessing.correct_spelling('reciept')", setup="import spelling, preprocessing", env=env)
+    results["first correct_spelling, prebuilt index"] = statistics.median(
+        time_in_subprocess("preprocessing.correct_spelling('reciept')", setup="import preprocessing", env=env)
+        for _ in range(repeats))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the start up cost of the preprocessing module.")
+    parser.add_argument("--repeats", type=int, default=5, help="Number of fresh processes per measurement.")
+    parser.add_argument("--index-dir", default=None,
+                        help="Where to build the SymSpell index. Default is a temporary directory.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        measurements = run(args.repeats, args.index_dir or os.path.join(tmp_dir, "spelling_index"))
+    for name, seconds in measurements.items():
+        print("{:<50} {:8.3f} s".format(name, seconds))
@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from import_time import DEVELOPMENT_DIR
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+
+def load_texts(limit=None):
+    """
+    :param limit: Maximum number of texts. Default is all of them.
+    :return: The ticket texts of data/labeled_tickets.csv, used as request bodies.
+    """
+    with open(os.path.join(DATA_DIR, "labeled_tickets.csv"), "r", encoding="utf-8", newline="") as ticket_file:
+        return [row["Description"] for row in itertools.islice(csv.DictReader(ticket_file), limit)]
+
+
+async def post_json(reader, writer, host, path, payload):
+    """
+    Function which sends one POST request with a json body on a kept alive connection and reads the response.
+    :param reader: The asyncio.StreamReader of the connection.
+    :param writer: The asyncio.StreamWriter of the connection.
+    :param host: The host header.
+    :param path: The path of the request.
+    :param payload: The body, encoded as json.
+    :return: The status code and the decoded body of the response.
+    """
+    body = json.dumps(payload).encode("utf-8")
+    writer.write("POST {} HTTP/1.1\r\nHost: {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n"
+                 .format(path, host, len(body)).encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def run_load(url, texts, connections, requests, texts_per_request=1):
+    """
+    Function which sends requests to /classify from several connections at once, each one waiting for its response
+    before sending the next request.
+    :param url: The url of the service, i.e. http://127.0.0.1:8000.
+    :param texts: The texts to send, cycled through.
+    :param connections: Number of concurrent connections.
+    :param requests: Total number of requests.
+    :param texts_per_request: Number of texts in every request. 1 sends {"text": ...}, more sends {"texts": [...]}.
+    :return: A dictionary with the throughput, the client side latency percentiles and the number of failed requests.
+    """
+    address = urlsplit(url)
+    text_cycle = itertools.cycle(texts)
+    remaining = itertools.count()
+    latencies = []
+    failures = []
+
+    async def client():
+        reader, writer = await asyncio.open_connection(address.hostname, address.port)
+        try:
+            while next(remaining) < requests:
+                batch = [next(text_cycle) for _ in range(texts_per_request)]
+                payload = {"text": batch[0]} if texts_per_request == 1 else {"texts": batch}
+                start = time.perf_counter()
+                status, _ = await post_json(reader, writer, address.netloc, "/classify", payload)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    failures.append(status)
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(connections)])
+    elapsed = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1000
+    return {"requests": len(latencies), "failures": len(failures), "seconds": elapsed,
+            "requests_per_second": len(latencies) / elapsed,
+            "texts_per_second": len(latencies) * texts_per_request / elapsed,
+            "latency_ms": {"p{}".format(quantile): float(np.percentile(latencies_ms, quantile))
+                           for quantile in (50, 90, 99)}}
+
+
+async def get_json(url, path):
+    """
+    :param url: The url of the service.
+    :param path: The path to GET, i.e. /metrics.
+    :return: The decoded body of the response.
+    """
+    address = urlsplit(url)
+    reader, writer = await asyncio.open_connection(address.hostname, address.port)
+    writer.write("GET {} HTTP/1.1\r\nHost: {}\r\nConnection: close\r\n\r\n".format(path, address.netloc).encode())
+    response = await reader.read()
+    writer.close()
+    return json.loads(response.split(b"\r\n\r\n", 1)[1])
+
+
+def spawn_service(port, service_arguments):
+    """
+    Function which starts the scoring service in another process and waits until it listens.
+    :param port: The port for the service.
+    :param service_arguments: Extra command line arguments for scoring_service.py.
+    :return: The subprocess.Popen of the service.
+    """
+    process = subprocess.Popen([sys.executable, os.path.join(DEVELOPMENT_DIR, "scoring_service.py"), "--port",
+                                str(port)] + service_arguments, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("Listening"):
+        process.kill()
+        raise RuntimeError("The service did not start")
+    return process
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the /classify endpoint of the scoring service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765", help="The url of the service.")
+    parser.add_argument("--spawn", action="store_true",
+                        help="Start the service on the port of --url, without translation, for the test.")
+    parser.add_argument("--max-wait-ms", default="5", help="Micro-batch wait window of the spawned service.")
+    parser.add_argument("--connections", type=int, default=64, help="Number of concurrent connections.")
+    parser.add_argument("--requests", type=int, default=5000, help="Total number of requests.")
+    parser.add_argument("--texts-per-request", type=int, default=1, help="Number of texts in every request.")
+    args = parser.parse_args()
+
+    service = spawn_service(urlsplit(args.url).port, ["--no-translate", "--max-wait-ms", args.max_wait_ms]) \
+        if args.spawn else None
+    try:
+        results = asyncio.run(run_load(args.url, load_texts(), args.connections, args.requests,
+                                       args.texts_per_request))
+        results["server"] = asyncio.run(get_json(args.url, "/metrics"))
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+    print(json.dumps(results, indent=1))
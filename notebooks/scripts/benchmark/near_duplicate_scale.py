@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from import_time import DEVELOPMENT_DIR
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+
+def make_synthetic_cleaned_texts(size, random_state=42):
+    """
+    Function which builds any number of cleaned texts from the labeled tickets. Every synthetic text is a labeled
+    ticket missing a fifth of its words plus two words of other tickets, so most of them are not near-duplicates.
+    :param size: Number of texts.
+    :param random_state: Seed of the generator.
+    :return: A list of cleaned texts.
+    """
+    import pandas as pd
+    from experiment_grid import preprocess_cached
+
+    tickets_df = pd.read_csv(os.path.join(DATA_DIR, "labeled_tickets.csv"), index_col=0)
+    with open(os.path.join(DATA_DIR, "token_dictionary.json"), "r") as token_dict_file:
+        token_dictionary = json.load(token_dict_file)
+    cleaned_texts, _ = preprocess_cached(tickets_df["Description"], token_dictionary)
+
+    random_state = np.random.RandomState(random_state)
+    words = np.array(" ".join(cleaned_texts).split())
+    texts = []
+    for source in random_state.randint(0, len(cleaned_texts), size=size):
+        kept_words = [word for word in cleaned_texts[source].split() if random_state.uniform() > 0.2]
+        texts.append(" ".join(kept_words + list(random_state.choice(words, 2))))
+    return texts
+
+
+def measure(size, queries=1000):
+    """
+    Function which builds a NearDuplicateIndex of synthetic texts, then queries it with near-duplicates of some of them:
+    a text of at least 10 words with one more word.
+    :param size: Number of texts of the index.
+    :param queries: Number of queries.
+    :return: A dictionary with the build throughput, the query latencies, the share of queries finding the text they
+    were made from and the peak memory added by the index.
+    """
+    from near_duplicates import NearDuplicateIndex
+
+    texts = make_synthetic_cleaned_texts(size)
+    random_state = np.random.RandomState(0)
+    long_positions = [position for position, text in enumerate(texts) if len(text.split()) >= 10]
+    probe_positions = random_state.choice(long_positions, size=min(queries, len(long_positions)), replace=False)
+    probes = [texts[position] + " " + texts[random_state.randint(size)].split()[0] for position in probe_positions]
+
+    index = NearDuplicateIndex()
+    peak_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for position, text in enumerate(texts):
+        index.add(text, position)
+    build_seconds = time.perf_counter() - start
+    peak_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    latencies = []
+    found = 0
+    for position, probe in zip(probe_positions, probes):
+        start = time.perf_counter()
+        matches = index.query(probe)
+        latencies.append(time.perf_counter() - start)
+        found += any(value == position for _, _, value in matches)
+    return {"size": size, "build_seconds": build_seconds, "inserts_per_second": size / build_seconds,
+            "query_p50_ms": float(np.percentile(latencies, 50)) * 1000,
+            "query_p99_ms": float(np.percentile(latencies, 99)) * 1000,
+            "recall": found / len(probes), "peak_added_mib": (peak_after - peak_before) / 1024}
+
+
+def measure_in_subprocess(size, queries=1000):
+    """
+    Function which runs measure in a fresh python process, so that the peak memory of a run does not hide the next one.
+    :return: The dictionary returned by measure.
+    """
+    process_env = dict(os.environ, PYTHONPATH=DEVELOPMENT_DIR)
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--single", "--sizes", str(size),
+                             "--queries", str(queries)], env=process_env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the build and query throughput of the near-duplicate index "
+                                                 "of near_duplicates.py on growing synthetic ticket sets.")
+    parser.add_argument("--sizes", default="10000,100000,400000", help="Comma separated numbers of tickets.")
+    parser.add_argument("--queries", type=int, default=1000, help="Number of near-duplicate queries per size.")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    if args.single:
+        warnings.simplefilter("ignore")
+        print(json.dumps(measure(sizes[0], args.queries)))
+    else:
+        print("{:>7} {:>13} {:>12} {:>12} {:>7} {:>14}".format("tickets", "inserts per s", "query p50 ms",
+                                                              "query p99 ms", "recall", "peak added MiB"))
+        for size in sizes:
+            result = measure_in_subprocess(size, args.queries)
+            print("{:>7} {:>13.0f} {:>12.3f} {:>12.3f} {:>7.3f} {:>14.1f}".format(
+                size, result["inserts_per_second"], result["query_p50_ms"], result["query_p99_ms"], result["recall"],
+                result["peak_added_mib"]))
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from import_time import DEVELOPMENT_DIR
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+METHODS = ["imblearn SMOTEENN", "SparseSMOTEENN", "HardNegativeUnderSampler", "ClassWeighting"]
+
+
+def make_synthetic_tickets(size, random_state=42):
+    """
+    Function which builds a training matrix of any size from the labeled tickets, with the same class balance. Every
+    synthetic ticket is a labeled ticket missing a fifth of its words plus two words of other tickets, and keeps its
+    manual features.
+    :param size: Number of tickets.
+    :param random_state: Seed of the generator.
+    :return: The matrix built like in notebook 2, i.e. tf-idf values followed by scaled manual features, and the labels.
+    """
+    import pandas as pd
+    from experiment_grid import build_feature_matrix, preprocess_cached
+
+    tickets_df = pd.read_csv(os.path.join(DATA_DIR, "labeled_tickets.csv"), index_col=0)
+    with open(os.path.join(DATA_DIR, "token_dictionary.json"), "r") as token_dict_file:
+        token_dictionary = json.load(token_dict_file)
+    cleaned_texts, manual_features = preprocess_cached(tickets_df["Description"], token_dictionary)
+    labels = tickets_df["is_about_order_status"].to_numpy()
+
+    random_state = np.random.RandomState(random_state)
+    words = np.array(" ".join(cleaned_texts).split())
+    sources = random_state.randint(0, len(cleaned_texts), size=size)
+    texts = []
+    for source in sources:
+        source_words = cleaned_texts[source].split()
+        kept_words = [word for word in source_words if random_state.uniform() > 0.2]
+        texts.append(" ".join(kept_words + list(random_state.choice(words, 2))))
+    return build_feature_matrix(texts, manual_features[sources]), labels[sources]
+
+
+def measure(method, size, n_jobs=1):
+    """
+    Function which rebalances a synthetic ticket set with one method, in the current process.
+    :param method: One of METHODS.
+    :param size: Number of tickets.
+    :param n_jobs: Number of jobs of the methods of rebalancing.py.
+    :return: A dictionary with the duration, the peak memory added by the rebalancing and the shape of the output.
+    """
+    from imblearn.combine import SMOTEENN
+    from rebalancing import ClassWeighting, HardNegativeUnderSampler, SparseSMOTEENN
+
+    samplers = {"imblearn SMOTEENN": lambda: SMOTEENN(random_state=42),
+                "SparseSMOTEENN": lambda: SparseSMOTEENN(random_state=42, n_jobs=n_jobs),
+                "HardNegativeUnderSampler": lambda: HardNegativeUnderSampler(random_state=42, n_jobs=n_jobs),
+                "ClassWeighting": lambda: ClassWeighting()}
+    matrix, labels = make_synthetic_tickets(size)
+    sampler = samplers[method]()
+    # ru_maxrss is the peak of the whole process in KiB, so the peak before the rebalancing is subtracted
+    peak_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    resampled_matrix, resampled_labels = sampler.fit_resample(matrix, labels)
+    seconds = time.perf_counter() - start
+    peak_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"method": method, "size": size, "seconds": seconds, "peak_added_mib": (peak_after - peak_before) / 1024,
+            "input_nnz": int(matrix.nnz), "output_rows": int(resampled_matrix.shape[0]),
+            "output_positive_rows": int(np.count_nonzero(resampled_labels == 1))}
+
+
+def measure_in_subprocess(method, size, n_jobs=1):
+    """
+    Function which runs measure in a fresh python process, so that the peak memory of a run does not hide the next one.
+    :return: The dictionary returned by measure.
+    """
+    process_env = dict(os.environ, PYTHONPATH=DEVELOPMENT_DIR)
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--single", method, "--sizes", str(size),
+                             "--jobs", str(n_jobs)], env=process_env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the rebalancing methods of rebalancing.py with imblearn's "
+                                                 "SMOTEENN on growing synthetic ticket sets.")
+    parser.add_argument("--sizes", default="2000,8000,32000", help="Comma separated numbers of tickets.")
+    parser.add_argument("--methods", default=",".join(METHODS), help="Comma separated methods to compare.")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of jobs of the methods of rebalancing.py.")
+    parser.add_argument("--single", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    if args.single is not None:
+        warnings.simplefilter("ignore")
+        print(json.dumps(measure(args.single, sizes[0], args.jobs)))
+    else:
+        print("{:<26} {:>7} {:>9} {:>14} {:>12}".format("method", "tickets", "seconds", "peak added MiB",
+                                                         "output rows"))
+        for size in sizes:
+            for method in args.methods.split(","):
+                result = measure_in_subprocess(method, size, args.jobs)
+                print("{:<26} {:>7} {:>9.2f} {:>14.1f} {:>12}".format(method, size, result["seconds"],
+                                                                      result["peak_added_mib"],
+                                                                      result["output_rows"]))
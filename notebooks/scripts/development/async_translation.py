@@ -0,0 +1,266 @@
+import asyncio
+import functools
+import inspect
+import random
+import threading
+from collections import defaultdict
+
+from googletrans import Translator
+
+from language_detection import get_language_detector
+from translation import MISSING
+
+
+# googletrans sends one HTTP request per text, even when given a list. The texts of a batch are joined with this
+# separator into a single request instead, and the translation is split on its marker
+BATCH_SEPARATOR = "\n|||\n"
+BATCH_SEPARATOR_MARK = "|||"
+# Maximum number of characters the service accepts in one request
+MAX_REQUEST_CHARS = 5000
+
+
+class GoogleTranslateAsyncBackend:
+    """
+    Asynchronous translation backend on top of googletrans. The texts of a batch are joined into as few requests as
+    the request size limit allows, and the translation is split back into texts. If the service does not keep the
+    separators, i.e. because a text contains one, the texts of that request are translated one by one.
+    Blocking versions of googletrans are run in a thread, so they do not block the event loop.
+    Any object with an async translate_batch(texts, src, dest) method can be used as a backend instead, i.e. an
+    in-process fake backend in tests.
+    """
+
+    def __init__(self, translator=None, max_request_chars=MAX_REQUEST_CHARS):
+        """
+        :param translator: Object with the translate(text, src, dest) method of googletrans.Translator, returning an
+        object with a text attribute. Default is a new googletrans.Translator.
+        :param max_request_chars: Maximum number of characters of one joined request.
+        """
+        self._translator = translator if translator is not None else Translator()
+        self.max_request_chars = max_request_chars
+
+    async def _translate_text(self, text, src, dest):
+        if inspect.iscoroutinefunction(self._translator.translate):
+            result = await self._translator.translate(text, src=src, dest=dest)
+        else:
+            result = await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(self._translator.translate, text, src=src, dest=dest))
+        return result.text
+
+    def _request_groups(self, texts):
+        groups = []
+        group_chars = 0
+        for text in texts:
+            text_chars = len(text) + len(BATCH_SEPARATOR)
+            if not groups or group_chars + text_chars > self.max_request_chars:
+                groups.append([])
+                group_chars = 0
+            groups[-1].append(text)
+            group_chars += text_chars
+        return groups
+
+    async def _translate_group(self, texts, src, dest):
+        if len(texts) > 1:
+            translated = await self._translate_text(BATCH_SEPARATOR.join(texts), src, dest)
+            parts = translated.split(BATCH_SEPARATOR_MARK)
+            if len(parts) == len(texts):
+                return [part.strip() for part in parts]
+        return list(await asyncio.gather(*[self._translate_text(text, src, dest) for text in texts]))
+
+    async def translate_batch(self, texts, src, dest):
+        """
+        Translate a batch of texts.
+        :param texts: A list of texts, all in the src language.
+        :param src: The language of the texts.
+        :param dest: The language to translate into.
+        :return: A list of translated texts, in the same order as texts.
+        """
+        results = await asyncio.gather(
+            *[self._translate_group(group, src, dest) for group in self._request_groups(list(texts))])
+        return [text for group in results for text in group]
+
+
+class RateLimiter:
+    """
+    Asynchronous limiter which lets at most `rate` requests per second through for each key (i.e. each language).
+    """
+
+    def __init__(self, rate):
+        """
+        :param rate: Maximum number of requests per second for one key. None means no limit.
+        """
+        self.rate = rate
+        self._next_slot = defaultdict(float)
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, key):
+        """
+        Wait until a request for key is allowed.
+        :param key: The key to rate limit, i.e. the language of the request.
+        """
+        if self.rate is None:
+            return
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            slot = max(now, self._next_slot[key])
+            self._next_slot[key] = slot + 1 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class AsyncTranslationClient:
+    """
+    Translation client which sends batches of texts concurrently, with a bound on the number of requests in flight,
+    a rate limit per language and retries with exponential backoff when a request fails.
+    """
+
+    def __init__(self, backend=None, max_concurrency=8, batch_size=16, max_retries=3, backoff=0.5,
+                 requests_per_second=None, detector=None):
+        """
+        :param backend: Object with an async translate_batch(texts, src, dest) method. Default is
+        GoogleTranslateAsyncBackend.
+        :param max_concurrency: Maximum number of requests in flight at the same time.
+        :param batch_size: Maximum number of texts sent in one request.
+        :param max_retries: Number of times a failed request is retried before the error is raised.
+        :param backoff: Seconds to wait before the first retry. The wait doubles with every retry.
+        :param requests_per_second: Maximum number of requests per second for each non English language. None means
+        no limit.
+        :param detector: The LanguageDetector deciding which texts to translate. Default is the one of
+        get_language_detector.
+        """
+        self.backend = backend if backend is not None else GoogleTranslateAsyncBackend()
+        self.detector = detector
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.requests_per_second = requests_per_second
+        self.requests = 0
+        self.retries = 0
+
+    async def _translate_batch(self, texts, src, dest, semaphore, rate_limiter):
+        language = dest if src == 'en' else src
+        for attempt in range(self.max_retries + 1):
+            await rate_limiter.acquire(language)
+            async with semaphore:
+                try:
+                    self.requests += 1
+                    return await self.backend.translate_batch(texts, src, dest)
+                except Exception:
+                    if attempt == self.max_retries:
+                        raise
+            self.retries += 1
+            # Random jitter so that the retries of concurrent requests do not all arrive at the same time
+            await asyncio.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+
+    def _limits(self):
+        return asyncio.Semaphore(self.max_concurrency), RateLimiter(self.requests_per_second)
+
+    async def _translate_job(self, texts, src, dest, semaphore, rate_limiter):
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(
+            *[self._translate_batch(batch, src, dest, semaphore, rate_limiter) for batch in batches])
+        return [text for batch in results for text in batch]
+
+    async def translate_many(self, jobs):
+        """
+        Translate several groups of texts concurrently.
+        :param jobs: A list of (texts, src, dest) tuples.
+        :return: A list with one list of translated texts per job, in the same order as jobs.
+        """
+        semaphore, rate_limiter = self._limits()
+        return list(await asyncio.gather(
+            *[self._translate_job(list(texts), src, dest, semaphore, rate_limiter) for texts, src, dest in jobs]))
+
+    async def translate(self, texts, src, dest):
+        """
+        Translate a list of texts from one language to another.
+        :param texts: A list of texts, all in the src language.
+        :param src: The language of the texts.
+        :param dest: The language to translate into.
+        :return: A list of translated texts, in the same order as texts.
+        """
+        return (await self.translate_many([(texts, src, dest)]))[0]
+
+    async def back_translate(self, texts, languages):
+        """
+        Translate English texts into every language and back to English. All the languages are processed at once, and
+        a language starts translating back as soon as its own forward translations are done.
+        :param texts: A list of English texts.
+        :param languages: The languages in which to translate the texts.
+        :return: A list with, for every language, the list of texts translated back to English in the same order as
+        texts.
+        """
+        texts = list(texts)
+        semaphore, rate_limiter = self._limits()
+
+        async def round_trip(language):
+            translated = await self._translate_job(texts, 'en', language, semaphore, rate_limiter)
+            return await self._translate_job(translated, language, 'en', semaphore, rate_limiter)
+
+        return list(await asyncio.gather(*[round_trip(language) for language in languages]))
+
+    async def translate_to_en(self, texts, cache=None):
+        """
+        Translate texts into English. The language of every text is detected, then the texts confidently detected as
+        not English are grouped by language and translated concurrently.
+        :param texts: A list of texts.
+        :param cache: Optional TranslationCache. Cached texts are neither detected nor translated, and new translations
+        are added to it.
+        :return: A list of texts in English, in the same order as texts.
+        """
+        texts = list(texts)
+        translated_texts = list(texts)
+        uncached_positions = []
+        for position, text in enumerate(texts):
+            translation = cache.get(text) if cache is not None else MISSING
+            if translation is not MISSING:
+                translated_texts[position] = text if translation is None else translation
+            else:
+                uncached_positions.append(position)
+
+        detector = self.detector if self.detector is not None else get_language_detector()
+        positions_by_language = defaultdict(list)
+        languages = detector.detect_each([texts[position] for position in uncached_positions])
+        for position, (language, confidence) in zip(uncached_positions, languages):
+            if detector.should_translate(language, confidence):
+                positions_by_language[language].append(position)
+            elif cache is not None:
+                cache.put(texts[position], None)
+
+        jobs = [([texts[position] for position in positions], language, 'en')
+                for language, positions in positions_by_language.items()]
+        for positions, translations in zip(positions_by_language.values(), await self.translate_many(jobs)):
+            for position, translation in zip(positions, translations):
+                translated_texts[position] = translation
+                if cache is not None:
+                    cache.put(texts[position], None if translation == texts[position] else translation)
+        return translated_texts
+
+
+def run_coroutine(coroutine):
+    """
+    Function which runs a coroutine to completion from synchronous code. Inside a running event loop (i.e. a jupyter
+    notebook), the coroutine is run in a new thread with its own event loop.
+    :param coroutine: The coroutine to run.
+    :return: The result of the coroutine.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    result = dict()
+
+    def run_in_thread():
+        try:
+            result["value"] = asyncio.run(coroutine)
+        except BaseException as error:
+            result["error"] = error
+
+    thread = threading.Thread(target=run_in_thread)
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
@@ -0,0 +1,122 @@
+import json
+import os
+from pickle import load
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from preprocessing import TokenMatcher, preprocess_text_batch, translate_series_to_en, warm_stemmer
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+
+def append_dense_columns(sparse_matrix, dense_matrix):
+    """
+    Function which appends the columns of a dense matrix to the right of a CSR matrix, writing the dense values
+    straight into the CSR arrays. It gives the same matrix as hstack((sparse_matrix, csr_matrix(dense_matrix))),
+    without the intermediate COO matrix and the conversion back to CSR.
+    :param sparse_matrix: A scipy.sparse.csr_matrix with n rows.
+    :param dense_matrix: A numpy array with n rows.
+    :return: A scipy.sparse.csr_matrix with the columns of both matrices. The dense columns are stored even when 0.
+    """
+    row_count, dense_column_count = dense_matrix.shape
+    row_lengths = np.diff(sparse_matrix.indptr)
+
+    indptr = sparse_matrix.indptr + np.arange(row_count + 1) * dense_column_count
+    data = np.empty(indptr[-1], dtype=np.result_type(sparse_matrix.dtype, dense_matrix.dtype))
+    indices = np.empty(indptr[-1], dtype=np.int32)
+
+    # Every row keeps its sparse values first, shifted by the dense values of the rows above it
+    sparse_positions = np.arange(sparse_matrix.nnz) + np.repeat(np.arange(row_count), row_lengths) * dense_column_count
+    data[sparse_positions] = sparse_matrix.data
+    indices[sparse_positions] = sparse_matrix.indices
+
+    dense_positions = (indptr[1:] - dense_column_count)[:, None] + np.arange(dense_column_count)
+    data[dense_positions] = dense_matrix
+    indices[dense_positions] = sparse_matrix.shape[1] + np.arange(dense_column_count)
+
+    return csr_matrix((data, indices, indptr), shape=(row_count, sparse_matrix.shape[1] + dense_column_count))
+
+
+class TicketClassifier:
+    """
+    Inference pipeline which chains translation, preprocessing, the tf-idf vectorizer, the manual features scaler and
+    the model. The artifacts are loaded once, when the classifier is created, and texts are scored in batches.
+    """
+
+    def __init__(self, tfidf_vec, scaler, model, token_dictionary):
+        """
+        :param tfidf_vec: A fitted sklearn.TfidfVectorizer.
+        :param scaler: A fitted sklearn.MinMaxScaler for the manual features.
+        :param model: A fitted model trained on the tf-idf matrix with the scaled manual features appended.
+        :param token_dictionary: dictionary of tokens, where the key is the actual token value and the value is the
+        group that the token is part of.
+        """
+        self.tfidf_vec = tfidf_vec
+        self.scaler = scaler
+        self.model = model
+        self.token_matcher = TokenMatcher(token_dictionary)
+        # The terms of the vocabulary are stems, and most of them stem to themselves
+        warm_stemmer(tfidf_vec.vocabulary_)
+
+    @classmethod
+    def from_directory(cls, data_dir=DEFAULT_DATA_DIR, model_number=1):
+        """
+        Load a classifier from the artifacts saved by the "Preprocessing and modeling" notebook.
+        :param data_dir: The data folder, containing token_dictionary.json and the modeling folder.
+        :param model_number: Which of the saved models to load, i.e. 1 for tfidf_1.pkl, scaler_1.pkl and
+        model_1_with_mf.pkl.
+        :return: A TicketClassifier instance.
+        """
+        modeling_dir = os.path.join(data_dir, "modeling")
+        artifacts = []
+        for file_name in ["tfidf_{}.pkl", "scaler_{}.pkl", "model_{}_with_mf.pkl"]:
+            with open(os.path.join(modeling_dir, file_name.format(model_number)), "rb") as artifact_file:
+                artifacts.append(load(artifact_file))
+
+        with open(os.path.join(data_dir, "token_dictionary.json"), "r") as token_dict_file:
+            token_dictionary = json.load(token_dict_file)
+
+        return cls(*artifacts, token_dictionary)
+
+    def scale_manual_features(self, manual_features):
+        """
+        Apply the MinMaxScaler on a matrix of manual features, without going through a DataFrame.
+        :param manual_features: A numpy array whose columns are in the order given by get_manual_feature_names.
+        :return: The scaled manual features as a numpy array.
+        """
+        scaled = manual_features * self.scaler.scale_ + self.scaler.min_
+        if getattr(self.scaler, "clip", False):
+            np.clip(scaled, self.scaler.feature_range[0], self.scaler.feature_range[1], out=scaled)
+        return scaled
+
+    def transform(self, texts, translate=True):
+        """
+        Turn raw ticket texts into the matrix the model was trained on.
+        :param texts: A list or pandas.Series of ticket texts.
+        :param translate: Flag. If set to True, translate the texts into English first. Default is True.
+        :return: A scipy.sparse.csr_matrix with the tf-idf values followed by the scaled manual features.
+        """
+        if translate:
+            texts = translate_series_to_en(pd.Series(list(texts), dtype=object))
+        return self.transform_preprocessed(*preprocess_text_batch(texts, self.token_matcher, dtype=np.float64))
+
+    def transform_preprocessed(self, cleaned_texts, manual_features):
+        """
+        Turn already preprocessed texts and their manual features into the matrix the model was trained on.
+        :param cleaned_texts: An iterable of texts preprocessed by preprocess_text_series or preprocess_text_batch.
+        :param manual_features: A numpy array whose columns are in the order given by get_manual_feature_names.
+        :return: A scipy.sparse.csr_matrix with the tf-idf values followed by the scaled manual features.
+        """
+        return append_dense_columns(self.tfidf_vec.transform(cleaned_texts),
+                                    self.scale_manual_features(manual_features))
+
+    def predict_proba(self, texts, translate=True):
+        """
+        Score a batch of ticket texts.
+        :param texts: A list or pandas.Series of ticket texts.
+        :param translate: Flag. If set to True, translate the texts into English first. Default is True.
+        :return: A numpy array of shape (len(texts), 2) with the probabilities of the negative and positive class.
+        """
+        return self.model.predict_proba(self.transform(texts, translate))
@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import average_precision_score, recall_score
+
+from linear_scorer import LinearScorer, vocabulary_terms
+from model_bundle import DEFAULT_DATA_DIR, default_bundle_dir, read_components, save_components
+
+
+def feature_importance(components):
+    """
+    Function which ranks the terms of a linear model by how much they move its decision values. The importance of a
+    term is the absolute weight of one occurrence, i.e. its model coefficient times its idf, times the share of
+    documents containing it, (1 + document frequency) / (1 + number of documents) = exp(1 - idf) with the default
+    smooth_idf. It needs no training data: a rare term or a term with a small weight has a small importance.
+    :param components: A dictionary with the keyword arguments of LinearScorer.from_components.
+    :return: A numpy array with the importance of every term, in the order of the columns.
+    """
+    idf = np.asarray(components["idf"], dtype=np.float64)
+    coefficients = np.asarray(components["coefficients"], dtype=np.float64)[:len(idf)]
+    return np.abs(coefficients * idf) * np.exp(1 - idf)
+
+
+def prune_components(components, term_count):
+    """
+    Function which keeps the most important terms of a linear model, see feature_importance. The other terms are
+    dropped from the vocabulary, the idf and the coefficients, so they are ignored by the scorer like unknown words.
+    The model is not retrained, but the norm of the tf-idf vectors is computed on the kept terms only.
+    :param components: A dictionary with the keyword arguments of LinearScorer.from_components.
+    :param term_count: Number of terms to keep.
+    :return: A new components dictionary. Its vocabulary is a dictionary whose columns follow the sorted order of the
+    terms, like the vocabulary of a tf-idf vectorizer.
+    """
+    terms = vocabulary_terms(components["vocabulary"])
+    idf = np.asarray(components["idf"])
+    coefficients = np.asarray(components["coefficients"])
+    # A stable sort keeps the column order between terms of equal importance
+    ranking = np.argsort(-feature_importance(components), kind="stable")
+    kept_columns = ranking[:term_count]
+    kept_columns = kept_columns[np.argsort(terms[kept_columns])]
+
+    pruned = dict(components)
+    pruned["vocabulary"] = {term.decode("utf-8"): column for column, term in enumerate(terms[kept_columns])}
+    pruned["idf"] = idf[kept_columns]
+    pruned["coefficients"] = np.concatenate([coefficients[kept_columns], coefficients[len(idf):]])
+    pruned.pop("version", None)
+    return pruned
+
+
+def evaluate_components(components, cleaned_texts, manual_features, labels):
+    """
+    Function which scores a held-out set with a linear model and measures it like in notebook 2.
+    :param components: A dictionary with the keyword arguments of LinearScorer.from_components.
+    :param cleaned_texts: The preprocessed texts of the held-out set.
+    :param manual_features: A numpy array with the manual features of the held-out set.
+    :param labels: The labels of the held-out set.
+    :return: A dictionary with the number of terms, the average precision and the recall of the positive class.
+    """
+    scorer = LinearScorer.from_components(**components)
+    manual_features = np.asarray(manual_features, dtype=np.float64)
+    probabilities = scorer.predict_proba_preprocessed(cleaned_texts, manual_features)[:, 1]
+    # Like SVC.predict, the class is given by the sign of the decision value, not by the probability
+    predictions = (scorer.decision_function(cleaned_texts, manual_features) > 0).astype(int)
+    return {"term_count": len(components["idf"]),
+            "average_precision": average_precision_score(labels, probabilities),
+            "recall": recall_score(labels, predictions, zero_division=0)}
+
+
+def compact_components(components, max_terms=None, max_average_precision_loss=None, holdout=None, steps=20):
+    """
+    Function which prunes a linear model to a target size or to the smallest size within an accuracy budget.
+    :param components: A dictionary with the keyword arguments of LinearScorer.from_components.
+    :param max_terms: Number of terms to keep at most. Default is all of them.
+    :param max_average_precision_loss: Largest drop of average precision on the held-out set allowed, i.e. 0.005. The
+    smallest of steps sizes, spaced geometrically up to max_terms, which stays within it is kept. If none does,
+    max_terms terms are kept and no row of the report is within the budget. Default is None, keep max_terms terms.
+    :param holdout: A (cleaned texts, manual features, labels) tuple of the held-out set. Needed for
+    max_average_precision_loss, and to report the metrics of the sizes tried.
+    :param steps: Number of sizes tried for max_average_precision_loss.
+    :return: A tuple of (the pruned components, a pandas.DataFrame with the number of terms, the average precision, the
+    recall and their deltas with the full model for every size evaluated, whether the size is within the budget and
+    the selected size flagged). The DataFrame is empty without holdout.
+    """
+    term_count = len(components["idf"])
+    max_terms = term_count if max_terms is None else min(max_terms, term_count)
+    if max_average_precision_loss is not None and holdout is None:
+        raise ValueError("An accuracy budget needs a held-out set to measure the average precision on")
+    if holdout is None:
+        return prune_components(components, max_terms), pd.DataFrame()
+
+    baseline = evaluate_components(components, *holdout)
+    sizes = [max_terms]
+    if max_average_precision_loss is not None:
+        sizes = np.unique(np.geomspace(1, max_terms, steps).round().astype(int)).tolist()
+    rows = []
+    for size in sizes:
+        row = evaluate_components(prune_components(components, size), *holdout)
+        row["within_budget"] = (max_average_precision_loss is None or
+                                row["average_precision"] >= baseline["average_precision"] - max_average_precision_loss)
+        rows.append(row)
+    # Without a size within the budget, the largest size allowed is kept
+    selected_size = next((row["term_count"] for row in rows if row["within_budget"]), max_terms)
+
+    report = pd.DataFrame(rows)
+    report["average_precision_delta"] = report["average_precision"] - baseline["average_precision"]
+    report["recall_delta"] = report["recall"] - baseline["recall"]
+    report["selected"] = report["term_count"] == selected_size
+    return prune_components(components, selected_size), report
+
+
+def notebook_holdout(token_dictionary, data_dir=DEFAULT_DATA_DIR, test_size=0.2, random_state=42):
+    """
+    Function which splits the labeled tickets like notebook 2: a stratified split with 20% of the tickets held out.
+    Notebook 2 does not seed its split, so the split is seeded here to be the same from one run to the next. The texts
+    are not translated.
+    :param token_dictionary: dictionary of tokens or a TokenMatcher built from it.
+    :param data_dir: The data folder, containing labeled_tickets.csv.
+    :param test_size: The share of the tickets held out.
+    :param random_state: The seed of the split.
+    :return: Two (cleaned texts, manual features, labels) tuples: the training part and the held-out part.
+    """
+    from sklearn.model_selection import train_test_split
+    from experiment_grid import preprocess_cached
+
+    tickets_df = pd.read_csv(os.path.join(data_dir, "labeled_tickets.csv"), index_col=0)
+    cleaned_texts, manual_features = preprocess_cached(tickets_df["Description"], token_dictionary)
+    labels = tickets_df["is_about_order_status"].to_numpy()
+    train_rows, test_rows = train_test_split(np.arange(len(labels)), stratify=labels, test_size=test_size,
+                                             random_state=random_state)
+    return tuple(([cleaned_texts[row] for row in rows], manual_features[rows].astype(np.float64), labels[rows])
+                 for rows in (train_rows, test_rows))
+
+
+def train_notebook_model(train, token_dictionary, C=2.59):
+    """
+    Function which trains the model 1 of notebook 2 on a training set: a tf-idf vectorizer and a MinMaxScaler, the
+    training matrix rebalanced by SMOTEENN and a linear SVC with probability=True.
+    :param train: A (cleaned texts, manual features, labels) tuple.
+    :param token_dictionary: dictionary of tokens, where the key is the actual token value and the value is the group
+    that the token is part of.
+    :param C: The regularization parameter of the SVC, the one chosen in notebook 2 by default.
+    :return: The components of the model, see export_components.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.preprocessing import MinMaxScaler
+    from sklearn.svm import SVC
+    from classifier import TicketClassifier, append_dense_columns
+    from linear_scorer import export_components
+    from rebalancing import SparseSMOTEENN
+
+    cleaned_texts, manual_features, labels = train
+    tfidf_vec = TfidfVectorizer().fit(cleaned_texts)
+    scaler = MinMaxScaler().fit(manual_features)
+    matrix = append_dense_columns(tfidf_vec.transform(cleaned_texts), scaler.transform(manual_features))
+    resampled_matrix, resampled_labels = SparseSMOTEENN(random_state=42).fit_resample(matrix, labels)
+    model = SVC(random_state=42, class_weight="balanced", probability=True, kernel="linear", C=C)
+    model.fit(resampled_matrix, resampled_labels)
+    return export_components(TicketClassifier(tfidf_vec, scaler, model, token_dictionary))
+
+
+def _directory_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prune the vocabulary of a model bundle to its most important terms "
+                                                 "and save it with float32 arrays, reporting the average precision "
+                                                 "and recall deltas on the held-out split of notebook 2.")
+    parser.add_argument("--bundle", default=default_bundle_dir(), help="The bundle to compact.")
+    parser.add_argument("--output", default=None, help="Where to save the compacted bundle. Default is the bundle "
+                                                       "directory followed by _compact.")
+    parser.add_argument("--max-terms", type=int, default=None, help="Number of terms to keep at most.")
+    parser.add_argument("--max-ap-loss", type=float, default=None,
+                        help="Largest drop of average precision allowed, i.e. 0.005. The smallest size within it is "
+                             "kept.")
+    parser.add_argument("--retrain", action="store_true",
+                        help="Train the model of notebook 2 on the training part of the split instead of compacting "
+                             "the bundle. The bundle was trained on another split of the same tickets, so its "
+                             "held-out metrics are optimistic.")
+    parser.add_argument("--random-state", type=int, default=42, help="The seed of the held-out split.")
+    parser.add_argument("--float64", action="store_true", help="Keep the arrays in float64.")
+    args = parser.parse_args()
+
+    components = read_components(args.bundle)
+    token_dictionary = components["token_dictionary"]
+    train, holdout = notebook_holdout(token_dictionary, random_state=args.random_state)
+    if args.retrain:
+        components = train_notebook_model(train, token_dictionary)
+    compacted, report = compact_components(components, args.max_terms, args.max_ap_loss, holdout)
+
+    output = args.output or os.path.normpath(args.bundle) + "_compact"
+    bundle_hash = save_components(compacted, output, np.float64 if args.float64 else np.float32)
+    print(report.to_string(index=False, float_format="{:.4f}".format))
+    print(json.dumps({"output": output, "hash": bundle_hash, "terms": len(components["idf"]),
+                      "kept_terms": len(compacted["idf"]),
+                      "within_budget": bool(report.empty or report.loc[report["selected"], "within_budget"].all()),
+                      "bundle_bytes": _directory_size(args.bundle),
+                      "compacted_bundle_bytes": _directory_size(output)}, indent=1))
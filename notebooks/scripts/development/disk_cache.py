@@ -0,0 +1,151 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Returned by DiskBackedCache.get when a key is not in the cache, since None can be a cached value
+MISSING = object()
+
+
+def text_key(text):
+    """
+    Function which returns the key under which a text is cached: the sha256 digest of its UTF-8 encoding.
+    :param text: The text to hash.
+    :return: The digest as bytes.
+    """
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class DiskBackedCache:
+    """
+    Content addressed cache. A bounded in-memory LRU sits in front of an optional SQLite store, so the values also
+    survive between runs and are shared by the processes using the same file.
+    Subclasses choose the table, the name and the SQLite type of the value column, and how their keys are hashed.
+    """
+
+    TABLE = "entries"
+    VALUE_COLUMN = "value"
+    VALUE_TYPE = "BLOB"
+
+    def __init__(self, path=None, max_memory_entries=10000, max_disk_entries=1000000):
+        """
+        :param path: Path of the SQLite file. If None, the cache only lives in memory.
+        :param max_memory_entries: Maximum number of values kept in memory. The least recently used is evicted.
+        :param max_disk_entries: Maximum number of values kept in the SQLite file. The least recently used are evicted.
+        """
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+        self._clock = 0
+        self._disk_entries = 0
+
+    def _get_connection(self):
+        # A SQLite connection must not be used across a fork, so every process opens its own
+        if self._connection is None or self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS {} (key BLOB PRIMARY KEY, {} {}, last_used INTEGER "
+                                     "NOT NULL)".format(self.TABLE, self.VALUE_COLUMN, self.VALUE_TYPE))
+            self._connection.execute("CREATE INDEX IF NOT EXISTS {0}_last_used ON {0} (last_used)".format(self.TABLE))
+            self._clock, self._disk_entries = self._connection.execute(
+                "SELECT COALESCE(MAX(last_used), 0), COUNT(*) FROM {}".format(self.TABLE)).fetchone()
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get_key(self, key):
+        """
+        Look up a value by its key.
+        :param key: The key as bytes, i.e. the output of text_key.
+        :return: The cached value, or MISSING if not cached.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            if self.path is not None:
+                connection = self._get_connection()
+                row = connection.execute("SELECT {} FROM {} WHERE key = ?".format(self.VALUE_COLUMN, self.TABLE),
+                                         (key,)).fetchone()
+                if row is not None:
+                    self._clock += 1
+                    connection.execute("UPDATE {} SET last_used = ? WHERE key = ?".format(self.TABLE),
+                                       (self._clock, key))
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+            self.misses += 1
+            return MISSING
+
+    def put_key(self, key, value):
+        """
+        Store a value under its key.
+        :param key: The key as bytes, i.e. the output of text_key.
+        :param value: The value, of a type SQLite can store.
+        """
+        with self._lock:
+            self._remember(key, value)
+            if self.path is not None:
+                connection = self._get_connection()
+                self._clock += 1
+                inserted = connection.execute("INSERT OR IGNORE INTO {} VALUES (?, ?, ?)".format(self.TABLE),
+                                              (key, value, self._clock)).rowcount
+                if not inserted:
+                    connection.execute("UPDATE {} SET {} = ?, last_used = ? WHERE key = ?".format(
+                        self.TABLE, self.VALUE_COLUMN), (value, self._clock, key))
+                # The row count is tracked by this process only, so it is recounted whenever the bound is reached
+                self._disk_entries += inserted
+                if self._disk_entries > self.max_disk_entries:
+                    self._disk_entries = connection.execute(
+                        "SELECT COUNT(*) FROM {}".format(self.TABLE)).fetchone()[0]
+                    overflow = self._disk_entries - self.max_disk_entries
+                    if overflow > 0:
+                        connection.execute("DELETE FROM {0} WHERE key IN "
+                                           "(SELECT key FROM {0} ORDER BY last_used LIMIT ?)".format(self.TABLE),
+                                           (overflow,))
+                        self._disk_entries -= overflow
+                        self.evictions += overflow
+
+    def stats(self):
+        """
+        :return: A dictionary with the hits, misses, disk hits, evictions and number of values held in memory.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "disk_hits": self.disk_hits,
+                    "evictions": self.evictions, "memory_entries": len(self._memory)}
+
+    def clear(self):
+        """
+        Remove every value from memory and from the SQLite file.
+        """
+        with self._lock:
+            self._memory.clear()
+            if self.path is not None:
+                self._get_connection().execute("DELETE FROM {}".format(self.TABLE))
+                self._disk_entries = 0
+
+    def close(self):
+        """
+        Close the SQLite connection of the current process, if any.
+        """
+        with self._lock:
+            if self._connection is not None and self._connection_pid == os.getpid():
+                self._connection.close()
+            self._connection = None
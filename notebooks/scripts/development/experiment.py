@@ -1,5 +1,6 @@
 from googletrans import Translator
 import pandas as pd
+from async_translation import AsyncTranslationClient, run_coroutine
 
 translator = Translator()
 
@@ -23,16 +24,26 @@ def enhance_text(text, languages=None):
     return enhanced_texts
 
 
-def enhance_series(text_series, languages=None):
+def enhance_series(text_series, languages=None, client=None):
     """
     Function which takes a pandas.Series comprised of texts and enhances them len(languages) times.
+    The translations are sent concurrently, in batches, through an AsyncTranslationClient.
     :param text_series: A pandas.Series representing the data to enhance.
     :param languages: The languages to use when translating into the non-English language. Default is
     ['de', 'ro', 'nl', 'fr', 'fi', 'hu'] (i.e. increase data size by a factor of 6)
+    :param client: The AsyncTranslationClient to translate with. Default is a client using googletrans.
     :return: A pandas.Series containing artificially enhanced data by a factor of len(languages)
     """
+    if languages is None:
+        languages = ['de', 'ro', 'nl', 'fr', 'fi', 'hu']
+    if client is None:
+        client = AsyncTranslationClient()
+
+    back_translated = run_coroutine(client.back_translate(list(text_series), languages))
+
+    # Keep the order of the sequential version: all the languages of the first text, then of the second text etc.
     enhanced_list = []
-    for text in text_series:
-        enhanced_list.extend(enhance_text(text, languages))
+    for position in range(len(text_series)):
+        enhanced_list.extend(language_texts[position] for language_texts in back_translated)
 
     return pd.Series(enhanced_list)
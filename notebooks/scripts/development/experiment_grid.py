@@ -0,0 +1,395 @@
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, issparse
+from sklearn.base import clone
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import RepeatedStratifiedKFold
+from sklearn.preprocessing import MinMaxScaler
+
+from classifier import append_dense_columns
+from preprocessing import get_token_matcher, preprocess_text_series
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data",
+                                 "experiment_cache")
+
+# Part of the key of the cached preprocessing output. Bump it whenever preprocessing starts returning other values.
+PREPROCESSING_CACHE_VERSION = 1
+
+DEFAULT_SCORING = ["average_precision", "f1", "recall", "accuracy"]
+
+# Name under which the rows scored on the matrix that was not resampled are saved, like in notebook 2
+NO_SAMPLING = "None"
+
+
+def dataset_hash(texts, token_dictionary):
+    """
+    Function which returns the key under which the preprocessing output of a list of texts is cached.
+    :param texts: An iterable of texts, i.e. a pandas.Series or a list.
+    :param token_dictionary: dictionary of tokens or a TokenMatcher built from it.
+    :return: The sha256 digest of the texts, the token dictionary and the preprocessing cache version, as hex.
+    """
+    digest = hashlib.sha256()
+    token_dictionary = get_token_matcher(token_dictionary).token_dictionary
+    digest.update(json.dumps([PREPROCESSING_CACHE_VERSION, token_dictionary], sort_keys=True).encode("utf-8"))
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def matrix_hash(matrix, labels):
+    """
+    :param matrix: A scipy.sparse.csr_matrix.
+    :param labels: The labels of its rows.
+    :return: The sha256 digest of the matrix and of the labels, as hex.
+    """
+    digest = hashlib.sha256(json.dumps(list(matrix.shape)).encode("utf-8"))
+    for array in (matrix.indptr, matrix.indices, matrix.data, labels):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def estimator_hash(estimator):
+    """
+    Function which returns a key of the parameters of an estimator, i.e. a sampler or a model. Unlike its repr, which
+    leaves the default parameters out and abbreviates long arrays, it changes with any parameter: the arrays are hashed
+    by content and the nested estimators by their own parameters.
+    :param estimator: A scikit-learn, imblearn or rebalancing.py estimator.
+    :return: The sha256 digest of the class and the parameters of the estimator, as hex.
+    """
+    digest = hashlib.sha256()
+    _update_digest(digest, estimator)
+    return digest.hexdigest()
+
+
+def _update_digest(digest, value):
+    if hasattr(value, "get_params") and not isinstance(value, type):
+        digest.update("{}.{}(".format(type(value).__module__, type(value).__qualname__).encode("utf-8"))
+        _update_digest(digest, value.get_params(deep=False))
+        digest.update(b")")
+    elif isinstance(value, dict):
+        digest.update(b"{")
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode("utf-8") + b":")
+            _update_digest(digest, value[key])
+        digest.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        digest.update(type(value).__name__.encode("utf-8") + b"[")
+        for item in value:
+            _update_digest(digest, item)
+        digest.update(b"]")
+    elif issparse(value):
+        value = csr_matrix(value)
+        _update_digest(digest, ("sparse", value.shape, value.indptr, value.indices, value.data))
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        digest.update("array({}, {})".format(value.dtype.str, value.shape).encode("utf-8"))
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, np.ndarray):
+        _update_digest(digest, ("array", value.shape, value.ravel().tolist()))
+    elif isinstance(value, np.random.RandomState):
+        _update_digest(digest, ("RandomState",) + value.get_state()[1:])
+    else:
+        digest.update(repr(value).encode("utf-8"))
+    digest.update(b"\0")
+
+
+def _write_atomically(directory, arrays):
+    # The arrays are written next to their final location and moved in place at the end, so another process never
+    # reads half of them
+    parent_dir = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent_dir)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, name + ".npy"), array)
+    shutil.rmtree(directory, ignore_errors=True)
+    try:
+        os.replace(tmp_dir, directory)
+    except OSError:
+        # Another process saved the same arrays in the meantime
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def preprocess_cached(texts, token_dictionary, cache_dir=DEFAULT_CACHE_DIR, n_jobs=1):
+    """
+    Function which preprocesses a list of texts with preprocess_text_series, or reads the output from the cache if
+    these texts were already preprocessed with this token dictionary.
+    :param texts: An iterable of texts, i.e. a pandas.Series or a list.
+    :param token_dictionary: dictionary of tokens or a TokenMatcher built from it.
+    :param cache_dir: The folder of the cache.
+    :param n_jobs: Number of worker processes used to preprocess the texts when they are not cached. Default is 1.
+    :return: A list with the preprocessed texts and a float32 numpy array with the manual features of every text.
+    """
+    texts = list(texts)
+    directory = os.path.join(cache_dir, "preprocessed", dataset_hash(texts, token_dictionary))
+    if os.path.isdir(directory):
+        cleaned_texts = np.load(os.path.join(directory, "texts.npy"))
+        manual_features = np.load(os.path.join(directory, "manual_features.npy"))
+        return np.char.decode(cleaned_texts, "utf-8").tolist(), manual_features
+
+    cleaned_texts, manual_features = preprocess_text_series(texts, token_dictionary, as_matrix=True, n_jobs=n_jobs)
+    # Stored as UTF-8 bytes, since numpy stores unicode strings with 4 bytes per character
+    _write_atomically(directory, {"texts": np.array([text.encode("utf-8") for text in cleaned_texts], dtype=bytes),
+                                  "manual_features": manual_features})
+    return cleaned_texts, manual_features
+
+
+def build_feature_matrix(cleaned_texts, manual_features, with_manual_features=True):
+    """
+    Function which fits a tf-idf vectorizer on preprocessed texts and, if requested, appends the manual features
+    scaled between 0 and 1, like obtain_tfidf_matrix in notebook 2. Both variants are built from the same
+    preprocessing output, so the texts are only preprocessed once.
+    :param cleaned_texts: The preprocessed texts.
+    :param manual_features: A numpy array with the manual features of every text.
+    :param with_manual_features: Flag. If set to False, only return the tf-idf matrix. Default is True.
+    :return: A scipy.sparse.csr_matrix with one row per text.
+    """
+    matrix = TfidfVectorizer().fit_transform(cleaned_texts)
+    if with_manual_features:
+        manual_features = np.asarray(manual_features, dtype=np.float64)
+        matrix = append_dense_columns(matrix, MinMaxScaler().fit_transform(manual_features))
+    return matrix
+
+
+def save_matrix(directory, matrix, labels, sample_weight=None):
+    """
+    Function which saves a sparse matrix and its labels as .npy files, so that they can be memory-mapped.
+    :param directory: The directory in which to save them.
+    :param matrix: A scipy.sparse matrix.
+    :param labels: The labels of its rows.
+    :param sample_weight: The weights to fit the models with, if any.
+    """
+    matrix = csr_matrix(matrix)
+    arrays = {"data": matrix.data, "indices": matrix.indices, "indptr": matrix.indptr,
+              "shape": np.array(matrix.shape), "labels": np.asarray(labels)}
+    if sample_weight is not None:
+        arrays["sample_weight"] = np.asarray(sample_weight)
+    _write_atomically(directory, arrays)
+
+
+def load_matrix(directory, mmap_mode="r"):
+    """
+    Function which loads a matrix saved by save_matrix. The arrays are memory-mapped by default, so the processes
+    reading the same matrix share its pages instead of holding a copy each.
+    :param directory: The directory of the matrix.
+    :param mmap_mode: The mmap_mode of numpy.load. Default is "r", read only.
+    :return: A scipy.sparse.csr_matrix and a numpy array with the labels.
+    """
+    def load(name, mode=mmap_mode):
+        return np.load(os.path.join(directory, name + ".npy"), mmap_mode=mode)
+
+    matrix = csr_matrix((load("data"), load("indices"), load("indptr")), shape=tuple(load("shape", None)), copy=False)
+    return matrix, load("labels")
+
+
+def load_sample_weight(directory):
+    """
+    :param directory: The directory of a matrix saved by save_matrix.
+    :return: The sample weights saved with the matrix, or None if it was saved without.
+    """
+    path = os.path.join(directory, "sample_weight.npy")
+    return np.load(path) if os.path.exists(path) else None
+
+
+def read_results(results_path):
+    """
+    :param results_path: The csv file in which run_grid writes one row per cell.
+    :return: A list with the rows of the file as dictionaries with the metrics as floats. Empty if there is no file.
+    """
+    if not os.path.exists(results_path):
+        return []
+    with open(results_path, "r", newline="") as results_file:
+        rows = list(csv.DictReader(results_file))
+    for row in rows:
+        row["split"] = int(row["split"])
+        for column in row:
+            if column not in ("dataset", "sampling_method", "sampler_key", "model_name", "model_hash", "split"):
+                row[column] = float(row[column])
+    return rows
+
+
+def summarize_results(rows, scoring=None):
+    """
+    Function which averages the cells of every (sampling method, model) pair over the splits, like evaluate_model in
+    notebook 2 does with the output of cross_validate.
+    :param rows: The rows returned by read_results or run_grid.
+    :param scoring: The metrics to average. Default is DEFAULT_SCORING.
+    :return: A pandas.DataFrame with the columns model_name, test_<metric>, train_<metric> for every metric and
+    sampling_method, with one row per pair in the order in which the pairs first appear.
+    """
+    scoring = scoring or DEFAULT_SCORING
+    columns = [prefix + metric for metric in scoring for prefix in ("test_", "train_")]
+    results_df = pd.DataFrame(rows, columns=["sampling_method", "model_name"] + columns)
+    results_df = results_df.groupby(["sampling_method", "model_name"], sort=False)[columns].mean().reset_index()
+    return results_df[["model_name"] + columns + ["sampling_method"]]
+
+
+# State of a worker of run_grid, set by _init_worker
+_worker_state = dict()
+
+
+def _init_worker(cache_dir, models, cv, scoring):
+    _worker_state.update(cache_dir=cache_dir, models=models, cv=cv, scoring=scoring, matrices=dict(), splits=dict())
+
+
+def _matrix_dir(cache_dir, key):
+    return os.path.join(cache_dir, "matrices", key)
+
+
+def _get_matrix(key):
+    # Every worker memory-maps a matrix the first time one of its cells needs it
+    matrices = _worker_state["matrices"]
+    if key not in matrices:
+        directory = _matrix_dir(_worker_state["cache_dir"], key)
+        matrices[key] = load_matrix(directory) + (load_sample_weight(directory),)
+    return matrices[key]
+
+
+def _get_split(key, split):
+    splits = _worker_state["splits"]
+    if key not in splits:
+        matrix, labels, _ = _get_matrix(key)
+        splits[key] = list(_worker_state["cv"].split(np.zeros(matrix.shape[0]), labels))
+    return splits[key][split]
+
+
+def _resample(source_key, key, sampler):
+    matrix, labels, _ = _get_matrix(source_key)
+    sampler = clone(sampler)
+    resampled_matrix, resampled_labels = sampler.fit_resample(matrix, np.asarray(labels))
+    # Samplers like rebalancing.ClassWeighting balance the classes through sample weights instead of rows
+    save_matrix(_matrix_dir(_worker_state["cache_dir"], key), resampled_matrix, resampled_labels,
+                getattr(sampler, "sample_weight_", None))
+    return key
+
+
+def _resample_star(args):
+    return _resample(*args)
+
+
+def _evaluate_cell(dataset, sampling_method, key, model_name, model_hash, split):
+    matrix, labels, sample_weight = _get_matrix(key)
+    train_indexes, test_indexes = _get_split(key, split)
+    fit_params = dict() if sample_weight is None else {"sample_weight": sample_weight[train_indexes]}
+    start = time.perf_counter()
+    model = clone(_worker_state["models"][model_name]).fit(matrix[train_indexes], labels[train_indexes], **fit_params)
+    row = {"dataset": dataset, "sampling_method": sampling_method, "sampler_key": key, "model_name": model_name,
+           "model_hash": model_hash, "split": split, "fit_time": time.perf_counter() - start}
+    for metric in _worker_state["scoring"]:
+        scorer = get_scorer(metric)
+        row["test_" + metric] = scorer(model, matrix[test_indexes], labels[test_indexes])
+        row["train_" + metric] = scorer(model, matrix[train_indexes], labels[train_indexes])
+    return row
+
+
+def _evaluate_cell_star(args):
+    return _evaluate_cell(*args)
+
+
+def run_grid(matrix, labels, samplers, models, results_path, cv=None, scoring=None, n_jobs=-1,
+             cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Function which evaluates every model on the matrix resampled by every sampler, one cross validation split at a
+    time. The (sampler, model, split) cells are spread over a process pool whose workers memory-map the same read-only
+    matrices from the cache, and every finished cell is appended to a csv file right away. Cells already in that file
+    for the same sampler and model parameters are not computed again, so an interrupted run resumes where it stopped.
+    Like evaluate_balancing in notebook 2, a sampler resamples the whole matrix once and the splits are made on the
+    resampled matrix. The resampled matrices are cached as well.
+    :param matrix: A scipy.sparse matrix, i.e. the output of build_feature_matrix.
+    :param labels: The labels of its rows.
+    :param samplers: A dictionary of imblearn samplers or rebalancing.py methods by name. A sampler of None uses the
+    matrix as it is. When a sampler has a sample_weight_ after fit_resample, the models are fitted with these weights.
+    :param models: A dictionary of scikit-learn models by name.
+    :param results_path: The csv file holding one row per cell.
+    :param cv: The cross validation splitter. It must give the same splits every time for a run to be resumed.
+    Default is RepeatedStratifiedKFold(n_repeats=5, random_state=42).
+    :param scoring: The names of the scikit-learn scorers to compute on the train and test part of every split.
+    Default is DEFAULT_SCORING. A results file written with other scorers is not appended to: a ValueError is raised.
+    :param n_jobs: Number of worker processes. -1 means one per CPU, 1 runs every cell in the current process.
+    :param cache_dir: The folder of the cache.
+    :return: A pandas.DataFrame with the averages over the splits, as returned by summarize_results.
+    """
+    cv = cv if cv is not None else RepeatedStratifiedKFold(n_repeats=5, random_state=42)
+    scoring = scoring or DEFAULT_SCORING
+    matrix = csr_matrix(matrix)
+    labels = np.asarray(labels)
+    # The rows of another matrix or of other splits saved in the same file are kept, but not reused
+    source_key = matrix_hash(matrix, labels)
+    dataset = hashlib.sha256("{}\0{!r}".format(source_key, cv).encode("utf-8")).hexdigest()
+    if not os.path.isdir(_matrix_dir(cache_dir, source_key)):
+        save_matrix(_matrix_dir(cache_dir, source_key), matrix, labels)
+
+    sampler_keys = dict()
+    for sampling_method, sampler in samplers.items():
+        sampler_keys[sampling_method] = source_key if sampler is None else hashlib.sha256(
+            "{}\0{}".format(source_key, estimator_hash(sampler)).encode("utf-8")).hexdigest()
+
+    model_hashes = {model_name: estimator_hash(model) for model_name, model in models.items()}
+
+    columns = ["dataset", "sampling_method", "sampler_key", "model_name", "model_hash", "split", "fit_time"] + \
+        [prefix + metric for metric in scoring for prefix in ("test_", "train_")]
+    if os.path.exists(results_path) and os.path.getsize(results_path) > 0:
+        with open(results_path, "r", newline="") as results_file:
+            header = next(csv.reader(results_file), [])
+        if header != columns:
+            raise ValueError("The results in {} have the columns {}, not {}. Use another results file for these "
+                             "scorers.".format(results_path, header, columns))
+
+    # Rows of a sampler or a model with other parameters under the same name are kept, but not reused
+    rows = [row for row in read_results(results_path) if row["dataset"] == dataset
+            and sampler_keys.get(row["sampling_method"]) == row["sampler_key"]
+            and model_hashes.get(row["model_name"]) == row["model_hash"]]
+    done = {(row["sampling_method"], row["model_name"], row["split"]) for row in rows}
+    cells = [(dataset, sampling_method, sampler_keys[sampling_method], model_name, model_hashes[model_name], split)
+             for sampling_method in samplers for model_name in models for split in range(cv.get_n_splits())
+             if (sampling_method, model_name, split) not in done]
+    resamplings = dict()
+    for _, sampling_method, key, _, _, _ in cells:
+        if samplers[sampling_method] is not None and not os.path.isdir(_matrix_dir(cache_dir, key)):
+            resamplings[key] = (source_key, key, samplers[sampling_method])
+
+    initargs = (cache_dir, models, cv, scoring)
+    pool = None
+    if n_jobs == 1:
+        _init_worker(*initargs)
+        map_function = map
+    else:
+        pool = multiprocessing.Pool(os.cpu_count() if n_jobs < 0 else n_jobs, initializer=_init_worker,
+                                    initargs=initargs)
+        map_function = pool.imap_unordered
+    try:
+        # Samplers first, since the cells of a sampler need its matrix
+        list(map_function(_resample_star, resamplings.values()))
+
+        os.makedirs(os.path.dirname(os.path.abspath(results_path)), exist_ok=True)
+        write_header = not os.path.exists(results_path) or os.path.getsize(results_path) == 0
+        with open(results_path, "a", newline="") as results_file:
+            writer = csv.DictWriter(results_file, fieldnames=columns)
+            if write_header:
+                writer.writeheader()
+            for row in map_function(_evaluate_cell_star, cells):
+                writer.writerow(row)
+                results_file.flush()
+                rows.append(row)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        else:
+            _worker_state.clear()
+
+    # Present the pairs in the order of the dictionaries, whatever the order in which the cells finished
+    order = {(sampling_method, model_name): position for position, (sampling_method, model_name) in
+             enumerate((sampling_method, model_name) for sampling_method in samplers for model_name in models)}
+    rows = sorted((row for row in rows if (row["sampling_method"], row["model_name"]) in order),
+                  key=lambda row: (order[(row["sampling_method"], row["model_name"])], row["split"]))
+    return summarize_results(rows, scoring)
@@ -0,0 +1,293 @@
+import argparse
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import normalize
+
+from classifier import append_dense_columns
+from preprocessing import TokenMatcher, get_manual_feature_names, preprocess_text_batch, translate_series_to_en
+from score_tickets import iter_records
+
+INCREMENTAL_FORMAT_VERSION = 1
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+# Number of hashed term columns. Collisions are rare for a vocabulary of a few thousand stems.
+DEFAULT_N_FEATURES = 1 << 18
+
+CLASSES = np.array([0, 1])
+
+# File of the model directory naming the version to load
+CURRENT_FILE = "current.json"
+
+
+def default_model_dir(data_dir=DEFAULT_DATA_DIR):
+    """
+    :param data_dir: The data folder.
+    :return: The directory in which the incrementally trained model is saved.
+    """
+    return os.path.join(data_dir, "modeling", "incremental")
+
+
+def read_current_version(model_dir):
+    """
+    :param model_dir: The directory of an incrementally trained classifier.
+    :return: The name of the version to load, or None if no version was saved yet.
+    """
+    current_path = os.path.join(model_dir, CURRENT_FILE)
+    if not os.path.isfile(current_path):
+        return None
+    with open(current_path, "r") as current_file:
+        return json.load(current_file)["version"]
+
+
+def parse_label(value):
+    """
+    :param value: A label as read from a csv or json file, i.e. 1, "0", True or "False".
+    :return: The label as 0 or 1.
+    """
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ("true", "false"):
+            return int(value == "true")
+        value = float(value)
+    return int(bool(value))
+
+
+class IncrementalClassifier:
+    """
+    Ticket classifier which is updated with every new batch of labeled tickets instead of being retrained on the whole
+    history. The terms are hashed, so there is no vocabulary to refit, and the document frequencies, the range of the
+    manual features and the class counts are running statistics. The model is an SGDClassifier with the log loss, like
+    the one evaluated in the "Preprocessing and modeling" notebook, trained with partial_fit.
+    The classes are balanced with sample weights computed from the running class counts, since SMOTEENN needs the whole
+    training set.
+    """
+
+    def __init__(self, token_dictionary, n_features=DEFAULT_N_FEATURES, model=None):
+        """
+        :param token_dictionary: dictionary of tokens, where the key is the actual token value and the value is the
+        group that the token is part of.
+        :param n_features: Number of hashed term columns.
+        :param model: An SGDClassifier which supports partial_fit. Default is SGDClassifier(loss='log_loss',
+        random_state=42).
+        """
+        self.token_matcher = TokenMatcher(token_dictionary)
+        self.n_features = n_features
+        self.vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None)
+        self.model = model if model is not None else SGDClassifier(loss="log_loss", random_state=42)
+        manual_feature_count = len(get_manual_feature_names(self.token_matcher))
+        self.document_count = 0
+        self.document_frequency = np.zeros(n_features, dtype=np.int64)
+        self.manual_features_min = np.full(manual_feature_count, np.inf)
+        self.manual_features_max = np.full(manual_feature_count, -np.inf)
+        self.class_counts = np.zeros(len(CLASSES), dtype=np.int64)
+        self.updates = 0
+
+    def idf(self):
+        """
+        :return: The inverse document frequency of every hashed term, smoothed like in TfidfVectorizer.
+        """
+        return np.log((1 + self.document_count) / (1 + self.document_frequency)) + 1
+
+    def scale_manual_features(self, manual_features):
+        """
+        Scale the manual features between 0 and 1 like a MinMaxScaler fitted on every batch seen so far. A feature
+        which never changed is only shifted, like MinMaxScaler does.
+        :param manual_features: A numpy array whose columns are in the order given by get_manual_feature_names.
+        :return: The scaled manual features as a numpy array.
+        """
+        data_range = self.manual_features_max - self.manual_features_min
+        data_range[data_range == 0] = 1
+        return (manual_features - self.manual_features_min) / data_range
+
+    def preprocess(self, texts, translate=True):
+        """
+        :param texts: A list or pandas.Series of ticket texts.
+        :param translate: Flag. If set to True, translate the texts into English first. Default is True.
+        :return: The hashed term counts as a scipy.sparse.csr_matrix and the manual features as a numpy array.
+        """
+        if translate:
+            texts = translate_series_to_en(pd.Series(list(texts), dtype=object))
+        cleaned_texts, manual_features = preprocess_text_batch(texts, self.token_matcher, dtype=np.float64)
+        return self.vectorizer.transform(cleaned_texts), manual_features
+
+    def transform_preprocessed(self, counts, manual_features):
+        """
+        :param counts: The hashed term counts returned by preprocess.
+        :param manual_features: The manual features returned by preprocess.
+        :return: A scipy.sparse.csr_matrix with the l2 normalized tf-idf values followed by the scaled manual features.
+        """
+        tfidf = counts.copy()
+        tfidf.data *= self.idf()[tfidf.indices]
+        return append_dense_columns(normalize(tfidf), self.scale_manual_features(manual_features))
+
+    def partial_fit(self, texts, labels, translate=True):
+        """
+        Update the statistics and the model with a batch of labeled tickets. Only the new tickets are translated and
+        preprocessed, so the cost of an update depends on the size of the batch, not on the history.
+        :param texts: A list or pandas.Series of ticket texts.
+        :param labels: The label of every text, 0 or 1.
+        :param translate: Flag. If set to True, translate the texts into English first. Default is True.
+        :return: The IncrementalClassifier itself.
+        """
+        labels = np.asarray(labels, dtype=np.int64)
+        counts, manual_features = self.preprocess(texts, translate)
+
+        # The statistics are updated before the batch is transformed, so its own terms and ranges are included
+        self.document_count += counts.shape[0]
+        self.document_frequency += np.bincount(counts.indices, minlength=self.n_features)
+        if len(manual_features):
+            np.minimum(self.manual_features_min, manual_features.min(axis=0), out=self.manual_features_min)
+            np.maximum(self.manual_features_max, manual_features.max(axis=0), out=self.manual_features_max)
+        self.class_counts += np.bincount(labels, minlength=len(CLASSES))
+
+        # Same weights as class_weight='balanced', computed on every ticket seen so far
+        class_weights = self.class_counts.sum() / (len(CLASSES) * np.maximum(self.class_counts, 1))
+        self.model.partial_fit(self.transform_preprocessed(counts, manual_features), labels, classes=CLASSES,
+                               sample_weight=class_weights[labels])
+        self.updates += 1
+        return self
+
+    def predict_proba(self, texts, translate=True):
+        """
+        Score a batch of ticket texts.
+        :param texts: A list or pandas.Series of ticket texts.
+        :param translate: Flag. If set to True, translate the texts into English first. Default is True.
+        :return: A numpy array of shape (len(texts), 2) with the probabilities of the negative and positive class.
+        """
+        return self.model.predict_proba(self.transform_preprocessed(*self.preprocess(texts, translate)))
+
+    def save(self, model_dir):
+        """
+        Save the classifier as a new version in model_dir: the statistics as .npy files, the model as a pickle and the
+        rest in a json manifest. The version is made current by replacing current.json at the end, which is atomic,
+        so a reader loads either the previous version or the new one, never half of an update. The previous version
+        is kept for the readers which are still loading it, the older ones are removed.
+        :param model_dir: The directory in which to save the classifier.
+        :return: The name of the new version.
+        """
+        os.makedirs(model_dir, exist_ok=True)
+        version_dir = tempfile.mkdtemp(dir=model_dir, prefix="update_{}_".format(self.updates))
+        arrays = {"document_frequency": self.document_frequency, "manual_features_min": self.manual_features_min,
+                  "manual_features_max": self.manual_features_max, "class_counts": self.class_counts}
+        for name, array in arrays.items():
+            np.save(os.path.join(version_dir, name + ".npy"), array)
+        with open(os.path.join(version_dir, "model.pkl"), "wb") as model_file:
+            pickle.dump(self.model, model_file)
+        manifest = {"format_version": INCREMENTAL_FORMAT_VERSION, "n_features": self.n_features,
+                    "document_count": self.document_count, "updates": self.updates,
+                    "manual_features": get_manual_feature_names(self.token_matcher),
+                    "token_dictionary": self.token_matcher.token_dictionary}
+        with open(os.path.join(version_dir, "manifest.json"), "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=1)
+
+        previous_version = read_current_version(model_dir)
+        version = os.path.basename(version_dir)
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=model_dir, suffix=".json")
+        with os.fdopen(file_descriptor, "w") as current_file:
+            json.dump({"version": version}, current_file)
+        os.replace(tmp_path, os.path.join(model_dir, CURRENT_FILE))
+
+        for name in os.listdir(model_dir):
+            if name.startswith("update_") and name not in (version, previous_version):
+                shutil.rmtree(os.path.join(model_dir, name), ignore_errors=True)
+        return version
+
+    @classmethod
+    def load(cls, model_dir):
+        """
+        Load the current version of a classifier saved by save.
+        :param model_dir: The directory of the classifier.
+        :return: An IncrementalClassifier instance.
+        """
+        version = read_current_version(model_dir)
+        if version is None:
+            raise ValueError("There is no incrementally trained classifier in {}".format(model_dir))
+        version_dir = os.path.join(model_dir, version)
+        with open(os.path.join(version_dir, "manifest.json"), "r") as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("format_version") != INCREMENTAL_FORMAT_VERSION:
+            raise ValueError("Incremental model format version {} is not supported, expected {}".format(
+                manifest.get("format_version"), INCREMENTAL_FORMAT_VERSION))
+        with open(os.path.join(version_dir, "model.pkl"), "rb") as model_file:
+            model = pickle.load(model_file)
+
+        classifier = cls(manifest["token_dictionary"], manifest["n_features"], model)
+        if manifest["manual_features"] != get_manual_feature_names(classifier.token_matcher):
+            raise ValueError("The model was saved with the manual features in another order than the one computed by "
+                             "preprocessing: {}".format(manifest["manual_features"]))
+        classifier.document_count = manifest["document_count"]
+        classifier.updates = manifest["updates"]
+        for name in ["document_frequency", "manual_features_min", "manual_features_max", "class_counts"]:
+            setattr(classifier, name, np.load(os.path.join(version_dir, name + ".npy")))
+        return classifier
+
+
+def update_from_file(path, model_dir, token_dictionary=None, input_format=None, text_field="Description",
+                     label_field="is_about_order_status", batch_size=256, translate=True, log=sys.stderr):
+    """
+    Function which streams a file of new labeled tickets, updates the saved classifier batch by batch and saves it
+    once at the end. A new classifier is created if there is none in model_dir yet.
+    :param path: Path of a json array, jsonl or csv file with the new tickets.
+    :param model_dir: The directory of the classifier.
+    :param token_dictionary: The token dictionary of a new classifier. Default is data/token_dictionary.json.
+    :param input_format: "json", "jsonl" or "csv". Default is guessed from the file.
+    :param text_field: The field containing the ticket text.
+    :param label_field: The field containing the label.
+    :param batch_size: Number of tickets per partial_fit call.
+    :param translate: Flag. If set to True, translate the texts into English first. Default is True.
+    :param log: Where to write the progress. None disables it.
+    :return: The updated IncrementalClassifier.
+    """
+    if read_current_version(model_dir) is not None:
+        classifier = IncrementalClassifier.load(model_dir)
+    else:
+        if token_dictionary is None:
+            with open(os.path.join(DEFAULT_DATA_DIR, "token_dictionary.json"), "r") as token_dict_file:
+                token_dictionary = json.load(token_dict_file)
+        classifier = IncrementalClassifier(token_dictionary)
+
+    start = time.perf_counter()
+    records = iter_records(path, input_format)
+    ticket_count = 0
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        classifier.partial_fit([record[text_field] or "" for record in batch],
+                               [parse_label(record[label_field]) for record in batch], translate)
+        ticket_count += len(batch)
+        if log is not None:
+            log.write("{} tickets learned in {:.1f}s\n".format(ticket_count, time.perf_counter() - start))
+
+    classifier.save(model_dir)
+    return classifier
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the incrementally trained classifier with a file of new "
+                                                 "labeled tickets (json array, jsonl or csv).")
+    parser.add_argument("input", help="The file with the new labeled tickets.")
+    parser.add_argument("--model-dir", default=default_model_dir(), help="The directory of the classifier. Default is "
+                                                                         "data/modeling/incremental.")
+    parser.add_argument("--format", choices=["json", "jsonl", "csv"], default=None,
+                        help="Format of the input. Default is guessed from the file.")
+    parser.add_argument("--text-field", default="Description", help="The field containing the ticket text.")
+    parser.add_argument("--label-field", default="is_about_order_status", help="The field containing the label.")
+    parser.add_argument("--batch-size", type=int, default=256, help="Number of tickets learned at once.")
+    parser.add_argument("--no-translate", action="store_true", help="Do not translate the texts into English.")
+    args = parser.parse_args()
+
+    update_from_file(args.input, args.model_dir, input_format=args.format, text_field=args.text_field,
+                     label_field=args.label_field, batch_size=args.batch_size, translate=not args.no_translate)
@@ -0,0 +1,161 @@
+import ast
+from array import array
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from score_tickets import iter_records
+
+
+def parse_tags(value):
+    """
+    Function which reads the tags of a record: a list, like in data/technical_test_data.json, or a string holding a
+    list, like in a csv export, or a comma separated string.
+    :param value: The value of the tag field.
+    :return: A list of tags, without duplicates, in the order they appear.
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return []
+        if value.startswith("["):
+            value = ast.literal_eval(value)
+        else:
+            value = [tag.strip() for tag in value.split(",")]
+    return list(dict.fromkeys(str(tag) for tag in value))
+
+
+class TagIndex:
+    """
+    Sparse multi-hot index of the tags of the tickets: a CSR matrix with one row per ticket and one column per tag,
+    holding a 1 where the ticket has the tag, and the tag vocabulary mapping every tag to its column. It replaces the
+    dense 0/1 column per tag of the "Labeling the data" notebook: the counts and the queries are sparse matrix
+    operations, so they cost the number of tags set, not the number of tickets times the number of tags.
+    """
+
+    def __init__(self, matrix, tags, ids=None, texts=None):
+        """
+        :param matrix: The scipy.sparse incidence matrix, one row per ticket and one column per tag.
+        :param tags: The list of tags, in the order of the columns.
+        :param ids: The ids of the tickets, in the order of the rows. Default is the row numbers.
+        :param texts: The texts of the tickets, in the order of the rows. Optional.
+        """
+        self.matrix = sparse.csr_matrix(matrix, dtype=np.int8)
+        self.tags = list(tags)
+        self.tag_columns = {tag: column for column, tag in enumerate(self.tags)}
+        self.ids = np.arange(self.matrix.shape[0]) if ids is None else np.asarray(ids)
+        self.texts = texts
+
+    @classmethod
+    def from_records(cls, records, tag_field="tags", id_field="id", text_field="Description"):
+        """
+        Build the index from a stream of records. Only the tags, the id and the text of every record are kept, so the
+        records can come straight from a file, see from_file.
+        :param records: An iterable of dictionaries, one per ticket.
+        :param tag_field: The field containing the tags.
+        :param id_field: The field containing the ticket id. If a record has none, its position is used.
+        :param text_field: The field containing the ticket text. None to not keep the texts.
+        :return: A TagIndex instance. The tags are numbered in the order they are first seen.
+        """
+        tag_columns = dict()
+        indices = array("q")
+        indptr = array("q", [0])
+        ids = []
+        texts = [] if text_field is not None else None
+        for position, record in enumerate(records):
+            for tag in parse_tags(record.get(tag_field)):
+                column = tag_columns.get(tag)
+                if column is None:
+                    column = tag_columns[tag] = len(tag_columns)
+                indices.append(column)
+            indptr.append(len(indices))
+            ids.append(record.get(id_field, position))
+            if texts is not None:
+                texts.append(record.get(text_field) or "")
+
+        indices = np.frombuffer(indices, dtype=np.int64) if indices else np.zeros(0, dtype=np.int64)
+        matrix = sparse.csr_matrix((np.ones(len(indices), dtype=np.int8), indices, np.frombuffer(indptr, np.int64)),
+                                   shape=(len(ids), len(tag_columns)))
+        return cls(matrix, tag_columns, ids, texts)
+
+    @classmethod
+    def from_file(cls, path, input_format=None, tag_field="tags", id_field="id", text_field="Description"):
+        """
+        Build the index from a ticket export, read record by record, like data/technical_test_data.json.
+        :param path: Path of a json array, jsonl or csv file.
+        :param input_format: "json", "jsonl" or "csv". Default is guessed from the file.
+        :return: A TagIndex instance, see from_records for the other parameters.
+        """
+        return cls.from_records(iter_records(path, input_format), tag_field, id_field, text_field)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def tag_vector(self, tags):
+        """
+        :param tags: A tag or an iterable of tags. Tags not in the index are ignored.
+        :return: A numpy array with one value per tag of the index, 1 for the given tags and 0 for the others.
+        """
+        if isinstance(tags, str):
+            tags = [tags]
+        vector = np.zeros(len(self.tags), dtype=np.int8)
+        vector[[self.tag_columns[tag] for tag in tags if tag in self.tag_columns]] = 1
+        return vector
+
+    def tag_counts(self):
+        """
+        :return: A pandas.Series with the number of tickets having each tag, indexed by tag.
+        """
+        return pd.Series(np.bincount(self.matrix.indices, minlength=len(self.tags)), index=self.tags)
+
+    def matching_counts(self, tags):
+        """
+        :param tags: A tag or an iterable of tags.
+        :return: A numpy array with, for every ticket, how many of the given tags it has.
+        """
+        return self.matrix.astype(np.int32) @ self.tag_vector(tags).astype(np.int32)
+
+    def has_any(self, tags):
+        """
+        :param tags: A tag or an iterable of tags.
+        :return: A boolean numpy array, True for the tickets having at least one of the tags.
+        """
+        return self.matching_counts(tags) > 0
+
+    def has_none(self, tags):
+        """
+        :param tags: A tag or an iterable of tags.
+        :return: A boolean numpy array, True for the tickets having none of the tags.
+        """
+        return ~self.has_any(tags)
+
+    def rows_with_any(self, tags):
+        """
+        :param tags: A tag or an iterable of tags.
+        :return: The row numbers of the tickets having at least one of the tags.
+        """
+        return np.flatnonzero(self.has_any(tags))
+
+    def rows_with_none(self, tags):
+        """
+        :param tags: A tag or an iterable of tags.
+        :return: The row numbers of the tickets having none of the tags, i.e. the tickets not checked yet.
+        """
+        return np.flatnonzero(self.has_none(tags))
+
+    def label(self, rules, default=0, labels=None):
+        """
+        Function which labels the tickets from their tags. The rules are applied in order, so a later rule overrides an
+        earlier one for the tickets matching both.
+        :param rules: A list of (tags, label) tuples: every ticket having any of the tags gets the label.
+        :param default: The label of the tickets no rule matches.
+        :param labels: Labels to start from instead of default, i.e. the ones set by hand. They are not modified.
+        :return: A numpy array with the label of every ticket.
+        """
+        labels = np.full(len(self), default) if labels is None else np.array(labels)
+        for tags, label in rules:
+            labels[self.has_any(tags)] = label
+        return labels
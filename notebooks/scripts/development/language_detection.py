@@ -0,0 +1,108 @@
+import re
+
+from langdetect.detector_factory import DetectorFactory, PROFILES_DIRECTORY
+from langdetect.lang_detect_exception import LangDetectException
+from spacy.lang.en.stop_words import STOP_WORDS
+
+# Same spans as TokenMatcher.span_regex: the placeholder tokens, i.e. __NAME__ or _ORDER_NUMBER_
+TOKEN_SPAN_REGEX = re.compile(r'_[A-Z_]*_')
+WORD_REGEX = re.compile(r'[A-Za-z]+')
+
+
+class LanguageDetector:
+    """
+    Language identification placed in front of the translation. Most tickets are English, so langdetect is skipped
+    for them:
+
+    1. The placeholder tokens are removed, as they are not words of any language.
+    2. A text with fewer than min_words words is too short to tell. It is not detected, and so not translated.
+    3. A plain ASCII text in which at least min_stop_word_ratio of the words are English stop words is English.
+    4. Any other text goes to langdetect, with its language profiles loaded once and a fixed seed, so the same text
+    always gets the same language.
+
+    Every text gets a language (None when unknown) and a confidence between 0 and 1. Only the texts detected as not
+    English with a confidence of at least min_confidence should be translated, see should_translate.
+    """
+
+    def __init__(self, min_stop_word_ratio=0.3, min_words=3, min_confidence=0.7, seed=0):
+        """
+        :param min_stop_word_ratio: Share of English stop words above which a plain ASCII text is English.
+        :param min_words: Minimum number of words to detect the language of a text.
+        :param min_confidence: Minimum confidence for a text to be translated.
+        :param seed: Seed of langdetect, which samples the n-grams of a text at random.
+        """
+        self.min_stop_word_ratio = min_stop_word_ratio
+        self.min_words = min_words
+        self.min_confidence = min_confidence
+        self.factory = DetectorFactory()
+        self.factory.load_profile(PROFILES_DIRECTORY)
+        self.factory.set_seed(seed)
+        # Number of texts decided by the shortcuts and by langdetect
+        self.shortcut_count = 0
+        self.detector_count = 0
+
+    def detect(self, text):
+        """
+        Detect the language of a text.
+        :param text: The text, with its placeholder tokens.
+        :return: A tuple of (language code or None, confidence).
+        """
+        text = TOKEN_SPAN_REGEX.sub(" ", text)
+        words = WORD_REGEX.findall(text)
+        if len(words) < self.min_words:
+            self.shortcut_count += 1
+            return None, 0.0
+        if text.isascii():
+            stop_word_count = sum(1 for word in words if word.lower() in STOP_WORDS)
+            if stop_word_count >= self.min_stop_word_ratio * len(words):
+                self.shortcut_count += 1
+                return 'en', 1.0
+
+        self.detector_count += 1
+        detector = self.factory.create()
+        detector.append(text)
+        try:
+            probabilities = detector.get_probabilities()
+        except LangDetectException:
+            return None, 0.0
+        if not probabilities:
+            return None, 0.0
+        return probabilities[0].lang, probabilities[0].prob
+
+    def detect_each(self, texts):
+        """
+        Detect the language of many texts, one at a time with detect: langdetect has no batch mode, so nothing is
+        amortized across texts, except that a text repeated in texts is only detected once.
+        :param texts: An iterable of texts.
+        :return: A list of (language code or None, confidence) tuples, in the same order as texts.
+        """
+        detected = dict()
+        results = []
+        for text in texts:
+            if text not in detected:
+                detected[text] = self.detect(text)
+            results.append(detected[text])
+        return results
+
+    def should_translate(self, language, confidence):
+        """
+        :param language: The language returned by detect.
+        :param confidence: The confidence returned by detect.
+        :return: True if the text is confidently in a language other than English.
+        """
+        return language is not None and language != 'en' and confidence >= self.min_confidence
+
+
+_language_detector = None
+
+
+def get_language_detector():
+    """
+    Function which returns the LanguageDetector used by the translation backends, loading the language profiles the
+    first time.
+    :return: A LanguageDetector instance.
+    """
+    global _language_detector
+    if _language_detector is None:
+        _language_detector = LanguageDetector()
+    return _language_detector
@@ -0,0 +1,354 @@
+import re
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from preprocessing import TokenMatcher, preprocess_text_batch, translate_series_to_en, warm_stemmer
+
+# Constants used by libsvm to turn the Platt sigmoid of a binary SVC into the probabilities returned by predict_proba
+LIBSVM_MIN_PROB = 1e-7
+LIBSVM_MAX_ITER = 100
+LIBSVM_EPS = 0.005 / 2
+
+
+def sigmoid_predict(decision_values, prob_a, prob_b):
+    """
+    Function which applies the Platt sigmoid 1 / (1 + exp(A * f + B)) the same way libsvm does, without overflowing
+    for large decision values.
+    :param decision_values: A numpy array of decision values, in the libsvm sign convention.
+    :param prob_a: The Platt A parameter.
+    :param prob_b: The Platt B parameter.
+    :return: A numpy array of probabilities.
+    """
+    f = decision_values * prob_a + prob_b
+    exp_f = np.exp(-np.abs(f))
+    return np.where(f >= 0, exp_f / (1 + exp_f), 1 / (1 + exp_f))
+
+
+def couple_binary_probabilities(pairwise_probabilities):
+    """
+    Function which runs libsvm's multiclass_probability on two classes, for a whole batch at once. For two classes it
+    only moves the sigmoid by a few thousandths, because libsvm stops iterating once the error is below 0.0025, but it
+    is needed to give the same probabilities as SVC.predict_proba.
+    :param pairwise_probabilities: A numpy array with, for every sample, the probability of the first libsvm class.
+    :return: A numpy array of shape (n, 2) with the probabilities of both libsvm classes.
+    """
+    r01 = np.clip(pairwise_probabilities, LIBSVM_MIN_PROB, 1 - LIBSVM_MIN_PROB)
+    r10 = 1 - r01
+    q = np.array([[r10 * r10, -r10 * r01], [-r10 * r01, r01 * r01]])
+    p = np.full((2, len(r01)), 0.5)
+    active = np.ones(len(r01), dtype=bool)
+
+    for _ in range(LIBSVM_MAX_ITER):
+        qp = np.einsum("tjn,jn->tn", q, p)
+        pqp = (p * qp).sum(axis=0)
+        active &= np.abs(qp - pqp).max(axis=0) >= LIBSVM_EPS
+        if not active.any():
+            break
+        for t in range(2):
+            # Samples which already converged get a 0 step, which leaves them unchanged
+            diff = np.where(active, (pqp - qp[t]) / q[t, t], 0)
+            p[t] += diff
+            pqp = (pqp + diff * (diff * q[t, t] + 2 * qp[t])) / (1 + diff) / (1 + diff)
+            qp = (qp + diff * q[t]) / (1 + diff)
+            p /= 1 + diff
+    return p.T
+
+
+class SortedVocabulary:
+    """
+    Vocabulary kept as one sorted numpy array of UTF-8 encoded terms, the column of a term being its position in the
+    array. It takes a fraction of the memory of a dictionary, can be memory-mapped from a model bundle, and the tokens
+    of a whole batch are looked up with one binary search. The vocabulary of a tf-idf vectorizer is already sorted.
+    """
+
+    def __init__(self, terms):
+        """
+        :param terms: A numpy bytes array of the UTF-8 encoded terms, sorted and without duplicates.
+        """
+        # asanyarray keeps a numpy.memmap as it is
+        terms = np.asanyarray(terms)
+        if terms.dtype.kind != "S":
+            raise ValueError("The terms must be a numpy bytes array, got {}".format(terms.dtype))
+        if len(terms) > 1 and not np.all(terms[:-1] < terms[1:]):
+            raise ValueError("The terms are not sorted or have duplicates")
+        self.terms = terms
+
+    @classmethod
+    def from_dict(cls, vocabulary):
+        """
+        :param vocabulary: dictionary of term -> column, whose columns are in the alphabetical order of the terms.
+        :return: A SortedVocabulary instance with the same columns.
+        """
+        terms = sorted(vocabulary, key=vocabulary.get)
+        if [vocabulary[term] for term in terms] != list(range(len(terms))):
+            raise ValueError("The columns of the vocabulary are not 0 to {}".format(len(terms) - 1))
+        return cls(np.array([term.encode("utf-8") for term in terms], dtype=bytes))
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __iter__(self):
+        return iter(np.char.decode(self.terms, "utf-8").tolist())
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def get(self, term, default=None):
+        """
+        :param term: A term.
+        :param default: The value returned for a term not in the vocabulary.
+        :return: The column of the term, or default.
+        """
+        column = self.lookup([term])[0]
+        return int(column) if column >= 0 else default
+
+    def lookup(self, tokens):
+        """
+        :param tokens: A list of tokens.
+        :return: A numpy array with the column of every token, -1 for the tokens not in the vocabulary.
+        """
+        if not tokens or not len(self.terms):
+            return np.full(len(tokens), -1, dtype=np.int64)
+        encoded_tokens = [token.encode("utf-8") for token in tokens]
+        # The keys are cut to the width of the terms, so that the terms are not copied to a wider dtype. A token
+        # longer than every term is not in the vocabulary, whatever its first bytes match.
+        keys = np.array(encoded_tokens, dtype=self.terms.dtype)
+        columns = np.searchsorted(self.terms, keys)
+        found = self.terms[np.minimum(columns, len(self.terms) - 1)] == keys
+        found &= np.fromiter(map(len, encoded_tokens), dtype=np.int64, count=len(tokens)) <= self.terms.itemsize
+        return np.where(found, columns, -1)
+
+
+def vocabulary_terms(vocabulary):
+    """
+    :param vocabulary: A SortedVocabulary or a dictionary of term -> column.
+    :return: A numpy bytes array with the UTF-8 encoded terms, in the order of their columns.
+    """
+    if isinstance(vocabulary, SortedVocabulary):
+        return vocabulary.terms
+    return np.array([term.encode("utf-8") for term in sorted(vocabulary, key=vocabulary.get)], dtype=bytes)
+
+
+def export_components(classifier):
+    """
+    Function which extracts the fitted parameters of a TicketClassifier whose model is a linear SVC with
+    probability=True, checking that the vectorizer and the scaler can be folded into the model weights.
+    :param classifier: A TicketClassifier instance.
+    :return: A dictionary with the keyword arguments of LinearScorer.from_components.
+    """
+    tfidf_vec, scaler, model = classifier.tfidf_vec, classifier.scaler, classifier.model
+    if getattr(model, "kernel", None) != "linear" or len(getattr(model, "probA_", [])) != 1:
+        raise ValueError("Only a binary SVC with kernel='linear' and probability=True can be exported")
+    if (tfidf_vec.analyzer != "word" or tuple(tfidf_vec.ngram_range) != (1, 1) or tfidf_vec.stop_words is not None
+            or tfidf_vec.strip_accents is not None or tfidf_vec.preprocessor is not None
+            or tfidf_vec.tokenizer is not None):
+        raise ValueError("Only a tf-idf vectorizer on single words given by its token_pattern can be exported")
+    if getattr(scaler, "clip", False):
+        raise ValueError("A scaler with clip=True cannot be folded into the weights")
+
+    coefficients = model.coef_.toarray() if hasattr(model.coef_, "toarray") else np.asarray(model.coef_)
+    term_count = len(tfidf_vec.vocabulary_)
+    return {"vocabulary": dict(tfidf_vec.vocabulary_),
+            "idf": np.array(tfidf_vec.idf_ if tfidf_vec.use_idf else np.ones(term_count), dtype=np.float64),
+            "coefficients": coefficients.ravel().astype(np.float64),
+            "intercept": float(model.intercept_[0]),
+            "scaler_scale": np.array(scaler.scale_, dtype=np.float64),
+            "scaler_min": np.array(scaler.min_, dtype=np.float64),
+            "prob_a": float(model.probA_[0]),
+            "prob_b": float(model.probB_[0]),
+            "token_dictionary": dict(classifier.token_matcher.token_dictionary),
+            "norm": tfidf_vec.norm,
+            "sublinear_tf": tfidf_vec.sublinear_tf,
+            "binary": tfidf_vec.binary,
+            "token_pattern": tfidf_vec.token_pattern,
+            "lowercase": tfidf_vec.lowercase}
+
+
+def fold_components(idf, coefficients, intercept, scaler_scale, scaler_min):
+    """
+    Function which folds the idf into the term weights and the MinMaxScaler into the manual feature weights and the
+    bias.
+    :param idf: A numpy array with the idf of every term.
+    :param coefficients: A numpy array with the model weight of every term followed by every manual feature.
+    :param intercept: The model intercept.
+    :param scaler_scale: A numpy array with the scale_ of the MinMaxScaler.
+    :param scaler_min: A numpy array with the min_ of the MinMaxScaler.
+    :return: A dictionary with the term_weights, manual_weights and bias arguments of LinearScorer.
+    """
+    term_count = len(idf)
+    manual_coefficients = coefficients[term_count:]
+    return {"term_weights": coefficients[:term_count] * idf,
+            "manual_weights": manual_coefficients * scaler_scale,
+            "bias": float(intercept + manual_coefficients @ scaler_min)}
+
+
+class LinearScorer:
+    """
+    Scorer which gives the probabilities of a linear SVC trained on tf-idf features and MinMax scaled manual features,
+    with only a sparse dot product and a sigmoid. The idf weights are folded into the term weights and the scaler into
+    the manual feature weights and the bias, so it works on the raw term counts and raw manual features.
+    """
+
+    def __init__(self, vocabulary, term_weights, idf, manual_weights, bias, prob_a, prob_b, token_dictionary,
+                 norm="l2", sublinear_tf=False, binary=False, token_pattern=r"(?u)\b\w\w+\b", lowercase=True,
+                 version=None):
+        """
+        :param vocabulary: A SortedVocabulary or a dictionary of term -> column of the term in term_weights and idf.
+        :param term_weights: A numpy array with the model weight of every term multiplied by its idf.
+        :param idf: A numpy array with the idf of every term, needed for the norm of the tf-idf vector.
+        :param manual_weights: A numpy array with the model weight of every manual feature multiplied by its scale.
+        :param bias: The model intercept plus the part of the scaler offsets seen by the model.
+        :param prob_a: The Platt A parameter of the model.
+        :param prob_b: The Platt B parameter of the model.
+        :param token_dictionary: dictionary of tokens, where the key is the actual token value and the value is the
+        group that the token is part of.
+        :param norm: The norm of the tf-idf vectorizer: "l2", "l1" or None.
+        :param sublinear_tf: The sublinear_tf flag of the tf-idf vectorizer.
+        :param binary: The binary flag of the tf-idf vectorizer.
+        :param token_pattern: The token pattern of the tf-idf vectorizer.
+        :param lowercase: The lowercase flag of the tf-idf vectorizer.
+        :param version: Optional identifier of the exported model, i.e. the hash of a model bundle.
+        """
+        self.vocabulary = vocabulary
+        self.term_weights = term_weights
+        self.idf = idf
+        self.manual_weights = manual_weights
+        self.bias = bias
+        self.prob_a = prob_a
+        self.prob_b = prob_b
+        self.token_matcher = TokenMatcher(token_dictionary)
+        self.norm = norm
+        self.sublinear_tf = sublinear_tf
+        self.binary = binary
+        self.lowercase = lowercase
+        self.version = version
+        self._token_regex = re.compile(token_pattern)
+        # The terms of the vocabulary are stems, and most of them stem to themselves
+        warm_stemmer(vocabulary)
+
+    @classmethod
+    def from_components(cls, vocabulary, idf, coefficients, intercept, scaler_scale, scaler_min, prob_a, prob_b,
+                        token_dictionary, version=None, **vectorizer_params):
+        """
+        Fold the fitted parameters of the tf-idf vectorizer, the scaler and the model into a LinearScorer.
+        :param vocabulary: A SortedVocabulary or a dictionary of term -> column of the term in the tf-idf matrix.
+        :param idf: A numpy array with the idf of every term.
+        :param coefficients: A numpy array with the model weight of every term followed by every manual feature.
+        :param intercept: The model intercept.
+        :param scaler_scale: A numpy array with the scale_ of the MinMaxScaler.
+        :param scaler_min: A numpy array with the min_ of the MinMaxScaler.
+        :param prob_a: The Platt A parameter of the model.
+        :param prob_b: The Platt B parameter of the model.
+        :param token_dictionary: dictionary of tokens, where the key is the actual token value and the value is the
+        group that the token is part of.
+        :param version: Optional identifier of the exported model, i.e. the hash of a model bundle.
+        :param vectorizer_params: The norm, sublinear_tf, binary, token_pattern and lowercase of the vectorizer.
+        :return: A LinearScorer instance.
+        """
+        return cls(vocabulary=vocabulary,
+                   idf=idf,
+                   **fold_components(idf, coefficients, intercept, scaler_scale, scaler_min),
+                   prob_a=float(prob_a),
+                   prob_b=float(prob_b),
+                   token_dictionary=token_dictionary,
+                   version=version,
+                   **vectorizer_params)
+
+    @classmethod
+    def from_classifier(cls, classifier):
+        """
+        Export the weights of a TicketClassifier whose model is a linear SVC with probability=True.
+        :param classifier: A TicketClassifier instance.
+        :return: A LinearScorer instance giving the same probabilities as classifier.
+        """
+        return cls.from_components(**export_components(classifier))
+
+    def count_terms(self, cleaned_texts):
+        """
+        Count the terms of the vocabulary in every text, the way the tf-idf vectorizer tokenizes them.
+        :param cleaned_texts: An iterable of texts preprocessed by preprocess_text_series or preprocess_text_batch.
+        :return: A scipy.sparse.csr_matrix with one row per text and one column per term of the vocabulary.
+        """
+        if isinstance(self.vocabulary, SortedVocabulary):
+            return self._count_sorted_terms(cleaned_texts)
+        indptr = [0]
+        indices = []
+        for text in cleaned_texts:
+            if self.lowercase:
+                text = text.lower()
+            for token in self._token_regex.findall(text):
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    indices.append(column)
+            indptr.append(len(indices))
+        counts = csr_matrix((np.ones(len(indices)), indices, indptr), shape=(len(indptr) - 1, len(self.idf)))
+        counts.sum_duplicates()
+        return counts
+
+    def _count_sorted_terms(self, cleaned_texts):
+        """
+        count_terms for a SortedVocabulary: the tokens of all texts are looked up at once.
+        """
+        indptr = [0]
+        tokens = []
+        for text in cleaned_texts:
+            if self.lowercase:
+                text = text.lower()
+            tokens.extend(self._token_regex.findall(text))
+            indptr.append(len(tokens))
+        columns = self.vocabulary.lookup(tokens)
+        known = columns >= 0
+        # Every row ends after the known tokens of the rows above it and its own
+        indptr = np.concatenate([[0], np.cumsum(known)])[indptr]
+        counts = csr_matrix((np.ones(np.count_nonzero(known)), columns[known], indptr),
+                            shape=(len(indptr) - 1, len(self.idf)))
+        counts.sum_duplicates()
+        return counts
+
+    def decision_function(self, cleaned_texts, manual_features):
+        """
+        Compute the decision values of the model, in the sklearn sign convention (positive for the positive class).
+        :param cleaned_texts: An iterable of texts preprocessed by preprocess_text_series or preprocess_text_batch.
+        :param manual_features: A numpy array whose columns are in the order given by get_manual_feature_names.
+        :return: A numpy array with one decision value per text.
+        """
+        counts = self.count_terms(cleaned_texts)
+        if self.binary:
+            counts.data[:] = 1
+        elif self.sublinear_tf:
+            counts.data = 1 + np.log(counts.data)
+
+        term_scores = counts @ self.term_weights
+        if self.norm is not None:
+            if self.norm == "l2":
+                norms = np.sqrt(counts.multiply(counts) @ (self.idf * self.idf))
+            else:
+                norms = counts @ self.idf
+            # Texts without any known term have a 0 tf-idf vector, which the vectorizer leaves as it is
+            term_scores = np.divide(term_scores, norms, out=np.zeros_like(term_scores), where=norms > 0)
+        return term_scores + np.asarray(manual_features, dtype=np.float64) @ self.manual_weights + self.bias
+
+    def predict_proba_preprocessed(self, cleaned_texts, manual_features):
+        """
+        Score already preprocessed texts.
+        :param cleaned_texts: An iterable of texts preprocessed by preprocess_text_series or preprocess_text_batch.
+        :param manual_features: A numpy array whose columns are in the order given by get_manual_feature_names.
+        :return: A numpy array of shape (len(cleaned_texts), 2) with the probabilities of the negative and positive
+        class.
+        """
+        # libsvm keeps the decision values of a binary SVC with the opposite sign of sklearn
+        decision_values = -self.decision_function(cleaned_texts, manual_features)
+        return couple_binary_probabilities(sigmoid_predict(decision_values, self.prob_a, self.prob_b))
+
+    def predict_proba(self, texts, translate=True):
+        """
+        Score a batch of ticket texts.
+        :param texts: A list or pandas.Series of ticket texts.
+        :param translate: Flag. If set to True, translate the texts into English first. Default is True.
+        :return: A numpy array of shape (len(texts), 2) with the probabilities of the negative and positive class.
+        """
+        if translate:
+            texts = translate_series_to_en(pd.Series(list(texts), dtype=object))
+        return self.predict_proba_preprocessed(*preprocess_text_batch(texts, self.token_matcher, dtype=np.float64))
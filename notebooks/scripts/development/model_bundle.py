@@ -0,0 +1,232 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from linear_scorer import LinearScorer, SortedVocabulary, export_components, fold_components, vocabulary_terms
+from preprocessing import get_manual_feature_names
+
+BUNDLE_FORMAT_VERSION = 1
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+# Parameters of the tf-idf vectorizer kept in the manifest, needed to tokenize the texts the same way
+VECTORIZER_PARAMS = ["norm", "sublinear_tf", "binary", "token_pattern", "lowercase"]
+
+
+def default_bundle_dir(model_number=1, data_dir=DEFAULT_DATA_DIR):
+    """
+    :param model_number: The number of the model, i.e. 1 for the artifacts saved as tfidf_1.pkl, scaler_1.pkl and
+    model_1_with_mf.pkl.
+    :param data_dir: The data folder.
+    :return: The directory in which the bundle of that model is saved.
+    """
+    return os.path.join(data_dir, "modeling", "bundle_{}".format(model_number))
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as bundle_file:
+        for block in iter(lambda: bundle_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _manifest_hash(manifest):
+    content = {key: value for key, value in manifest.items() if key != "hash"}
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def save_bundle(classifier, bundle_dir, dtype=np.float64):
+    """
+    Function which saves a TicketClassifier as a bundle: one .npy file per array plus a json manifest with the feature
+    order, the token dictionary, the remaining model parameters and the hash of every file. The directory is written
+    next to its final location and moved in place at the end, so a reader never sees half a bundle.
+    :param classifier: A TicketClassifier instance whose model is a linear SVC with probability=True.
+    :param bundle_dir: The directory in which to save the bundle.
+    :param dtype: The numpy dtype of the idf, coefficient and scaler arrays. Default is numpy.float64.
+    :return: The hash of the bundle, which identifies the model version.
+    """
+    components = export_components(classifier)
+    manual_features = get_manual_feature_names(components["token_dictionary"])
+    scaler_features = getattr(classifier.scaler, "feature_names_in_", None)
+    if scaler_features is not None and list(scaler_features) != manual_features:
+        raise ValueError("The scaler was fitted on the manual features in another order: {}".format(
+            list(scaler_features)))
+    return save_components(components, bundle_dir, dtype)
+
+
+def save_components(components, bundle_dir, dtype=np.float64):
+    """
+    Function which saves the components of a linear SVC, as returned by export_components or read_components, as a
+    bundle. See save_bundle.
+    :param components: A dictionary with the keyword arguments of LinearScorer.from_components.
+    :param bundle_dir: The directory in which to save the bundle.
+    :param dtype: The numpy dtype of the idf, coefficient and scaler arrays. numpy.float32 halves their size, for
+    probabilities within about 1e-6 of the float64 ones. Default is numpy.float64.
+    :return: The hash of the bundle, which identifies the model version.
+    """
+    manual_features = get_manual_feature_names(components["token_dictionary"])
+    terms = vocabulary_terms(components["vocabulary"])
+    arrays = {"vocabulary": terms}
+    for name in ["idf", "coefficients", "scaler_scale", "scaler_min"]:
+        arrays[name] = np.asarray(components[name], dtype=dtype)
+    # The weights used by the LinearScorer are folded once in float64 and saved too, so load_bundle memory-maps them
+    # instead of computing them in every process
+    folded = fold_components(*[np.asarray(components[name], dtype=np.float64) for name in
+                               ["idf", "coefficients", "intercept", "scaler_scale", "scaler_min"]])
+    arrays["term_weights"] = folded["term_weights"].astype(dtype)
+    arrays["manual_weights"] = folded["manual_weights"].astype(dtype)
+
+    parent_dir = os.path.dirname(os.path.abspath(bundle_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent_dir)
+    file_hashes = dict()
+    for name, array in arrays.items():
+        path = os.path.join(tmp_dir, name + ".npy")
+        np.save(path, array)
+        file_hashes[name + ".npy"] = _file_hash(path)
+
+    manifest = {"format_version": BUNDLE_FORMAT_VERSION,
+                "model": {"type": "linear_svc", "intercept": components["intercept"],
+                          "prob_a": components["prob_a"], "prob_b": components["prob_b"], "bias": folded["bias"]},
+                "vectorizer": {name: components[name] for name in VECTORIZER_PARAMS},
+                "feature_order": {"term_count": len(terms), "manual_features": manual_features},
+                "token_dictionary": components["token_dictionary"],
+                "files": file_hashes}
+    manifest["hash"] = _manifest_hash(manifest)
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+
+    shutil.rmtree(bundle_dir, ignore_errors=True)
+    os.replace(tmp_dir, bundle_dir)
+    return manifest["hash"]
+
+
+def read_manifest(bundle_dir):
+    """
+    Function which reads the manifest of a bundle and checks that this code can load it.
+    :param bundle_dir: The directory of the bundle.
+    :return: The manifest as a dictionary.
+    """
+    with open(os.path.join(bundle_dir, "manifest.json"), "r") as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+        raise ValueError("Bundle format version {} is not supported, expected {}".format(
+            manifest.get("format_version"), BUNDLE_FORMAT_VERSION))
+    if manifest.get("hash") != _manifest_hash(manifest):
+        raise ValueError("The manifest of the bundle in {} does not match its hash".format(bundle_dir))
+    manual_features = get_manual_feature_names(manifest["token_dictionary"])
+    if manifest["feature_order"]["manual_features"] != manual_features:
+        raise ValueError("The bundle was saved with the manual features in another order than the one computed by "
+                         "preprocessing: {}".format(manifest["feature_order"]["manual_features"]))
+    return manifest
+
+
+def verify_bundle(bundle_dir):
+    """
+    Function which checks the hash of every file of a bundle. It reads all the arrays, so it is not done by load_bundle.
+    :param bundle_dir: The directory of the bundle.
+    :return: The list of files whose content does not match the manifest. Empty if the bundle is intact.
+    """
+    manifest = read_manifest(bundle_dir)
+    return [name for name, file_hash in manifest["files"].items()
+            if _file_hash(os.path.join(bundle_dir, name)) != file_hash]
+
+
+def read_components(bundle_dir, sorted_vocabulary=False):
+    """
+    Function which reads the components of the model saved in a bundle. The numeric arrays are memory-mapped.
+    :param bundle_dir: The directory of the bundle.
+    :param sorted_vocabulary: Flag. If set to True and the terms are sorted, like the ones of a tf-idf vectorizer, the
+    vocabulary is a memory-mapped SortedVocabulary instead of a dictionary. It takes a fraction of the memory and is
+    shared between processes, but a lookup is a binary search, slower than in a dictionary. Default is False.
+    :return: A dictionary with the keyword arguments of LinearScorer.from_components, the version being the hash of
+    the bundle.
+    """
+    return _read_components(bundle_dir, read_manifest(bundle_dir), sorted_vocabulary)
+
+
+def _load_array(bundle_dir, name, mmap_mode="r"):
+    return np.load(os.path.join(bundle_dir, name + ".npy"), mmap_mode=mmap_mode)
+
+
+def _read_components(bundle_dir, manifest, sorted_vocabulary):
+    def load(name, mmap_mode="r"):
+        return _load_array(bundle_dir, name, mmap_mode)
+
+    terms = load("vocabulary", mmap_mode="r" if sorted_vocabulary else None)
+    if len(terms) != manifest["feature_order"]["term_count"]:
+        raise ValueError("The vocabulary of the bundle in {} does not match its manifest".format(bundle_dir))
+    if sorted_vocabulary and terms.dtype.kind == "S" and (len(terms) < 2 or np.all(terms[:-1] < terms[1:])):
+        vocabulary = SortedVocabulary(terms)
+    else:
+        # The tokens are looked up in a dictionary, which is not memory-mapped
+        vocabulary = dict(zip(np.char.decode(np.asarray(terms), "utf-8").tolist(), range(len(terms))))
+    return dict(vocabulary=vocabulary,
+                idf=load("idf"),
+                coefficients=load("coefficients"),
+                intercept=manifest["model"]["intercept"],
+                scaler_scale=load("scaler_scale"),
+                scaler_min=load("scaler_min"),
+                prob_a=manifest["model"]["prob_a"],
+                prob_b=manifest["model"]["prob_b"],
+                token_dictionary=manifest["token_dictionary"],
+                version=manifest["hash"],
+                **manifest["vectorizer"])
+
+
+def load_bundle(bundle_dir=None, sorted_vocabulary=False):
+    """
+    Function which loads a bundle saved by save_bundle. The term weights, the idf and the manual feature weights used
+    for scoring are memory-mapped, so processes forked from the same server share their pages, and the version of the
+    scorer is the hash of the bundle. A bundle saved without the folded weights gets them computed in memory.
+    :param bundle_dir: The directory of the bundle. Default is the bundle of model 1 in the data folder.
+    :param sorted_vocabulary: Flag. If set to True, memory-map the vocabulary as well, see read_components.
+    :return: A LinearScorer instance.
+    """
+    bundle_dir = bundle_dir or default_bundle_dir()
+    manifest = read_manifest(bundle_dir)
+    components = _read_components(bundle_dir, manifest, sorted_vocabulary)
+    if "term_weights.npy" not in manifest["files"]:
+        return LinearScorer.from_components(**components)
+    return LinearScorer(vocabulary=components["vocabulary"],
+                        term_weights=_load_array(bundle_dir, "term_weights"),
+                        idf=components["idf"],
+                        manual_weights=_load_array(bundle_dir, "manual_weights"),
+                        bias=manifest["model"]["bias"],
+                        prob_a=components["prob_a"],
+                        prob_b=components["prob_b"],
+                        token_dictionary=components["token_dictionary"],
+                        version=components["version"],
+                        **manifest["vectorizer"])
+
+
+def convert_pickles(data_dir=DEFAULT_DATA_DIR, model_number=1, bundle_dir=None):
+    """
+    Function which converts the artifacts saved by the "Preprocessing and modeling" notebook into a bundle.
+    :param data_dir: The data folder, containing token_dictionary.json and the modeling folder.
+    :param model_number: Which of the saved models to convert, i.e. 1 for tfidf_1.pkl, scaler_1.pkl and
+    model_1_with_mf.pkl.
+    :param bundle_dir: The directory in which to save the bundle. Default is data/modeling/bundle_<model_number>.
+    :return: The hash of the bundle.
+    """
+    from classifier import TicketClassifier
+
+    classifier = TicketClassifier.from_directory(data_dir, model_number)
+    return save_bundle(classifier, bundle_dir or default_bundle_dir(model_number, data_dir))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the pickled tf-idf vectorizer, scaler and model into a "
+                                                 "model bundle.")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="The data folder.")
+    parser.add_argument("--model-number", type=int, default=1, help="Which of the saved models to convert.")
+    parser.add_argument("--output", default=None, help="Where to save the bundle. Default is "
+                                                       "data/modeling/bundle_<model-number>.")
+    args = parser.parse_args()
+    print(convert_pickles(args.data_dir, args.model_number, args.output))
@@ -0,0 +1,251 @@
+import json
+import os
+import shutil
+import tempfile
+import zlib
+import numpy as np
+
+NEAR_DUPLICATES_FORMAT_VERSION = 1
+
+# Mersenne prime used by the universal hash functions of the MinHash permutations
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingles(cleaned_text, size=2):
+    """
+    Function which returns the shingles of a text: its runs of `size` consecutive words. A text with fewer words than
+    size has its whole text as only shingle.
+    :param cleaned_text: A text preprocessed by preprocess_text_series, i.e. stems separated by spaces.
+    :param size: Number of words of a shingle.
+    :return: A set of shingles.
+    """
+    words = cleaned_text.split()
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[start:start + size]) for start in range(len(words) - size + 1)}
+
+
+class NearDuplicateIndex:
+    """
+    Index of near-duplicate tickets. Every cleaned text is summarized by a MinHash signature, whose share of equal
+    values estimates the Jaccard similarity of the word shingles of two texts. The signatures are cut in bands and
+    every band is hashed into a bucket (locality sensitive hashing), so a query only compares the texts sharing at
+    least one bucket with it, instead of every text of the index.
+    Every text is stored with a value, i.e. its label or its score, which the queries return.
+    """
+
+    def __init__(self, num_perm=128, bands=16, threshold=0.8, shingle_size=2, seed=42, version=None):
+        """
+        :param num_perm: Number of hash functions of a signature.
+        :param bands: Number of LSH bands. num_perm must be a multiple of it. Texts with a Jaccard similarity of
+        (1 / bands) ** (bands / num_perm) have one chance in two to share a bucket: 0.71 with the defaults.
+        :param threshold: Minimum estimated Jaccard similarity for two texts to be near-duplicates.
+        :param shingle_size: Number of words of a shingle.
+        :param seed: Seed of the hash functions. Indexes can only be compared if they have the same one.
+        :param version: Optional identifier of what the values depend on, i.e. the version of the model which scored
+        the texts.
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm {} is not a multiple of bands {}".format(num_perm, bands))
+        self.num_perm = num_perm
+        self.bands = bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.version = version
+        random_state = np.random.RandomState(seed)
+        self._a = random_state.randint(1, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self._b = random_state.randint(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self._signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        self._size = 0
+        self.values = []
+        # One dictionary per band, from the hash of the band to the position of the text, or to the list of positions
+        # when several texts share the bucket: most buckets hold one text, and an int costs less memory than a list
+        self._buckets = [dict() for _ in range(bands)]
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def signatures(self):
+        """
+        :return: The signatures of the texts of the index, one row per text in the order they were added.
+        """
+        return self._signatures[:self._size]
+
+    def signature(self, cleaned_text):
+        """
+        :param cleaned_text: A text preprocessed by preprocess_text_series.
+        :return: The MinHash signature of the text, a numpy array of num_perm uint32.
+        """
+        # crc32 is stable between processes, unlike the hash of python strings
+        shingle_hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in
+                                      shingles(cleaned_text, self.shingle_size)), dtype=np.uint64)
+        # The products wrap around 2^64, which keeps the hash functions different enough for MinHash
+        with np.errstate(over="ignore"):
+            hashes = (shingle_hashes[:, None] * self._a + self._b) % MERSENNE_PRIME & MAX_HASH
+        return hashes.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        # Two different bands may have the same hash, which only adds a candidate the similarity check removes
+        return [hash(band.tobytes()) for band in signature.reshape(self.bands, -1)]
+
+    def add(self, cleaned_text, value=None):
+        """
+        Add a text to the index.
+        :param cleaned_text: A text preprocessed by preprocess_text_series.
+        :param value: The value returned with the text by the queries. It is saved as json.
+        :return: The position of the text in the index.
+        """
+        return self.add_signature(self.signature(cleaned_text), value)
+
+    def add_signature(self, signature, value=None):
+        """
+        Add a text to the index from its signature.
+        :param signature: The signature returned by the signature method of an index with the same parameters.
+        :param value: The value returned with the text by the queries.
+        :return: The position of the text in the index.
+        """
+        position = self._size
+        if position == len(self._signatures):
+            # The signatures are kept in one array which doubles when it is full, so adding a text is amortized O(1)
+            grown = np.zeros((max(16, 2 * position), self.num_perm), dtype=np.uint32)
+            grown[:position] = self._signatures
+            self._signatures = grown
+        self._signatures[position] = signature
+        self._size += 1
+        self.values.append(value)
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = position
+            elif isinstance(bucket, list):
+                bucket.append(position)
+            else:
+                buckets[key] = [bucket, position]
+        return position
+
+    def query_signature(self, signature):
+        """
+        :param signature: The signature of a text.
+        :return: A list of (position, estimated Jaccard similarity) tuples of the near-duplicates of the text, the most
+        similar first.
+        """
+        candidates = set()
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            bucket = buckets.get(key)
+            if isinstance(bucket, list):
+                candidates.update(bucket)
+            elif bucket is not None:
+                candidates.add(bucket)
+        if not candidates:
+            return []
+        candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarities = (self._signatures[candidates] == signature).mean(axis=1)
+        kept = similarities >= self.threshold
+        order = np.lexsort((candidates[kept], -similarities[kept]))
+        return [(int(position), float(similarity)) for position, similarity in
+                zip(candidates[kept][order], similarities[kept][order])]
+
+    def query(self, cleaned_text):
+        """
+        :param cleaned_text: A text preprocessed by preprocess_text_series.
+        :return: A list of (position, estimated Jaccard similarity, value) tuples of the near-duplicates of the text in
+        the index, the most similar first.
+        """
+        return [(position, similarity, self.values[position])
+                for position, similarity in self.query_signature(self.signature(cleaned_text))]
+
+    def save(self, directory):
+        """
+        Save the index into a directory. The directory is replaced at once, so a reader never sees half of an index.
+        :param directory: The directory to write. It is created if it does not exist.
+        """
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent)
+        try:
+            np.save(os.path.join(tmp_dir, "signatures.npy"), self.signatures)
+            with open(os.path.join(tmp_dir, "values.json"), "w") as values_file:
+                json.dump(self.values, values_file)
+            manifest = {"format_version": NEAR_DUPLICATES_FORMAT_VERSION, "num_perm": self.num_perm,
+                        "bands": self.bands, "threshold": self.threshold, "shingle_size": self.shingle_size,
+                        "seed": self.seed, "version": self.version, "size": self._size}
+            with open(os.path.join(tmp_dir, "manifest.json"), "w") as manifest_file:
+                json.dump(manifest, manifest_file, indent=1)
+            if os.path.isdir(directory):
+                old_dir = tempfile.mkdtemp(dir=parent)
+                os.replace(directory, os.path.join(old_dir, "index"))
+                os.replace(tmp_dir, directory)
+                shutil.rmtree(old_dir)
+            else:
+                os.replace(tmp_dir, directory)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Load an index saved by save. The buckets are rebuilt from the signatures.
+        :param directory: The directory of the index.
+        :return: A NearDuplicateIndex instance.
+        """
+        with open(os.path.join(directory, "manifest.json"), "r") as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("format_version") != NEAR_DUPLICATES_FORMAT_VERSION:
+            raise ValueError("Near-duplicate index format version {} is not supported, expected {}".format(
+                manifest.get("format_version"), NEAR_DUPLICATES_FORMAT_VERSION))
+        index = cls(manifest["num_perm"], manifest["bands"], manifest["threshold"], manifest["shingle_size"],
+                    manifest["seed"], manifest["version"])
+        with open(os.path.join(directory, "values.json"), "r") as values_file:
+            values = json.load(values_file)
+        for signature, value in zip(np.load(os.path.join(directory, "signatures.npy")), values):
+            index.add_signature(signature, value)
+        return index
+
+
+def near_duplicate_groups(cleaned_texts, index=None):
+    """
+    Function which groups the near-duplicates of a list of texts. A text joins the group of its most similar earlier
+    text, if it has a near-duplicate among them, otherwise it starts a new group.
+    :param cleaned_texts: An iterable of texts preprocessed by preprocess_text_series.
+    :param index: An empty NearDuplicateIndex with the parameters to use. Default is a new NearDuplicateIndex.
+    :return: A numpy array with the group of every text, numbered by the position of the text which started it.
+    """
+    index = index if index is not None else NearDuplicateIndex()
+    groups = []
+    for position, cleaned_text in enumerate(cleaned_texts):
+        signature = index.signature(cleaned_text)
+        matches = index.query_signature(signature)
+        group = index.values[matches[0][0]] if matches else position
+        index.add_signature(signature, group)
+        groups.append(group)
+    return np.array(groups, dtype=np.int64)
+
+
+def duplicate_weights(groups, labels=None):
+    """
+    Function which weights the training rows so that every group of near-duplicates counts as one row. With labels,
+    the rows of a group having different labels are kept apart, so a conflicting label is not weighted down.
+    :param groups: The output of near_duplicate_groups.
+    :param labels: The labels of the rows. Optional.
+    :return: A numpy array with the weight of every row: 1 divided by the size of its group.
+    """
+    groups = np.asarray(groups)
+    keys = groups if labels is None else np.column_stack([groups, np.asarray(labels)])
+    _, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    return 1 / counts[inverse.ravel()]
+
+
+def deduplicate(groups, labels=None):
+    """
+    :param groups: The output of near_duplicate_groups.
+    :param labels: The labels of the rows. Optional, see duplicate_weights.
+    :return: The positions of the rows to keep: the first row of every group, per label if labels are given.
+    """
+    groups = np.asarray(groups)
+    keys = groups if labels is None else np.column_stack([groups, np.asarray(labels)])
+    _, first_positions = np.unique(keys, axis=0, return_index=True)
+    return np.sort(first_positions)
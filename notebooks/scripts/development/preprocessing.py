@@ -1,46 +1,219 @@
 import pandas as pd
-from langdetect import detect
-from googletrans import Translator
-from symspellpy import SymSpell
-import pkg_resources
+import numpy as np
+from spelling import get_sym_spell
+from translation import get_default_translator
+from async_translation import AsyncTranslationClient, run_coroutine
 from contractions import contractions_dict
 import re
+import json
+import os
+import math
+import time
+import atexit
+import functools
+import multiprocessing
 from spacy.lang.en.stop_words import STOP_WORDS
 from nltk.stem import PorterStemmer
 
-translator = Translator()
+# The SymSpell instance is only created by the first call of correct_spelling, see get_sym_spell
+sym_spell = None
 
-sym_spell = SymSpell(max_dictionary_edit_distance=2, prefix_length=7)
+# Regex patterns compiled once at import, instead of being rebuilt by the re module cache on every call
+EMAIL_REGEX = re.compile(r'([a-zA-Z0-9+._-]+@[a-zA-Z0-9._-]+\.[a-zA-Z0-9_-]+)')
+WHITESPACE_REGEX = re.compile(r'\s')
+SPECIAL_CHARACTERS_REGEX = re.compile(r'[^A-Za-z0-9 \-\_]+')
+URL_REGEX = re.compile(r'(http|ftp|https):\/\/([\w\-_]+(?:(?:\.[\w\-_]+)+))([\w\-\.,@?^=%&:/~\+#]*[\w\-\@?^=%&/~\+#])?')
+# A regex pattern to match tokens in our text. It is resistant to tokens that are close like
+# _PRODUCT_NAME__PRODUCT_NAME_
+TOKEN_REGEX = re.compile(r'(_{1,2})([A-Z]+_{0,2}[A-Z]*)\1')
 
-# Load necessary dictionaries for spelling correction
-dictionary_path = pkg_resources.resource_filename("symspellpy", "frequency_dictionary_en_82_765.txt")
-bigram_path = pkg_resources.resource_filename("symspellpy", "frequency_bigramdictionary_en_243_342.txt")
 
-# Load dictionaries as stated in documentation https://symspellpy.readthedocs.io/en/latest/examples/lookup_compound.html
-sym_spell.load_dictionary(dictionary_path, term_index=0, count_index=1)
-sym_spell.load_bigram_dictionary(bigram_path, term_index=0, count_index=2)
+class MemoizedStemmer:
+    """
+    Stemmer which remembers the stem of the words it has already seen, in a bounded least recently used table. The
+    vocabulary of the tickets is small and a few words make up most of the text, so most words are stemmed only once.
+    """
+
+    def __init__(self, stemmer=None, max_entries=100000):
+        """
+        :param stemmer: The stemmer to memoize. Default is a new PorterStemmer.
+        :param max_entries: Maximum number of words whose stem is remembered.
+        """
+        self.stemmer = stemmer if stemmer is not None else PorterStemmer()
+        self.stem = functools.lru_cache(maxsize=max_entries)(self.stemmer.stem)
+        self._warm_up_hits = 0
+        self._warm_up_misses = 0
+
+    def warm(self, words):
+        """
+        Stem words ahead of time, i.e. the terms of the tf-idf vocabulary, which are mostly already stems. The warm up
+        is not counted in the stats.
+        :param words: An iterable of words.
+        """
+        before = self.stem.cache_info()
+        for word in words:
+            self.stem(word)
+        after = self.stem.cache_info()
+        self._warm_up_hits += after.hits - before.hits
+        self._warm_up_misses += after.misses - before.misses
+
+    def stats(self):
+        """
+        :return: A dictionary with the hits, misses, number of words remembered and maximum number of words.
+        """
+        info = self.stem.cache_info()
+        return {"hits": info.hits - self._warm_up_hits, "misses": info.misses - self._warm_up_misses,
+                "entries": info.currsize, "max_entries": info.maxsize}
+
+
+# Stemmer of the current process, created by the first call of get_stemmer
+_stemmer = None
+
+# Words every process stemmer is warmed with, including the ones of the pool workers started later. The dictionary is
+# used as an ordered set.
+_warm_up_words = dict()
+
+
+def get_stemmer():
+    """
+    Function which returns the MemoizedStemmer of the current process, warmed with the words given to warm_stemmer.
+    :return: A MemoizedStemmer instance.
+    """
+    global _stemmer
+    if _stemmer is None:
+        _stemmer = MemoizedStemmer()
+        _stemmer.warm(_warm_up_words)
+    return _stemmer
+
+
+def warm_stemmer(words):
+    """
+    Function which warms the stemmer of the current process with words, i.e. the tf-idf vocabulary. The pool workers
+    started after this call are warmed with them as well.
+    :param words: An iterable of words.
+    """
+    new_words = [word for word in dict.fromkeys(words) if word not in _warm_up_words]
+    _warm_up_words.update(dict.fromkeys(new_words))
+    if _stemmer is not None:
+        _stemmer.warm(new_words)
+
+
+class TokenMatcher:
+    """
+    Precompiled matcher which counts and strips the placeholder tokens of a token dictionary in one pass over a text.
+
+    Every token is made out of upper case letters and underscores and begins and ends with an underscore, so a token
+    can only be found inside a span of the form _[A-Z_]*_. A single regex pass finds these spans. A span that is exactly
+    one token (the usual case) is resolved with a dictionary lookup. Spans of glued tokens (i.e. _DATE__PRODUCT_NAME_)
+    fall back to replacing the tokens longest first, which keeps the results identical to counting and replacing
+    every token of the dictionary over the whole text.
+    """
+    span_regex = re.compile(r'_[A-Z_]*_')
+
+    def __init__(self, token_dictionary):
+        """
+        :param token_dictionary: dictionary of tokens, where the key is the actual token value and the value is the
+        group that the token is part of.
+        """
+        self.token_dictionary = dict(token_dictionary)
+        for token in self.token_dictionary:
+            if not self.span_regex.fullmatch(token):
+                raise ValueError("Token {} is not of form _TOKEN_ and cannot be matched".format(token))
+        # Because certain tokens like __PRODUCT_NAME__ contain other tokens (i.e. _NAME_), bigger tokens must be
+        # counted and replaced first.
+        self.sorted_tokens = sorted(self.token_dictionary.keys(), key=len, reverse=True)
+        # Groups are kept in the order in which the longest-first replacement meets them, as that is the order of the
+        # manual features the scalers were fitted on.
+        self.groups = list(dict.fromkeys(self.token_dictionary[token] for token in self.sorted_tokens))
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Build a TokenMatcher from a json file like data/token_dictionary.json.
+        :param path: The path of the json file.
+        :return: A TokenMatcher instance.
+        """
+        with open(path, "r") as token_dict_file:
+            return cls(json.load(token_dict_file))
+
+    def _replace_glued_tokens(self, span, counts):
+        for token in self.sorted_tokens:
+            if token in span:
+                counts[self.token_dictionary[token]] += span.count(token)
+                span = span.replace(token, " ")
+        return span
+
+    def count_and_strip(self, text):
+        """
+        Count every token from the token dictionary found in text and replace it with a space.
+        :param text: The text to search through.
+        :return: The text without tokens and a dictionary having as key the token group and as value its count.
+        """
+        counts = dict.fromkeys(self.groups, 0)
+
+        def replace_span(match):
+            span = match.group()
+            group = self.token_dictionary.get(span)
+            if group is not None:
+                counts[group] += 1
+                return " "
+            return self._replace_glued_tokens(span, counts)
+
+        return self.span_regex.sub(replace_span, text), counts
+
+
+_token_matchers = dict()
+
+
+def get_token_matcher(token_dictionary):
+    """
+    Return a TokenMatcher for the token dictionary, building it only the first time the dictionary is seen.
+    :param token_dictionary: dictionary of tokens or an already built TokenMatcher.
+    :return: A TokenMatcher instance.
+    """
+    if isinstance(token_dictionary, TokenMatcher):
+        return token_dictionary
+    key = tuple(token_dictionary.items())
+    if key not in _token_matchers:
+        _token_matchers[key] = TokenMatcher(token_dictionary)
+    return _token_matchers[key]
 
 
 def translate_to_en(text):
     """
     Function which uses googletrans library to detect language and translate it if it is not English.
+    Translations are cached in data/translation_cache.sqlite, so a text is only sent to the translator once.
+    See translation.set_default_translator to use another backend.
     :param text: Python text to be processed.
     :return: The original text if the detected language is English, and the translated text into English otherwise.
     """
-    detected_language = detect(text)
-    if detected_language == 'en':
-        return text
-    else:
-        return translator.translate(text, src=detected_language, dest='en').text
+    return get_default_translator().translate_to_en(text)
+
+
+def translate_series_to_en(text_series, client=None):
+    """
+    Function which translates a whole pandas.Series of texts into English. Unlike calling translate_to_en on every row,
+    the texts that are not cached are translated concurrently, grouped by language.
+    :param text_series: A pandas.Series containing rows of text.
+    :param client: The AsyncTranslationClient to translate with. Default is a client using googletrans.
+    :return: A pandas.Series with the texts in English and the same index as text_series.
+    """
+    if client is None:
+        client = AsyncTranslationClient()
+    cache = get_default_translator().cache
+    translated_texts = run_coroutine(client.translate_to_en(list(text_series), cache))
+    return pd.Series(translated_texts, index=text_series.index, name=text_series.name)
 
 
 def get_avg_word_len(text):
     """
     Function which returns the average word length within a paragraph.
     :param text: The text to search through.
-    :return: The average word length from the text.
+    :return: The average word length from the text. 0 if the text has no words, like in preprocess_text_batch.
     """
     words = text.split()
+    if not words:
+        return 0
     total_word_len = 0
     for word in words:
         total_word_len += len(word)
@@ -51,24 +224,98 @@ def get_avg_word_len(text):
 def correct_spelling(text):
     """
     Function which attempts to correct spelling error within a text.
-    This is done using SymSpellPy library.
+    This is done using SymSpellPy library. The dictionaries are only loaded on the first call, from the prebuilt index
+    in data/spelling_index if it exists.
     :param text: The text to correct.
     :return: A corrected version of the text, as understood by the library.
     """
+    global sym_spell
+    if sym_spell is None:
+        sym_spell = get_sym_spell()
     return sym_spell.lookup_compound(text, max_edit_distance=2)[0].term
 
 
+class ContractionExpander:
+    """
+    Precompiled expander which replaces every contraction of a dictionary in one pass over a text.
+
+    The contractions are compiled into a single regex shaped like a trie, so the regex engine follows one branch per
+    character instead of trying every contraction at every position. At each position the longest contraction wins,
+    and the expansions are not searched again. Contractions are matched anywhere in the text, also inside words, like
+    the str.replace loop this replaces: the tickets often glue words together, i.e. "haven'treceived".
+    Most contractions contain an apostrophe. A text without one is only searched for the few others (gonna, jan. etc.).
+    """
+
+    def __init__(self, contractions):
+        """
+        :param contractions: dictionary of contractions, where the key is the contraction and the value its expansion.
+        """
+        # Contractions expanded to themselves, like "to cause", are left out
+        self.contractions = {key: value for key, value in contractions.items() if key != value}
+        self.regex = re.compile(self._trie_pattern(self.contractions))
+        self.no_apostrophe_regex = re.compile(self._trie_pattern(
+            [key for key in self.contractions if "'" not in key and "’" not in key]))
+
+    @classmethod
+    def _trie_pattern(cls, words):
+        trie = dict()
+        for word in words:
+            node = trie
+            for character in word:
+                node = node.setdefault(character, dict())
+            # The empty key marks the end of a word
+            node[""] = dict()
+        # Without words, a pattern which never matches
+        return cls._node_pattern(trie) or "(?!)"
+
+    @classmethod
+    def _node_pattern(cls, node):
+        branches = [re.escape(character) + cls._node_pattern(child)
+                    for character, child in sorted(node.items()) if character != ""]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A greedy optional group tries the longer words first, then falls back to the word ending here
+        return "(?:" + pattern + ")?" if "" in node else pattern
+
+    def _expansion(self, match):
+        return self.contractions[match.group()]
+
+    def expand(self, text):
+        """
+        :param text: The text to modify.
+        :return: The text with every contraction replaced by its expansion.
+        """
+        if "'" in text or "’" in text:
+            return self.regex.sub(self._expansion, text)
+        return self.no_apostrophe_regex.sub(self._expansion, text)
+
+
+# The ContractionExpander is only compiled by the first call of expand_contractions, see get_contraction_expander
+_contraction_expander = None
+
+
+def get_contraction_expander():
+    """
+    Function which returns the ContractionExpander of the contractions_dict of the contractions library, compiling it
+    the first time.
+    :return: A ContractionExpander instance.
+    """
+    global _contraction_expander
+    if _contraction_expander is None:
+        _contraction_expander = ContractionExpander(contractions_dict)
+    return _contraction_expander
+
+
 def expand_contractions(text):
     """
-    Function which expands the words in a text given a static dictionary from contraction python library.
-    The assumption is that the text is in lowercase.
+    Function which expands the words in a text given a static dictionary from contraction python library, in one pass
+    with the longest contraction winning, see ContractionExpander.
     :param text: The text to modify.
     :return:
     """
     if type(text) is str:
-        for key in contractions_dict.keys():
-            value = contractions_dict[key]
-            text = text.replace(key, value)
+        text = get_contraction_expander().expand(text)
     return text
 
 
@@ -80,11 +327,8 @@ def get_tokens(text_series):
     :return: A set of all unique tokens present in all the tickets.
     """
     token_set = set()
-    # A regex pattern to match tokens in our text. It is resistant to tokens that are close like
-    # _PRODUCT_NAME__PRODUCT_NAME_
-    token_regex = r'(_{1,2})([A-Z]+_{0,2}[A-Z]*)\1'
     for index, text in text_series.items():
-        regex_results = re.findall(token_regex, text)
+        regex_results = TOKEN_REGEX.findall(text)
         # The findall regex function will return the groups. Therefore we recreate the token by using the found groups.
         tokens_in_text = [group[0] + group[1] + group[0] for group in regex_results]
         for token in tokens_in_text:
@@ -99,8 +343,7 @@ def get_email_count(text):
     :param text: The text to search through.
     :return: The number of emails in the text.
     """
-    mail_regex = r'([a-zA-Z0-9+._-]+@[a-zA-Z0-9._-]+\.[a-zA-Z0-9_-]+)'
-    return len(re.findall(mail_regex, text))
+    return len(EMAIL_REGEX.findall(text))
 
 
 def remove_emails(text):
@@ -109,9 +352,7 @@ def remove_emails(text):
     :param text: The text to modify.
     :return: The text without any email that was initially in.
     """
-    mail_regex = r'([a-zA-Z0-9+._-]+@[a-zA-Z0-9._-]+\.[a-zA-Z0-9_-]+)'
-
-    return re.sub(mail_regex, '', text)
+    return EMAIL_REGEX.sub('', text)
 
 
 def get_url_count(text):
@@ -120,9 +361,7 @@ def get_url_count(text):
     :param text: The text to search through.
     :return: The number of URLs in the text.
     """
-    url_regex = r'(http|ftp|https):\/\/([\w\-_]+(?:(?:\.[\w\-_]+)+))([\w\-\.,@?^=%&:/~\+#]*[\w\-\@?^=%&/~\+#])?'
-
-    return len(re.findall(url_regex, text))
+    return len(URL_REGEX.findall(text))
 
 
 def remove_urls(text):
@@ -131,9 +370,7 @@ def remove_urls(text):
     :param text: The text to modify.
     :return: The text without any URL that was initially in.
     """
-    url_regex = r'(http|ftp|https):\/\/([\w\-_]+(?:(?:\.[\w\-_]+)+))([\w\-\.,@?^=%&:/~\+#]*[\w\-\@?^=%&/~\+#])?'
-
-    return re.sub(url_regex, '', text)
+    return URL_REGEX.sub('', text)
 
 
 def remove_special_characters(text):
@@ -142,8 +379,7 @@ def remove_special_characters(text):
     :param text: The text to modify.
     :return: Text without any special characters besides - and _. Special characters are replaced by space.
     """
-    special_chars_regex = r'[^A-Za-z0-9 \-\_]+'
-    return re.sub(special_chars_regex, ' ', text)
+    return SPECIAL_CHARACTERS_REGEX.sub(' ', text)
 
 
 def remove_single_characters(text):
@@ -155,7 +391,7 @@ def remove_single_characters(text):
     return " ".join([word for word in text.split() if len(word) > 1])
 
 
-def preprocess_raw_text(text, token_dictionary, stemmer):
+def preprocess_raw_text(text, token_dictionary, stemmer, profiler=None):
     """
     Function that combines all of the processing functions to clean up raw text. It does the following things:
 
@@ -177,10 +413,13 @@ def preprocess_raw_text(text, token_dictionary, stemmer):
     13. I will stem the remaining words.
     :param stemmer: Stemmer to stem each word of the text.
     :param token_dictionary: dictionary of tokens, where the key is the actual token value and the value is the group
-    that the token is part of.
+    that the token is part of. A TokenMatcher built from such a dictionary is accepted as well.
     :param text: The text that will be preprocessed and from which we extract the manual features.
+    :param profiler: A PreprocessingProfiler which records the time of every step. Default is None, no recording.
     :return: The preprocessed text, ready to be used as fodder for tf, tf-idf or word embedding techniques.
     """
+    if profiler is not None:
+        start = time.perf_counter()
     manual_features = dict()
 
     text_length = len(text)
@@ -192,41 +431,176 @@ def preprocess_raw_text(text, token_dictionary, stemmer):
     average_word_length = get_avg_word_len(text)
     manual_features["average_word_length"] = average_word_length
 
+    if profiler is None:
+        text, numeric_counts, token_counts, stop_word_count = clean_text(text, token_dictionary, stemmer)
+    else:
+        steps = [("manual_features", time.perf_counter() - start, text_length, text_length)]
+        text, numeric_counts, token_counts, stop_word_count = _clean_text_profiled(text, token_dictionary, stemmer,
+                                                                                   steps)
+    manual_features["numeric_counts"] = numeric_counts
+    manual_features.update(token_counts)
+    manual_features["stop_word_count"] = stop_word_count
+
+    if profiler is not None:
+        profiler.record_ticket(time.perf_counter() - start, text_length, steps)
+    return text, manual_features
+
+
+def clean_text(text, token_dictionary, stemmer):
+    """
+    Function which applies steps 5 to 13 of preprocess_raw_text on a text and returns the counts it finds on the way,
+    without assembling them into a manual features dictionary.
+    :param text: The text to clean.
+    :param token_dictionary: dictionary of tokens or a TokenMatcher built from it.
+    :param stemmer: Stemmer to stem each word of the text.
+    :return: A tuple of (cleaned text, numeric counts, dictionary of token group counts, stop word count). The token
+    group counts already include the emails and URLs found by regex.
+    """
     text = expand_contractions(text)
 
     numeric_counts = len([word for word in text.split() if word.isnumeric()])
-    manual_features["numeric_counts"] = numeric_counts
 
-    # Because certain tokens like __PRODUCT_NAME__ contain other tokens (i.e. _NAME_), we would like to count and
-    # replace the bigger tokens first. For this we sort the token list based on word length in descending order.
-    for token in sorted(token_dictionary.keys(), key=len, reverse=True):
-        # If group is not already in manual_features dictionary as a key, initialize value at the group key with 0.
-        manual_features[token_dictionary[token]] = manual_features.get(token_dictionary[token], 0) + text.count(token)
-        text = text.replace(token, " ")
+    # Because certain tokens like __PRODUCT_NAME__ contain other tokens (i.e. _NAME_), the bigger tokens are counted
+    # and replaced first. The matcher does this in one pass over the text instead of one pass per token.
+    text, token_counts = get_token_matcher(token_dictionary).count_and_strip(text)
 
     text = text.lower()
 
     # Since email_count is already a feature extracted using the tokens, I will just increase it
-    manual_features["email_count"] += get_email_count(text)
-    text = remove_emails(text)
+    text, email_count = EMAIL_REGEX.subn('', text)
+    token_counts["email_count"] += email_count
 
-    url_count = get_url_count(text)
-    manual_features["url_count"] = url_count
-    text = remove_urls(text)
+    text, url_count = URL_REGEX.subn('', text)
+    token_counts["url_count"] = url_count
 
-    stop_word_count = len([word for word in text.split() if word in STOP_WORDS])
-    manual_features["stop_word_count"] = stop_word_count
-    text = " ".join([word for word in text.split() if word not in STOP_WORDS])
+    # Stop words are counted and dropped in the same pass. Special characters are removed after them, because a word
+    # like "me," is not a stop word, then single characters are dropped and the remaining words stemmed in one pass.
+    words = text.split()
+    kept_words = [word for word in words if word not in STOP_WORDS]
+    stop_word_count = len(words) - len(kept_words)
+
+    text = remove_special_characters(" ".join(kept_words))
+
+    stem = stemmer.stem
+    text = " ".join([stem(word) for word in text.split() if len(word) > 1])
 
+    return text, numeric_counts, token_counts, stop_word_count
+
+
+def _clean_text_profiled(text, token_dictionary, stemmer, steps):
+    # Same steps as clean_text, each one timed. It is kept apart so that clean_text does not pay for the timing.
+    clock = time.perf_counter
+
+    def add_step(name, step_start, input_chars, output_chars):
+        steps.append((name, clock() - step_start, input_chars, output_chars))
+
+    step_start, input_chars = clock(), len(text)
+    text = expand_contractions(text)
+    add_step("expand_contractions", step_start, input_chars, len(text))
+
+    step_start = clock()
+    numeric_counts = len([word for word in text.split() if word.isnumeric()])
+    add_step("numeric_counts", step_start, len(text), len(text))
+
+    step_start, input_chars = clock(), len(text)
+    text, token_counts = get_token_matcher(token_dictionary).count_and_strip(text)
+    add_step("tokens", step_start, input_chars, len(text))
+
+    step_start = clock()
+    text = text.lower()
+    add_step("lowercase", step_start, len(text), len(text))
+
+    step_start, input_chars = clock(), len(text)
+    text, email_count = EMAIL_REGEX.subn('', text)
+    token_counts["email_count"] += email_count
+    add_step("emails", step_start, input_chars, len(text))
+
+    step_start, input_chars = clock(), len(text)
+    text, url_count = URL_REGEX.subn('', text)
+    token_counts["url_count"] = url_count
+    add_step("urls", step_start, input_chars, len(text))
+
+    step_start, input_chars = clock(), len(text)
+    words = text.split()
+    kept_words = [word for word in words if word not in STOP_WORDS]
+    stop_word_count = len(words) - len(kept_words)
+    text = " ".join(kept_words)
+    add_step("stop_words", step_start, input_chars, len(text))
+
+    step_start, input_chars = clock(), len(text)
     text = remove_special_characters(text)
-    text = remove_single_characters(text)
+    add_step("special_characters", step_start, input_chars, len(text))
 
-    text = " ".join([stemmer.stem(word) for word in text.split()])
+    step_start, input_chars = clock(), len(text)
+    stem = stemmer.stem
+    text = " ".join([stem(word) for word in text.split() if len(word) > 1])
+    add_step("stemming", step_start, input_chars, len(text))
 
-    return text, manual_features
+    return text, numeric_counts, token_counts, stop_word_count
+
+
+def get_manual_feature_names(token_dictionary):
+    """
+    Function which returns the names of the manual features in the order in which preprocess_raw_text extracts them.
+    This is also the column order the scalers were fitted on.
+    :param token_dictionary: dictionary of tokens or a TokenMatcher built from it.
+    :return: A list with the names of the manual features.
+    """
+    return ["text_length", "number_of_words", "average_word_length", "numeric_counts"] + \
+        get_token_matcher(token_dictionary).groups + ["stop_word_count"]
 
 
-def preprocess_text_series(text_series, token_dictionary, with_manual_features=True):
+def preprocess_text_batch(texts, token_dictionary, dtype=np.float32, stemmer=None, profiler=None):
+    """
+    Function which preprocesses a whole column of texts at once. Instead of building a manual features dictionary for
+    every text, the manual features are written straight into a preallocated matrix.
+    :param texts: An iterable of texts, i.e. a pandas.Series or a list.
+    :param token_dictionary: dictionary of tokens or a TokenMatcher built from it.
+    :param dtype: The numpy dtype of the manual features matrix. Default is numpy.float32.
+    :param stemmer: Stemmer to stem each word of the text. Default is the MemoizedStemmer of the process.
+    :param profiler: A PreprocessingProfiler which records the time of every step of clean_text. The manual features
+    computed for the whole batch at once are not recorded. Default is None, no recording.
+    :return: A list with the preprocessed texts and a numpy array of shape (len(texts), number of manual features)
+    whose columns are in the order given by get_manual_feature_names. An empty text has an average word length of 0.
+    """
+    if stemmer is None:
+        stemmer = get_stemmer()
+    token_matcher = get_token_matcher(token_dictionary)
+    texts = list(texts)
+
+    feature_names = get_manual_feature_names(token_matcher)
+    features = np.zeros((len(texts), len(feature_names)), dtype=dtype)
+    token_columns = slice(4, 4 + len(token_matcher.groups))
+
+    text_lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    word_counts = np.fromiter((len(text.split()) for text in texts), dtype=np.int64, count=len(texts))
+    # Words are split on whitespace, so the summed length of the words is the number of non whitespace characters
+    word_lengths = text_lengths - np.fromiter((len(WHITESPACE_REGEX.findall(text)) for text in texts),
+                                              dtype=np.int64, count=len(texts))
+
+    features[:, 0] = text_lengths
+    features[:, 1] = word_counts
+    features[:, 2] = np.divide(word_lengths, word_counts, out=np.zeros(len(texts)), where=word_counts > 0)
+
+    cleaned_texts = []
+    for row, text in enumerate(texts):
+        if profiler is None:
+            text, numeric_counts, token_counts, stop_word_count = clean_text(text, token_matcher, stemmer)
+        else:
+            start, steps, text_length = time.perf_counter(), [], len(text)
+            text, numeric_counts, token_counts, stop_word_count = _clean_text_profiled(text, token_matcher, stemmer,
+                                                                                       steps)
+            profiler.record_ticket(time.perf_counter() - start, text_length, steps)
+        cleaned_texts.append(text)
+        features[row, 3] = numeric_counts
+        features[row, token_columns] = list(token_counts.values())
+        features[row, -1] = stop_word_count
+
+    return cleaned_texts, features
+
+
+def preprocess_text_series(text_series, token_dictionary, with_manual_features=True, as_matrix=False, n_jobs=1,
+                           chunksize=None, profiler=None):
     """
     Function which takes a pandas.Series comprised of texts and applies raw text preprocessing on it.
     If the with_manual_features flag is set, it also adds the manual features extracted to the resulting dataframe
@@ -235,53 +609,131 @@ def preprocess_text_series(text_series, token_dictionary, with_manual_features=T
     :param text_series: A pandas.Series containing rows of text.
     :param with_manual_features: Flag. If set to False, do not append manual features to the resulting DataFrame.
     Append them if set to True. Default is True.
+    :param as_matrix: Flag. If set to True, skip building a DataFrame and return the output of preprocess_text_batch,
+    i.e. a list of preprocessed texts and a float32 matrix of manual features, or None instead of the matrix if
+    with_manual_features is False. Default is False.
+    :param n_jobs: Number of worker processes to shard the series across. -1 means one per CPU. Default is 1, which
+    preprocesses the series in the current process. 0 raises a ValueError.
+    :param chunksize: Number of texts sent to a worker at once when n_jobs is not 1. Default splits the series into
+    4 chunks per worker.
+    :param profiler: A PreprocessingProfiler, see profiling.py, which records the time and the sizes of every step of
+    every ticket, including the ones preprocessed by the workers. Default is None, no recording.
     :return: pd.DataFrame containing the preprocessed text and the 22 manual features extracted from it.
     """
-    stemmer = PorterStemmer()
-
-    # Keep index values to ensure same order for messages and manual features and labels
-    index_values = []
-    text_values = []
-
-    if with_manual_features:
-        manual_features_list = []
+    if n_jobs == 0:
+        raise ValueError("n_jobs must be a positive number of processes or -1 for one per CPU, got {!r}".format(n_jobs))
+    if n_jobs == 1:
+        texts, manual_features = _preprocess_chunk(list(text_series), token_dictionary, with_manual_features,
+                                                   as_matrix, profiler)
+    else:
+        texts, manual_features = _preprocess_in_pool(list(text_series), token_dictionary, with_manual_features,
+                                                     as_matrix, n_jobs, chunksize, profiler)
 
-    for index, value in text_series.items():
-        processed_text, manual_features = preprocess_raw_text(value, token_dictionary, stemmer)
-        index_values.append(index)
-        text_values.append(processed_text)
-        if with_manual_features:
-            manual_features_list.append(manual_features)
+    if as_matrix:
+        return texts, manual_features if with_manual_features else None
 
-    text_df = pd.DataFrame(text_values, index=index_values, columns=["text"])
+    # Keep index values to ensure same order for messages and manual features and labels
+    index_values = text_series.index.to_list()
+    text_df = pd.DataFrame(texts, index=index_values, columns=["text"])
 
     if with_manual_features:
-        manual_features_df = pd.DataFrame(manual_features_list, index=index_values)
+        manual_features_df = pd.DataFrame(manual_features, index=index_values)
         text_df = pd.concat([text_df, manual_features_df], axis=1)
 
     return text_df
 
 
+# Pool kept alive between calls of preprocess_text_series, together with its number of processes
+_pool = None
+_pool_size = None
 
 
+def _init_worker(warm_up_words):
+    # The stemmer and the spelling dictionaries of a worker are set up once, when the process starts. The prebuilt
+    # spelling index is memory-mapped, so the workers share its pages
+    global sym_spell
+    _warm_up_words.update(dict.fromkeys(warm_up_words))
+    get_stemmer()
+    if sym_spell is None:
+        sym_spell = get_sym_spell()
 
 
+def _preprocess_chunk(texts, token_dictionary, with_manual_features, as_matrix, profiler=None):
+    stemmer = get_stemmer()
+    if as_matrix:
+        return preprocess_text_batch(texts, token_dictionary, stemmer=stemmer, profiler=profiler)
 
+    token_matcher = get_token_matcher(token_dictionary)
+    text_values = []
+    manual_features_list = []
+    for text in texts:
+        processed_text, manual_features = preprocess_raw_text(text, token_matcher, stemmer, profiler)
+        text_values.append(processed_text)
+        if with_manual_features:
+            manual_features_list.append(manual_features)
+    return text_values, manual_features_list
 
 
+def _preprocess_chunk_star(args):
+    # The profiler of a chunk is sent back filled, to be merged with the one of the caller
+    texts, manual_features = _preprocess_chunk(*args)
+    return texts, manual_features, args[-1]
 
 
+def get_pool(n_jobs):
+    """
+    Function which returns the process pool used by preprocess_text_series. The pool is created on first use and kept
+    alive, so the workers only set up their stemmer and spelling dictionaries once.
+    :param n_jobs: Number of worker processes. -1 means one per CPU.
+    :return: A multiprocessing.Pool instance.
+    """
+    global _pool, _pool_size
+    if n_jobs < 0:
+        n_jobs = os.cpu_count()
+    if _pool is None or _pool_size != n_jobs:
+        close_pool()
+        _pool = multiprocessing.Pool(n_jobs, initializer=_init_worker, initargs=(list(_warm_up_words),))
+        _pool_size = n_jobs
+    return _pool
 
 
+def close_pool():
+    """
+    Function which shuts down the process pool of preprocess_text_series, if one was started.
+    """
+    global _pool, _pool_size
+    if _pool is not None:
+        _pool.close()
+        _pool.join()
+        _pool = None
+        _pool_size = None
 
 
+atexit.register(close_pool)
 
 
+def _preprocess_in_pool(texts, token_dictionary, with_manual_features, as_matrix, n_jobs, chunksize, profiler=None):
+    pool = get_pool(n_jobs)
+    if chunksize is None:
+        chunksize = max(1, math.ceil(len(texts) / (_pool_size * 4)))
+    # Send the plain dictionary, the workers build and cache their own TokenMatcher from it
+    token_dictionary = get_token_matcher(token_dictionary).token_dictionary
+    chunks = [(texts[start:start + chunksize], token_dictionary, with_manual_features, as_matrix,
+               None if profiler is None else profiler.empty_copy()) for start in range(0, len(texts), chunksize)]
 
-
-
-
-
-
-
-
+    # imap returns the chunks in the order they were sent, which keeps the original order of the series
+    text_values = []
+    manual_features = []
+    for chunk_texts, chunk_features, chunk_profiler in pool.imap(_preprocess_chunk_star, chunks):
+        text_values.extend(chunk_texts)
+        if profiler is not None:
+            profiler.merge(chunk_profiler)
+        if as_matrix:
+            manual_features.append(chunk_features)
+        else:
+            manual_features.extend(chunk_features)
+
+    if as_matrix:
+        feature_count = len(get_manual_feature_names(token_dictionary))
+        manual_features = np.vstack(manual_features) if manual_features else np.zeros((0, feature_count), np.float32)
+    return text_values, manual_features
@@ -0,0 +1,220 @@
+import bisect
+import heapq
+import json
+
+# Upper bounds, in seconds, of the histogram buckets of the step and ticket durations
+DEFAULT_SECONDS_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                           0.05, 0.1, 0.25, 0.5, 1.0)
+
+# Upper bounds, in characters, of the histogram buckets of the ticket lengths
+DEFAULT_LENGTH_BUCKETS = (50, 100, 200, 400, 800, 1600, 3200, 6400, 12800, 25600)
+
+# Default duration, in seconds, above which a ticket is flagged as an outlier
+DEFAULT_OUTLIER_SECONDS = 0.05
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets, like the Prometheus ones: a value falls in the first bucket whose upper bound is
+    greater than or equal to it, or in the last one, +Inf.
+    """
+
+    def __init__(self, buckets):
+        """
+        :param buckets: The upper bounds of the buckets, sorted.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other):
+        if other.buckets != self.buckets:
+            raise ValueError("Histograms with different buckets cannot be merged")
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+
+    def cumulative_counts(self):
+        """
+        :return: A list of (upper bound, number of values lower than or equal to it) tuples, ending with "+Inf".
+        """
+        cumulative = []
+        total = 0
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+    def to_dict(self):
+        return {"buckets": [[bound, count] for bound, count in self.cumulative_counts()], "count": self.count,
+                "sum": self.sum}
+
+
+class PreprocessingProfiler:
+    """
+    Instrumentation of preprocess_raw_text. When one is passed to preprocess_text_series, the wall time and the input
+    and output sizes, in characters, of every step of every ticket are recorded and aggregated into histograms. The
+    tickets slower than a threshold are kept as outliers, with the time of each of their steps. Without a profiler the
+    preprocessing runs exactly as before.
+    A profiler can be passed to several calls: the statistics add up.
+    """
+
+    def __init__(self, outlier_seconds=DEFAULT_OUTLIER_SECONDS, max_outliers=100,
+                 seconds_buckets=DEFAULT_SECONDS_BUCKETS, length_buckets=DEFAULT_LENGTH_BUCKETS):
+        """
+        :param outlier_seconds: Duration, in seconds, above which a ticket is flagged as an outlier. None flags none.
+        :param max_outliers: Maximum number of outliers kept. The slowest ones are kept.
+        :param seconds_buckets: The upper bounds, in seconds, of the buckets of the durations.
+        :param length_buckets: The upper bounds, in characters, of the buckets of the ticket lengths.
+        """
+        self.outlier_seconds = outlier_seconds
+        self.max_outliers = max_outliers
+        self.seconds_buckets = tuple(seconds_buckets)
+        self.length_buckets = tuple(length_buckets)
+        self.ticket_count = 0
+        # Number of tickets slower than outlier_seconds, including the ones which did not fit in the outliers kept
+        self.outlier_count = 0
+        self.ticket_seconds = Histogram(self.seconds_buckets)
+        self.ticket_length = Histogram(self.length_buckets)
+        self.step_seconds = dict()
+        self.step_input_chars = dict()
+        self.step_output_chars = dict()
+        # Heap of (seconds, position, outlier) tuples, so the fastest outlier is dropped first when it is full
+        self._outliers = []
+
+    def empty_copy(self):
+        """
+        :return: A new profiler with the same settings and no statistics, i.e. for a worker process.
+        """
+        return PreprocessingProfiler(self.outlier_seconds, self.max_outliers, self.seconds_buckets,
+                                     self.length_buckets)
+
+    def record_ticket(self, seconds, text_length, steps):
+        """
+        Record the preprocessing of one ticket.
+        :param seconds: The duration of the preprocessing of the ticket.
+        :param text_length: The number of characters of the raw ticket.
+        :param steps: A list of (step name, seconds, input characters, output characters) tuples, in the order of the
+        steps.
+        """
+        position = self.ticket_count
+        self.ticket_count += 1
+        self.ticket_seconds.observe(seconds)
+        self.ticket_length.observe(text_length)
+        for step, step_seconds, input_chars, output_chars in steps:
+            if step not in self.step_seconds:
+                self.step_seconds[step] = Histogram(self.seconds_buckets)
+                self.step_input_chars[step] = 0
+                self.step_output_chars[step] = 0
+            self.step_seconds[step].observe(step_seconds)
+            self.step_input_chars[step] += input_chars
+            self.step_output_chars[step] += output_chars
+
+        if self.outlier_seconds is not None and seconds > self.outlier_seconds:
+            self.outlier_count += 1
+            slowest_step = max(steps, key=lambda step: step[1])[0] if steps else None
+            outlier = {"position": position, "seconds": seconds, "text_length": text_length,
+                       "slowest_step": slowest_step, "steps": {step[0]: step[1] for step in steps}}
+            self._push_outlier(outlier)
+
+    def _push_outlier(self, outlier):
+        entry = (outlier["seconds"], outlier["position"], outlier)
+        if len(self._outliers) < self.max_outliers:
+            heapq.heappush(self._outliers, entry)
+        elif self._outliers and entry[:2] > self._outliers[0][:2]:
+            heapq.heapreplace(self._outliers, entry)
+
+    def merge(self, other):
+        """
+        Add the statistics of another profiler, i.e. the one of a worker process, to this one. The tickets of the other
+        profiler are counted as coming after the tickets of this one.
+        :param other: A PreprocessingProfiler with the same buckets.
+        """
+        self.ticket_seconds.merge(other.ticket_seconds)
+        self.ticket_length.merge(other.ticket_length)
+        for step, histogram in other.step_seconds.items():
+            if step not in self.step_seconds:
+                self.step_seconds[step] = Histogram(self.seconds_buckets)
+                self.step_input_chars[step] = 0
+                self.step_output_chars[step] = 0
+            self.step_seconds[step].merge(histogram)
+            self.step_input_chars[step] += other.step_input_chars[step]
+            self.step_output_chars[step] += other.step_output_chars[step]
+        for _, _, outlier in other._outliers:
+            self._push_outlier(dict(outlier, position=outlier["position"] + self.ticket_count))
+        self.ticket_count += other.ticket_count
+        self.outlier_count += other.outlier_count
+
+    @property
+    def outliers(self):
+        """
+        :return: The tickets slower than outlier_seconds, slowest first. Each one is a dictionary with its position
+        among the tickets the profiler has seen, its duration, its length, its slowest step and the duration of every
+        step.
+        """
+        return [outlier for _, _, outlier in sorted(self._outliers, key=lambda entry: entry[:2], reverse=True)]
+
+    def to_dict(self):
+        """
+        :return: The statistics as a dictionary which can be dumped to json.
+        """
+        return {"ticket_count": self.ticket_count, "ticket_seconds": self.ticket_seconds.to_dict(),
+                "ticket_length": self.ticket_length.to_dict(),
+                "steps": {step: {"seconds": histogram.to_dict(), "input_chars": self.step_input_chars[step],
+                                 "output_chars": self.step_output_chars[step]}
+                          for step, histogram in self.step_seconds.items()},
+                "outlier_seconds": self.outlier_seconds, "outlier_count": self.outlier_count, "outliers": self.outliers}
+
+    def to_json(self):
+        """
+        :return: The statistics as a json string.
+        """
+        return json.dumps(self.to_dict(), indent=1)
+
+    def to_prometheus(self, prefix="preprocessing"):
+        """
+        :param prefix: The prefix of the metric names.
+        :return: The statistics in the Prometheus text exposition format. The outliers are not exported.
+        """
+        lines = []
+
+        def add_histogram(name, help_text, histograms):
+            lines.append("# HELP {}_{} {}".format(prefix, name, help_text))
+            lines.append("# TYPE {}_{} histogram".format(prefix, name))
+            for labels, histogram in histograms:
+                for bound, count in histogram.cumulative_counts():
+                    bucket_labels = labels + [("le", bound if bound == "+Inf" else repr(float(bound)))]
+                    lines.append("{}_{}_bucket{} {}".format(prefix, name, _format_labels(bucket_labels), count))
+                lines.append("{}_{}_sum{} {}".format(prefix, name, _format_labels(labels), repr(float(histogram.sum))))
+                lines.append("{}_{}_count{} {}".format(prefix, name, _format_labels(labels), histogram.count))
+
+        def add_counter(name, help_text, values):
+            lines.append("# HELP {}_{} {}".format(prefix, name, help_text))
+            lines.append("# TYPE {}_{} counter".format(prefix, name))
+            for labels, value in values:
+                lines.append("{}_{}{} {}".format(prefix, name, _format_labels(labels), value))
+
+        add_histogram("ticket_seconds", "Wall time of the preprocessing of a ticket.", [([], self.ticket_seconds)])
+        add_histogram("ticket_length_chars", "Number of characters of a raw ticket.", [([], self.ticket_length)])
+        add_histogram("step_seconds", "Wall time of a step of the preprocessing of a ticket.",
+                      [([("step", step)], histogram) for step, histogram in self.step_seconds.items()])
+        add_counter("step_input_chars_total", "Characters given to a step of the preprocessing.",
+                    [([("step", step)], chars) for step, chars in self.step_input_chars.items()])
+        add_counter("step_output_chars_total", "Characters returned by a step of the preprocessing.",
+                    [([("step", step)], chars) for step, chars in self.step_output_chars.items()])
+        add_counter("outlier_tickets_total", "Tickets slower than the outlier threshold.",
+                    [([], self.outlier_count)])
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                          for name, value in labels) + "}"
@@ -0,0 +1,245 @@
+import numpy as np
+from scipy import sparse
+from sklearn.base import BaseEstimator
+from sklearn.metrics import pairwise_distances_chunked
+from sklearn.utils import check_random_state
+
+from near_duplicates import deduplicate, duplicate_weights
+
+# Memory, in MiB, that a block of the distance matrix may take. Only one block per job is held at a time.
+DEFAULT_WORKING_MEMORY = 256
+
+
+def chunked_kneighbors(X, Y=None, n_neighbors=5, working_memory=DEFAULT_WORKING_MEMORY, n_jobs=None):
+    """
+    Function which finds the nearest rows of Y for every row of X, by euclidean distance. The distance matrix is
+    computed block by block and every block is reduced to its nearest neighbors right away, so the memory used does
+    not grow with the square of the number of rows. Sparse matrices stay sparse.
+    :param X: The query rows, a scipy.sparse matrix or a numpy array.
+    :param Y: The rows to search. Default is X, in which case a row is not its own neighbor.
+    :param n_neighbors: Number of neighbors per row. It is lowered to the number of rows of Y if there are fewer.
+    :param working_memory: Memory, in MiB, that a block of the distance matrix may take.
+    :param n_jobs: Number of jobs computing a block. -1 means one per CPU. Default is 1.
+    :return: Two numpy arrays of shape (X.shape[0], n_neighbors): the distances and the row numbers in Y of the
+    neighbors, nearest first.
+    """
+    exclude_self = Y is None
+    Y = X if Y is None else Y
+    n_neighbors = min(n_neighbors, Y.shape[0] - exclude_self)
+
+    def reduce_block(distances, start):
+        if exclude_self:
+            rows = np.arange(distances.shape[0])
+            distances[rows, start + rows] = np.inf
+        indices = np.argpartition(distances, n_neighbors - 1, axis=1)[:, :n_neighbors]
+        neighbor_distances = np.take_along_axis(distances, indices, axis=1)
+        order = np.argsort(neighbor_distances, axis=1)
+        return np.take_along_axis(neighbor_distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    blocks = list(pairwise_distances_chunked(X, Y, reduce_func=reduce_block, metric="euclidean", n_jobs=n_jobs,
+                                             working_memory=working_memory))
+    if not blocks:
+        return np.zeros((0, n_neighbors)), np.zeros((0, n_neighbors), dtype=np.int64)
+    return np.vstack([block[0] for block in blocks]), np.vstack([block[1] for block in blocks])
+
+
+def balanced_sample_weight(y):
+    """
+    :param y: The labels.
+    :return: The weight of every sample, like class_weight='balanced': n_samples / (n_classes * count of its class).
+    """
+    classes, class_indexes, counts = np.unique(y, return_inverse=True, return_counts=True)
+    return (len(y) / (len(classes) * counts))[class_indexes]
+
+
+class SparseRebalancer(BaseEstimator):
+    """
+    Base class of the rebalancing methods of this module. They are used like the imblearn samplers, through
+    fit_resample, work on the two classes of our tickets, and keep scipy.sparse matrices sparse.
+    After fit_resample, sample_weight_ holds the weights the model should be fitted with, or None.
+    """
+
+    def fit_resample(self, X, y):
+        """
+        :param X: The training matrix, i.e. the tf-idf values followed by the scaled manual features.
+        :param y: The labels, with exactly two classes.
+        :return: The rebalanced matrix, in CSR format if X was sparse, and its labels.
+        """
+        if sparse.issparse(X):
+            X = sparse.csr_matrix(X)
+        y = np.asarray(y)
+        classes, counts = np.unique(y, return_counts=True)
+        if len(classes) != 2:
+            raise ValueError("Rebalancing needs exactly 2 classes, got {}".format(len(classes)))
+        self.sample_weight_ = None
+        return self._fit_resample(X, y, classes[np.argmin(counts)], classes[np.argmax(counts)])
+
+    def _fit_resample(self, X, y, minority_class, majority_class):
+        raise NotImplementedError
+
+
+class SparseSMOTE(SparseRebalancer):
+    """
+    SMOTE for sparse matrices: every synthetic row is a random point between a minority row and one of its nearest
+    minority neighbors, computed with sparse operations. Only the minority rows are searched for neighbors.
+    """
+
+    def __init__(self, k_neighbors=5, random_state=None, working_memory=DEFAULT_WORKING_MEMORY, n_jobs=None):
+        """
+        :param k_neighbors: Number of nearest minority neighbors to pick from.
+        :param random_state: Seed or numpy RandomState for the picks and the steps.
+        :param working_memory: Memory, in MiB, that a block of the distance matrix may take.
+        :param n_jobs: Number of jobs for the neighbor search. -1 means one per CPU.
+        """
+        self.k_neighbors = k_neighbors
+        self.random_state = random_state
+        self.working_memory = working_memory
+        self.n_jobs = n_jobs
+
+    def _fit_resample(self, X, y, minority_class, majority_class):
+        random_state = check_random_state(self.random_state)
+        minority_rows = np.flatnonzero(y == minority_class)
+        sample_count = np.count_nonzero(y == majority_class) - len(minority_rows)
+        X_minority = X[minority_rows]
+        _, neighbors = chunked_kneighbors(X_minority, n_neighbors=self.k_neighbors,
+                                          working_memory=self.working_memory, n_jobs=self.n_jobs)
+
+        # Same draws as imblearn: a row, then one of its neighbors, then the step towards it
+        samples = random_state.randint(0, len(minority_rows) * neighbors.shape[1], size=sample_count)
+        rows = samples // neighbors.shape[1]
+        neighbor_rows = neighbors[rows, samples % neighbors.shape[1]]
+        steps = random_state.uniform(size=sample_count)
+        if sparse.issparse(X):
+            synthetic = sparse.diags(1 - steps) @ X_minority[rows] + sparse.diags(steps) @ X_minority[neighbor_rows]
+            X_resampled = sparse.vstack([X, synthetic.astype(X.dtype)], format="csr")
+        else:
+            synthetic = X_minority[rows] + steps[:, None] * (X_minority[neighbor_rows] - X_minority[rows])
+            X_resampled = np.vstack([X, synthetic])
+        return X_resampled, np.concatenate([y, np.full(sample_count, minority_class, dtype=y.dtype)])
+
+
+class SparseEditedNearestNeighbours(SparseRebalancer):
+    """
+    Edited nearest neighbours cleaning: a row is removed when its nearest neighbors do not all have its label, like
+    the EditedNearestNeighbours(sampling_strategy="all") used by imblearn's SMOTEENN.
+    """
+
+    def __init__(self, n_neighbors=3, working_memory=DEFAULT_WORKING_MEMORY, n_jobs=None):
+        """
+        :param n_neighbors: Number of nearest neighbors which must share the label of a row for it to be kept.
+        :param working_memory: Memory, in MiB, that a block of the distance matrix may take.
+        :param n_jobs: Number of jobs for the neighbor search. -1 means one per CPU.
+        """
+        self.n_neighbors = n_neighbors
+        self.working_memory = working_memory
+        self.n_jobs = n_jobs
+
+    def _fit_resample(self, X, y, minority_class, majority_class):
+        _, neighbors = chunked_kneighbors(X, n_neighbors=self.n_neighbors, working_memory=self.working_memory,
+                                          n_jobs=self.n_jobs)
+        kept_rows = np.flatnonzero((y[neighbors] == y[:, None]).all(axis=1))
+        # Grouped by class like imblearn, so both give the same rows in the same order
+        kept_rows = kept_rows[np.argsort(y[kept_rows], kind="stable")]
+        return X[kept_rows], y[kept_rows]
+
+
+class SparseSMOTEENN(SparseRebalancer):
+    """
+    SparseSMOTE followed by SparseEditedNearestNeighbours, the sparse and memory-bounded counterpart of imblearn's
+    SMOTEENN used in the "Preprocessing and modeling" notebook.
+    """
+
+    def __init__(self, k_neighbors=5, n_neighbors=3, random_state=None, working_memory=DEFAULT_WORKING_MEMORY,
+                 n_jobs=None):
+        """
+        :param k_neighbors: Number of nearest minority neighbors SMOTE picks from.
+        :param n_neighbors: Number of nearest neighbors the cleaning looks at.
+        :param random_state: Seed or numpy RandomState of SMOTE.
+        :param working_memory: Memory, in MiB, that a block of the distance matrix may take.
+        :param n_jobs: Number of jobs for the neighbor searches. -1 means one per CPU.
+        """
+        self.k_neighbors = k_neighbors
+        self.n_neighbors = n_neighbors
+        self.random_state = random_state
+        self.working_memory = working_memory
+        self.n_jobs = n_jobs
+
+    def _fit_resample(self, X, y, minority_class, majority_class):
+        X_resampled, y_resampled = SparseSMOTE(self.k_neighbors, self.random_state, self.working_memory,
+                                               self.n_jobs).fit_resample(X, y)
+        return SparseEditedNearestNeighbours(self.n_neighbors, self.working_memory,
+                                             self.n_jobs).fit_resample(X_resampled, y_resampled)
+
+
+class HardNegativeUnderSampler(SparseRebalancer):
+    """
+    Undersampling which keeps every minority row and, of the majority rows, mostly the hard ones: the rows closest to
+    a minority row, which are the ones the model confuses. The rest of the kept majority rows are picked at random, so
+    the easy tickets are still represented. Only the distances from the majority rows to the minority rows are
+    computed, which is much cheaper than SMOTEENN.
+    """
+
+    def __init__(self, sampling_strategy=1.0, hard_fraction=0.5, random_state=None,
+                 working_memory=DEFAULT_WORKING_MEMORY, n_jobs=None):
+        """
+        :param sampling_strategy: Number of minority rows divided by the number of majority rows after resampling.
+        :param hard_fraction: Fraction of the kept majority rows which are the hardest ones.
+        :param random_state: Seed or numpy RandomState of the random picks.
+        :param working_memory: Memory, in MiB, that a block of the distance matrix may take.
+        :param n_jobs: Number of jobs for the neighbor search. -1 means one per CPU.
+        """
+        self.sampling_strategy = sampling_strategy
+        self.hard_fraction = hard_fraction
+        self.random_state = random_state
+        self.working_memory = working_memory
+        self.n_jobs = n_jobs
+
+    def _fit_resample(self, X, y, minority_class, majority_class):
+        random_state = check_random_state(self.random_state)
+        minority_rows = np.flatnonzero(y == minority_class)
+        majority_rows = np.flatnonzero(y == majority_class)
+        kept_count = min(len(majority_rows), int(round(len(minority_rows) / self.sampling_strategy)))
+        hard_count = int(round(kept_count * self.hard_fraction))
+
+        distances, _ = chunked_kneighbors(X[majority_rows], X[minority_rows], n_neighbors=1,
+                                          working_memory=self.working_memory, n_jobs=self.n_jobs)
+        by_hardness = np.argsort(distances[:, 0], kind="stable")
+        random_rows = random_state.choice(by_hardness[hard_count:], kept_count - hard_count, replace=False)
+        kept_rows = np.sort(np.concatenate([minority_rows, majority_rows[by_hardness[:hard_count]],
+                                            majority_rows[random_rows]]))
+        return X[kept_rows], y[kept_rows]
+
+
+class ClassWeighting(SparseRebalancer):
+    """
+    The cheapest alternative: the matrix is kept as it is and the classes are balanced through the sample weights,
+    like class_weight='balanced'. The weights are in sample_weight_ after fit_resample.
+    """
+
+    def _fit_resample(self, X, y, minority_class, majority_class):
+        self.sample_weight_ = balanced_sample_weight(y)
+        return X, y
+
+
+class NearDuplicateWeighting(SparseRebalancer):
+    """
+    Keeps the near-duplicate tickets from counting several times: every group of near-duplicates with the same label
+    either counts as one row through the sample weights, or is reduced to its first row.
+    """
+
+    def __init__(self, groups, deduplicate=False):
+        """
+        :param groups: The group of every row of the matrix, as returned by near_duplicates.near_duplicate_groups.
+        :param deduplicate: Flag. If set to True, drop all rows of a group but the first one instead of weighting them.
+        """
+        self.groups = groups
+        self.deduplicate = deduplicate
+
+    def _fit_resample(self, X, y, minority_class, majority_class):
+        if len(self.groups) != X.shape[0]:
+            raise ValueError("Got {} groups for {} rows".format(len(self.groups), X.shape[0]))
+        if self.deduplicate:
+            kept_rows = deduplicate(self.groups, y)
+            return X[kept_rows], y[kept_rows]
+        self.sample_weight_ = duplicate_weights(self.groups, y)
+        return X, y
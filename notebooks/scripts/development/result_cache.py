@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from disk_cache import MISSING, DiskBackedCache, text_key
+from preprocessing import preprocess_text_batch, translate_series_to_en
+
+# Default location of the result cache. It can be moved with the RESULT_CACHE_PATH environment variable.
+DEFAULT_RESULT_CACHE_PATH = os.environ.get(
+    "RESULT_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data", "result_cache.sqlite"))
+
+
+def result_key(text, version, translate=True):
+    """
+    Function which returns the key under which the score of a text is cached. The model version and the translate
+    flag are part of the key, so a new model bundle never reads the scores of the previous one.
+    :param text: The raw ticket text.
+    :param version: The version of the model, i.e. the hash of its bundle.
+    :param translate: The translate flag the text was scored with.
+    :return: The key as bytes.
+    """
+    return text_key("{}\0{:d}\0{}".format(version, translate, text))
+
+
+class ResultCache(DiskBackedCache):
+    """
+    Cache of the probability of the positive class of every ticket text already scored, kept in memory and optionally
+    in a SQLite file shared between runs and processes.
+    """
+
+    TABLE = "scores"
+    VALUE_COLUMN = "probability"
+    VALUE_TYPE = "REAL"
+
+    def get(self, text, version, translate=True):
+        """
+        :param text: The raw ticket text.
+        :param version: The version of the model.
+        :param translate: The translate flag the text is scored with.
+        :return: The cached probability of the positive class, or MISSING if not cached.
+        """
+        return self.get_key(result_key(text, version, translate))
+
+    def put(self, text, version, probability, translate=True):
+        """
+        :param text: The raw ticket text.
+        :param version: The version of the model.
+        :param probability: The probability of the positive class.
+        :param translate: The translate flag the text was scored with.
+        """
+        self.put_key(result_key(text, version, translate), float(probability))
+
+
+class CachedScorer:
+    """
+    Scorer which looks every text up in a ResultCache first, so translation, preprocessing and scoring only run for
+    texts that were never scored by this model version. Identical texts of one batch are scored once.
+    With a NearDuplicateIndex, a text missing from the cache takes the score of its most similar near-duplicate already
+    scored by this model version with the same translate flag, and is only scored if it has none. Only the scores
+    computed for the text itself are cached. The texts are compared after translation, on the cleaned text the model
+    scores. The wrapped scorer must have a token_matcher and
+    a predict_proba_preprocessed method, like the LinearScorer.
+    The other attributes and methods are the ones of the wrapped scorer.
+    """
+
+    def __init__(self, scorer, cache=None, near_duplicates=None):
+        """
+        :param scorer: A scorer with a version, i.e. the LinearScorer returned by load_bundle.
+        :param cache: A ResultCache instance. Default is an in-memory cache.
+        :param near_duplicates: A NearDuplicateIndex of the texts scored by this model version, whose version is the
+        one of the scorer. The new scores are added to it. Default is None, only identical texts reuse a score.
+        """
+        if scorer.version is None:
+            raise ValueError("The scorer has no version to key its results by, load it from a model bundle")
+        if near_duplicates is not None and near_duplicates.version != scorer.version:
+            raise ValueError("The near-duplicate index holds the scores of model version {}, not {}".format(
+                near_duplicates.version, scorer.version))
+        self.scorer = scorer
+        self.cache = cache if cache is not None else ResultCache()
+        self.near_duplicates = near_duplicates
+
+    def __getattr__(self, name):
+        # Only called for attributes CachedScorer does not have itself
+        if name == "scorer":
+            raise AttributeError(name)
+        return getattr(self.scorer, name)
+
+    def predict_proba(self, texts, translate=True):
+        """
+        Score a batch of ticket texts, reusing the cached scores.
+        :param texts: A list or pandas.Series of ticket texts.
+        :param translate: Flag. If set to True, translate the texts into English first. Default is True.
+        :return: A numpy array of shape (len(texts), 2) with the probabilities of the negative and positive class.
+        """
+        texts = list(texts)
+        probabilities = np.empty(len(texts))
+        positions_by_text = dict()
+        for position, text in enumerate(texts):
+            probability = self.cache.get(text, self.scorer.version, translate)
+            if probability is MISSING:
+                positions_by_text.setdefault(text, []).append(position)
+            else:
+                probabilities[position] = probability
+
+        if positions_by_text and self.near_duplicates is not None:
+            self._score_near_duplicates(positions_by_text, probabilities, translate)
+        elif positions_by_text:
+            new_probabilities = self.scorer.predict_proba(list(positions_by_text), translate)[:, 1]
+            for (text, positions), probability in zip(positions_by_text.items(), new_probabilities):
+                probabilities[positions] = probability
+                self.cache.put(text, self.scorer.version, probability, translate)
+        return np.column_stack([1 - probabilities, probabilities])
+
+    def _score_near_duplicates(self, positions_by_text, probabilities, translate):
+        """
+        Score the texts missing from the cache, reusing the score of their near-duplicates. The texts are translated
+        if requested and preprocessed once: the cleaned texts give the signatures and the texts without a
+        near-duplicate are scored from them, with predict_proba_preprocessed.
+        :param positions_by_text: A dictionary of the texts to score and their positions in the batch.
+        :param probabilities: The numpy array of probabilities of the batch, filled in place.
+        :param translate: The translate flag the texts are scored with.
+        """
+        texts = list(positions_by_text)
+        model_texts = translate_series_to_en(pd.Series(texts, dtype=object)) if translate else texts
+        cleaned_texts, manual_features = preprocess_text_batch(model_texts, self.scorer.token_matcher,
+                                                               dtype=np.float64)
+        signatures = [self.near_duplicates.signature(cleaned_text) for cleaned_text in cleaned_texts]
+        new_rows = []
+        for row, (text, signature) in enumerate(zip(texts, signatures)):
+            values = [self.near_duplicates.values[position]
+                      for position, _ in self.near_duplicates.query_signature(signature)]
+            # Every value is a [probability, translate] pair
+            probability = next((value[0] for value in values if value[1] == translate), None)
+            if probability is None:
+                new_rows.append(row)
+            else:
+                probabilities[positions_by_text[text]] = probability
+
+        if new_rows:
+            new_probabilities = self.scorer.predict_proba_preprocessed([cleaned_texts[row] for row in new_rows],
+                                                                       manual_features[new_rows])[:, 1]
+            for row, probability in zip(new_rows, new_probabilities):
+                probabilities[positions_by_text[texts[row]]] = probability
+                self.near_duplicates.add_signature(signatures[row], [float(probability), translate])
+                # Only exact scores are cached: a borrowed score may differ from the one of the text itself
+                self.cache.put(texts[row], self.scorer.version, probability, translate)
@@ -0,0 +1,254 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+import pandas as pd
+
+from model_bundle import load_bundle
+from preprocessing import preprocess_text_series, translate_series_to_en
+
+JSON_CHUNK_SIZE = 1 << 16
+
+
+def detect_format(path):
+    """
+    Function which guesses the format of a ticket file: "csv" from its extension, otherwise "json" if the file starts
+    with a json array, like data/technical_test_data.json, and "jsonl" if it has one json record per line.
+    :param path: Path of the ticket file.
+    :return: "csv", "json" or "jsonl".
+    """
+    if path.lower().endswith(".csv"):
+        return "csv"
+    with open(path, "r", encoding="utf-8") as ticket_file:
+        while True:
+            character = ticket_file.read(1)
+            if not character or not character.isspace():
+                break
+    return "json" if character == "[" else "jsonl"
+
+
+def iter_json_array(ticket_file, chunk_size=JSON_CHUNK_SIZE):
+    """
+    Function which yields the elements of a json array one by one, reading the file in chunks. Only the current chunk
+    and the element being decoded are held in memory.
+    :param ticket_file: A file opened in text mode, containing a json array.
+    :param chunk_size: Number of characters read at once.
+    :return: A generator of the decoded elements.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ticket_file.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("The file does not contain a json array")
+    position = 1
+    end_of_file = False
+    while True:
+        # Skip the separators between two elements
+        while True:
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ","):
+                position += 1
+            if position < len(buffer) or end_of_file:
+                break
+            buffer, position = ticket_file.read(chunk_size), 0
+            end_of_file = not buffer
+        if position >= len(buffer):
+            raise ValueError("The json array is not closed")
+        if buffer[position] == "]":
+            return
+
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if end_of_file:
+                raise
+            # The element goes on in the next chunk
+            chunk = ticket_file.read(chunk_size)
+            end_of_file = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        # A number can be cut at the end of the chunk and still decode, so it is only trusted if something follows it
+        if end == len(buffer) and not end_of_file:
+            chunk = ticket_file.read(chunk_size)
+            end_of_file = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield element
+        position = end
+
+
+def iter_records(path, input_format=None):
+    """
+    Function which streams the records of a ticket file as dictionaries.
+    :param path: Path of a json array, jsonl or csv file.
+    :param input_format: "json", "jsonl" or "csv". Default is detect_format(path).
+    :return: A generator of dictionaries, one per ticket.
+    """
+    input_format = input_format or detect_format(path)
+    with open(path, "r", encoding="utf-8", newline="" if input_format == "csv" else None) as ticket_file:
+        if input_format == "json":
+            yield from iter_json_array(ticket_file)
+        elif input_format == "jsonl":
+            for line in ticket_file:
+                if line.strip():
+                    yield json.loads(line)
+        elif input_format == "csv":
+            yield from csv.DictReader(ticket_file)
+        else:
+            raise ValueError("Unknown input format: {}".format(input_format))
+
+
+def iter_tickets(records, text_field="Description", id_field=None):
+    """
+    Function which takes the id and the text out of every record.
+    :param records: An iterable of dictionaries, i.e. the output of iter_records.
+    :param text_field: The field containing the ticket text.
+    :param id_field: The field containing the ticket id. Default is "id" when the record has one, else the unnamed
+    index column written by pandas in a csv file, else the position of the record.
+    :return: A generator of (id, text) tuples.
+    """
+    for position, record in enumerate(records):
+        if text_field not in record:
+            raise ValueError("Record {} has no {} field".format(position, text_field))
+        if id_field is not None:
+            ticket_id = record[id_field]
+        else:
+            ticket_id = record.get("id", record.get("", position))
+        yield ticket_id, record[text_field] or ""
+
+
+def read_checkpoint(checkpoint_path):
+    """
+    :param checkpoint_path: Path of the checkpoint written by score_file.
+    :return: A dictionary with the number of records already scored and the size of the output at that point, or None
+    if there is no checkpoint.
+    """
+    if not os.path.isfile(checkpoint_path):
+        return None
+    with open(checkpoint_path, "r") as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def write_checkpoint(checkpoint_path, records, output_bytes):
+    """
+    Function which replaces the checkpoint in one step, so an interrupted run never leaves half a checkpoint.
+    :param checkpoint_path: Path of the checkpoint.
+    :param records: Number of records scored and written to the output.
+    :param output_bytes: Size of the output file after those records.
+    """
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w") as checkpoint_file:
+        json.dump({"records": records, "output_bytes": output_bytes}, checkpoint_file)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def score_batch(scorer, texts, translate=True, n_jobs=1):
+    """
+    Function which translates, preprocesses and scores one micro-batch of ticket texts.
+    :param scorer: A LinearScorer instance, i.e. the output of load_bundle.
+    :param texts: A list of ticket texts.
+    :param translate: Flag. If set to True, translate the texts into English first. Default is True.
+    :param n_jobs: Number of processes used for preprocessing, see preprocess_text_series. Default is 1.
+    :return: A numpy array with the probability of the positive class of every text.
+    """
+    text_series = pd.Series(texts, dtype=object)
+    if translate:
+        text_series = translate_series_to_en(text_series)
+    cleaned_texts, manual_features = preprocess_text_series(text_series, scorer.token_matcher, as_matrix=True,
+                                                            n_jobs=n_jobs)
+    return scorer.predict_proba_preprocessed(cleaned_texts, manual_features)[:, 1]
+
+
+def score_file(input_path, output_path, scorer, input_format=None, text_field="Description", id_field=None,
+               batch_size=256, threshold=0.5, translate=True, n_jobs=1, checkpoint_path=None, resume=True, limit=None,
+               report_every=10, log=sys.stderr):
+    """
+    Function which scores every ticket of a file and writes one json line per ticket with its id, the probability of
+    the positive class and the label. The tickets are read, scored and written in micro-batches, so the memory used
+    does not depend on the size of the file. After every batch, the number of records done is saved to a checkpoint,
+    from which an interrupted run is resumed.
+    :param input_path: Path of a json array, jsonl or csv file.
+    :param output_path: Path of the jsonl file to write.
+    :param scorer: A LinearScorer instance, i.e. the output of load_bundle.
+    :param input_format: "json", "jsonl" or "csv". Default is detect_format(input_path).
+    :param text_field: The field containing the ticket text. Default is "Description".
+    :param id_field: The field containing the ticket id. Default is chosen by iter_tickets.
+    :param batch_size: Number of tickets scored at once.
+    :param threshold: Probability from which a ticket gets the label 1.
+    :param translate: Flag. If set to True, translate the texts into English first. Default is True.
+    :param n_jobs: Number of processes used for preprocessing, see preprocess_text_series. Default is 1.
+    :param checkpoint_path: Path of the checkpoint. Default is output_path + ".checkpoint".
+    :param resume: Flag. If set to True and a checkpoint exists, skip the records it says are done and append to the
+    output. Otherwise start over. Default is True.
+    :param limit: Stop after this many records in total. Default is no limit.
+    :param report_every: Log the throughput every report_every batches.
+    :param log: File to which the throughput is logged. None to not log.
+    :return: A dictionary with the number of records scored by this run, the number skipped because of the
+    checkpoint, the duration and the throughput.
+    """
+    checkpoint_path = checkpoint_path or output_path + ".checkpoint"
+    checkpoint = read_checkpoint(checkpoint_path) if resume else None
+    done = checkpoint["records"] if checkpoint is not None else 0
+
+    if checkpoint is not None and os.path.isfile(output_path):
+        # Lines written after the last checkpoint belong to a batch that is scored again
+        with open(output_path, "r+b") as output_file:
+            output_file.truncate(checkpoint["output_bytes"])
+    tickets = islice(iter_tickets(iter_records(input_path, input_format), text_field, id_field), done, limit)
+
+    start = time.perf_counter()
+    scored = 0
+    with open(output_path, "ab" if checkpoint is not None else "wb") as output_file:
+        batch_number = 0
+        while True:
+            batch = list(islice(tickets, batch_size))
+            if not batch:
+                break
+            ids, texts = zip(*batch)
+            probabilities = score_batch(scorer, list(texts), translate, n_jobs)
+            lines = [json.dumps({"id": ticket_id, "probability": float(probability),
+                                 "label": int(probability >= threshold)})
+                     for ticket_id, probability in zip(ids, probabilities)]
+            output_file.write(("\n".join(lines) + "\n").encode("utf-8"))
+            output_file.flush()
+
+            scored += len(batch)
+            batch_number += 1
+            write_checkpoint(checkpoint_path, done + scored, output_file.tell())
+            if log is not None and batch_number % report_every == 0:
+                elapsed = time.perf_counter() - start
+                log.write("{} records scored, {:.1f} records/s\n".format(done + scored, scored / elapsed))
+
+    elapsed = time.perf_counter() - start
+    stats = {"records": scored, "skipped": done, "seconds": elapsed,
+             "records_per_second": scored / elapsed if elapsed > 0 else 0.0}
+    if log is not None:
+        log.write("Scored {records} records in {seconds:.1f} s ({records_per_second:.1f} records/s), "
+                  "{skipped} already done\n".format(**stats))
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a ticket file (json array, jsonl or csv) and write the id, "
+                                                 "probability and label of every ticket as jsonl.")
+    parser.add_argument("input", help="The ticket file, i.e. data/technical_test_data.json.")
+    parser.add_argument("output", help="The jsonl file to write.")
+    parser.add_argument("--format", choices=["json", "jsonl", "csv"], default=None,
+                        help="Format of the input. Default is guessed from the file.")
+    parser.add_argument("--bundle", default=None, help="The model bundle. Default is data/modeling/bundle_1.")
+    parser.add_argument("--text-field", default="Description", help="The field containing the ticket text.")
+    parser.add_argument("--id-field", default=None, help="The field containing the ticket id.")
+    parser.add_argument("--batch-size", type=int, default=256, help="Number of tickets scored at once.")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Probability from which the label is 1.")
+    parser.add_argument("--no-translate", action="store_true", help="Do not translate the texts into English.")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of preprocessing processes. -1 for one per CPU.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and score the file again.")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many records.")
+    args = parser.parse_args()
+
+    score_file(args.input, args.output, load_bundle(args.bundle), input_format=args.format,
+               text_field=args.text_field, id_field=args.id_field, batch_size=args.batch_size,
+               threshold=args.threshold, translate=not args.no_translate, n_jobs=args.jobs, resume=not args.restart,
+               limit=args.limit)
@@ -0,0 +1,452 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from model_bundle import load_bundle
+from result_cache import CachedScorer, ResultCache
+
+MAX_BODY_BYTES = 1 << 20
+
+
+class HttpError(Exception):
+    """
+    Error raised while handling a request, turned into a response with its status and message.
+    """
+
+    def __init__(self, status, message, close=False):
+        """
+        :param status: The http.HTTPStatus of the response.
+        :param message: The error message sent back to the caller.
+        :param close: Flag. If set to True, the connection is closed after the response, i.e. when the request could
+        not be read entirely.
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.close = close
+
+
+class LatencyRecorder:
+    """
+    Keeps the latencies of the last requests in a bounded window, to report their percentiles.
+    """
+
+    def __init__(self, window=10000):
+        """
+        :param window: Number of latest latencies kept.
+        """
+        self._latencies = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, seconds):
+        """
+        :param seconds: The latency of one request in seconds.
+        """
+        self._latencies.append(seconds)
+        self.count += 1
+
+    def percentiles(self, quantiles=(50, 90, 99)):
+        """
+        :param quantiles: The percentiles to compute.
+        :return: A dictionary of "p<quantile>" -> latency in milliseconds over the window, None if nothing was recorded.
+        """
+        latencies = np.array(self._latencies)
+        return {"p{}".format(quantile): float(np.percentile(latencies, quantile) * 1000) if len(latencies) else None
+                for quantile in quantiles}
+
+
+class MicroBatcher:
+    """
+    Coalesces the texts of concurrent requests into micro-batches. The first waiting request opens a batch, which is
+    scored as soon as it holds max_batch_size texts or max_wait seconds have passed. Scoring runs in a separate
+    thread, so the next batch is collected while the current one is scored. When a batch fails, its requests are
+    scored again one by one, so the error only reaches the requests which cause it.
+    """
+
+    def __init__(self, score_function, max_batch_size=64, max_wait=0.005):
+        """
+        :param score_function: Function which takes a list of texts and returns one score per text.
+        :param max_batch_size: Number of texts from which a batch is scored without waiting any longer. A request is
+        never split, so a batch can be larger when one request brings more texts.
+        :param max_wait: Maximum number of seconds a request waits for other requests to join its batch.
+        """
+        self.score_function = score_function
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.batches = 0
+        self.batched_texts = 0
+        self._queue = None
+        self._worker = None
+        self._executor = None
+
+    def start(self):
+        """
+        Start collecting batches. Must be called from the event loop that will submit the texts.
+        """
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop collecting batches. Requests still waiting are cancelled.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while self._queue is not None and not self._queue.empty():
+            self._queue.get_nowait()[1].cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def submit(self, texts):
+        """
+        Score texts together with the texts of the other requests waiting at the same time.
+        :param texts: A list of texts.
+        :return: A list with the score of every text.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((texts, future))
+        self.queue_depth += len(texts)
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        items = [await self._queue.get()]
+        size = len(items[0][0])
+        deadline = loop.time() + self.max_wait
+        while size < self.max_batch_size:
+            if self._queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = self._queue.get_nowait()
+            items.append(item)
+            size += len(item[0])
+        return items
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self._collect()
+            texts = [text for item_texts, _ in items for text in item_texts]
+            self.queue_depth -= len(texts)
+            try:
+                scores = await loop.run_in_executor(self._executor, self.score_function, texts)
+            except Exception as error:
+                if len(items) == 1:
+                    self._set_exception(items[0][1], error)
+                else:
+                    # One request of the batch may hold the text which failed, so every request is scored on its own
+                    # and only the failing ones get the error
+                    await self._run_one_by_one(items)
+                continue
+
+            self.batches += 1
+            self.batched_texts += len(texts)
+            position = 0
+            for item_texts, future in items:
+                self._set_result(future, scores[position:position + len(item_texts)])
+                position += len(item_texts)
+
+    async def _run_one_by_one(self, items):
+        loop = asyncio.get_running_loop()
+        for item_texts, future in items:
+            if future.done():
+                continue
+            try:
+                scores = await loop.run_in_executor(self._executor, self.score_function, item_texts)
+            except Exception as error:
+                self._set_exception(future, error)
+                continue
+            self.batches += 1
+            self.batched_texts += len(item_texts)
+            self._set_result(future, scores)
+
+    @staticmethod
+    def _set_result(future, scores):
+        # The caller may have gone away, i.e. the connection was closed while waiting
+        if not future.done():
+            future.set_result([float(score) for score in scores])
+
+    @staticmethod
+    def _set_exception(future, error):
+        if not future.done():
+            future.set_exception(error)
+
+
+class ScoringService:
+    """
+    HTTP service which scores ticket texts with a model bundle. POST /classify takes {"text": "..."} or
+    {"texts": ["...", ...]}, GET /metrics returns the latency, queue and batch metrics and GET /health tells whether
+    the service is up. Connections are kept alive between requests.
+    """
+
+    def __init__(self, scorer, max_batch_size=64, max_wait=0.005, threshold=0.5, translate=True):
+        """
+        :param scorer: A LinearScorer instance, i.e. the output of load_bundle, or a CachedScorer around it.
+        :param max_batch_size: Number of texts from which a micro-batch is scored without waiting any longer.
+        :param max_wait: Maximum number of seconds a request waits for other requests to join its micro-batch.
+        :param threshold: Probability from which a ticket gets the label 1.
+        :param translate: Flag. If set to True, translate the texts into English first. Default is True.
+        """
+        self.scorer = scorer
+        self.threshold = threshold
+        self.translate = translate
+        self.batcher = MicroBatcher(self.score_texts, max_batch_size, max_wait)
+        self.latencies = LatencyRecorder()
+        self.requests = 0
+        self.errors = 0
+        self.open_connections = 0
+
+    def score_texts(self, texts):
+        """
+        :param texts: A list of ticket texts.
+        :return: A numpy array with the probability of the positive class of every text.
+        """
+        return self.scorer.predict_proba(texts, translate=self.translate)[:, 1]
+
+    def _result(self, probability):
+        return {"probability": probability, "label": int(probability >= self.threshold)}
+
+    async def classify(self, payload):
+        """
+        :param payload: The decoded body of a /classify request.
+        :return: The body of the response.
+        """
+        if isinstance(payload, dict) and isinstance(payload.get("text"), str):
+            probabilities = await self.batcher.submit([payload["text"]])
+            return dict(self._result(probabilities[0]), model_version=self.scorer.version)
+        if (isinstance(payload, dict) and isinstance(payload.get("texts"), list)
+                and all(isinstance(text, str) for text in payload["texts"])):
+            probabilities = await self.batcher.submit(payload["texts"]) if payload["texts"] else []
+            return {"results": [self._result(probability) for probability in probabilities],
+                    "model_version": self.scorer.version}
+        raise HttpError(HTTPStatus.BAD_REQUEST, 'Expected {"text": "..."} or {"texts": ["...", ...]}')
+
+    def metrics(self):
+        """
+        :return: A dictionary with the request counts, the latency percentiles in milliseconds, the queue depth, the
+        micro-batch sizes and the result cache statistics.
+        """
+        batcher = self.batcher
+        metrics = {"requests": self.requests, "errors": self.errors, "open_connections": self.open_connections,
+                   "latency_ms": self.latencies.percentiles(), "queue_depth": batcher.queue_depth,
+                   "max_queue_depth": batcher.max_queue_depth, "batches": batcher.batches,
+                   "average_batch_size": batcher.batched_texts / batcher.batches if batcher.batches else None,
+                   "model_version": self.scorer.version}
+        if isinstance(self.scorer, CachedScorer):
+            metrics["result_cache"] = self.scorer.cache.stats()
+        return metrics
+
+    async def handle(self, method, path, body):
+        """
+        Route one request.
+        :param method: The http method.
+        :param path: The path of the request, without the query string.
+        :param body: The body of the request as bytes.
+        :return: The status and the body of the response.
+        """
+        if path == "/classify":
+            if method != "POST":
+                raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST")
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                raise HttpError(HTTPStatus.BAD_REQUEST, "The body is not valid json")
+            start = time.perf_counter()
+            response = await self.classify(payload)
+            self.latencies.record(time.perf_counter() - start)
+            return HTTPStatus.OK, response
+        if path in ("/metrics", "/health"):
+            if method != "GET":
+                raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET")
+            return HTTPStatus.OK, self.metrics() if path == "/metrics" else {"status": "ok"}
+        raise HttpError(HTTPStatus.NOT_FOUND, "Unknown path {}".format(path))
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serve the requests of one connection until the caller closes it.
+        :param reader: The asyncio.StreamReader of the connection.
+        :param writer: The asyncio.StreamWriter of the connection.
+        """
+        self.open_connections += 1
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    method, target, keep_alive, body = request
+                    self.requests += 1
+                    status, response = await self.handle(method, urlsplit(target).path, body)
+                except HttpError as error:
+                    self.errors += 1
+                    status, response = error.status, {"error": error.message}
+                    keep_alive = keep_alive and not error.close
+                except Exception as error:
+                    self.errors += 1
+                    status, response = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(error)}
+                write_response(writer, status, response, keep_alive)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.open_connections -= 1
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8000):
+        """
+        Start the micro-batcher and listen for connections.
+        :param host: The interface to listen on.
+        :param port: The port to listen on. 0 picks a free port.
+        :return: The asyncio.Server. Its sockets give the port actually used.
+        """
+        self.batcher.start()
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def stop(self, server):
+        """
+        Stop listening and stop the micro-batcher.
+        :param server: The asyncio.Server returned by start.
+        """
+        server.close()
+        await server.wait_closed()
+        await self.batcher.stop()
+
+
+async def _read_line(reader):
+    # readline raises a ValueError when the line is longer than the limit of the reader. The rest of the line is
+    # still in the stream, so the connection cannot be read any further.
+    try:
+        return await reader.readline()
+    except (asyncio.LimitOverrunError, ValueError):
+        raise HttpError(HTTPStatus.BAD_REQUEST, "The request line or a header line is too long", close=True)
+
+
+async def read_request(reader):
+    """
+    Function which reads one HTTP/1.x request from a connection.
+    :param reader: The asyncio.StreamReader of the connection.
+    :return: A (method, target, keep_alive, body) tuple, or None if the connection was closed before a new request.
+    """
+    request_line = await _read_line(reader)
+    if not request_line.strip():
+        return None
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "Malformed request line", close=True)
+
+    headers = dict()
+    while True:
+        line = await _read_line(reader)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "Malformed Content-Length", close=True)
+    if length < 0:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "Negative Content-Length", close=True)
+    if length > MAX_BODY_BYTES:
+        raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "The body is larger than {} bytes".format(MAX_BODY_BYTES),
+                        close=True)
+    body = await reader.readexactly(length) if length else b""
+    return method, target, keep_alive, body
+
+
+def write_response(writer, status, payload, keep_alive=True):
+    """
+    Function which writes a json response on a connection.
+    :param writer: The asyncio.StreamWriter of the connection.
+    :param status: The http.HTTPStatus of the response.
+    :param payload: The body of the response, encoded as json.
+    :param keep_alive: Flag. If set to False, tell the caller the connection is closed after this response.
+    """
+    body = json.dumps(payload).encode("utf-8")
+    head = ("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n"
+            .format(status.value, status.phrase, len(body), "keep-alive" if keep_alive else "close"))
+    writer.write(head.encode("latin-1") + body)
+
+
+async def serve(service, host, port):
+    """
+    Function which runs a ScoringService until the process is stopped.
+    :param service: A ScoringService instance.
+    :param host: The interface to listen on.
+    :param port: The port to listen on.
+    """
+    server = await service.start(host, port)
+    print("Listening on http://{}:{}".format(host, server.sockets[0].getsockname()[1]), flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await service.stop(server)
+
+
+def main(arguments=None):
+    """
+    Function which parses the command line arguments, loads the model bundle and runs the service.
+    :param arguments: The command line arguments. Default is sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Serve the ticket classifier over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="The interface to listen on.")
+    parser.add_argument("--port", type=int, default=8000, help="The port to listen on.")
+    parser.add_argument("--bundle", default=None, help="The model bundle. Default is data/modeling/bundle_1.")
+    parser.add_argument("--max-batch-size", type=int, default=64,
+                        help="Number of texts from which a micro-batch is scored without waiting.")
+    parser.add_argument("--max-wait-ms", type=float, default=5,
+                        help="Maximum time a request waits for others to join its micro-batch.")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Probability from which the label is 1.")
+    parser.add_argument("--no-translate", action="store_true", help="Do not translate the texts into English.")
+    parser.add_argument("--result-cache", default=None,
+                        help="SQLite file in which the scores are cached, shared with other processes. Default is to "
+                             "cache them in memory only.")
+    parser.add_argument("--result-cache-entries", type=int, default=100000,
+                        help="Maximum number of scores cached in memory.")
+    parser.add_argument("--no-result-cache", action="store_true", help="Score every text, even if already scored.")
+    parser.add_argument("--sorted-vocabulary", action="store_true",
+                        help="Memory-map the vocabulary of the bundle instead of loading it into a dictionary, for "
+                             "hosts serving many models. The lookups are slower.")
+    args = parser.parse_args(arguments)
+
+    scorer = load_bundle(args.bundle, args.sorted_vocabulary)
+    if not args.no_result_cache:
+        scorer = CachedScorer(scorer, ResultCache(args.result_cache, max_memory_entries=args.result_cache_entries))
+    service = ScoringService(scorer, args.max_batch_size, args.max_wait_ms / 1000, args.threshold,
+                             not args.no_translate)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import json
+import os
+import shutil
+import tempfile
+from collections.abc import Mapping
+
+import numpy as np
+import pkg_resources
+from symspellpy import SymSpell
+
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+
+DICTIONARY_PATH = pkg_resources.resource_filename("symspellpy", "frequency_dictionary_en_82_765.txt")
+BIGRAM_PATH = pkg_resources.resource_filename("symspellpy", "frequency_bigramdictionary_en_243_342.txt")
+
+# Default location of the prebuilt index. It can be moved with the SYMSPELL_INDEX_DIR environment variable.
+DEFAULT_INDEX_DIR = os.environ.get(
+    "SYMSPELL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data", "spelling_index"))
+
+INDEX_FORMAT_VERSION = 1
+
+
+def build_sym_spell():
+    """
+    Function which builds a SymSpell instance from the frequency dictionaries shipped with symspellpy.
+    Building it computes every delete of every word, which takes several seconds.
+    :return: A SymSpell instance ready to be used for lookup_compound.
+    """
+    sym_spell = SymSpell(max_dictionary_edit_distance=MAX_EDIT_DISTANCE, prefix_length=PREFIX_LENGTH)
+    # Load dictionaries as stated in documentation
+    # https://symspellpy.readthedocs.io/en/latest/examples/lookup_compound.html
+    sym_spell.load_dictionary(DICTIONARY_PATH, term_index=0, count_index=1)
+    sym_spell.load_bigram_dictionary(BIGRAM_PATH, term_index=0, count_index=2)
+    return sym_spell
+
+
+class MappedCounts(Mapping):
+    """
+    Read-only dictionary of string -> count, stored as a sorted array of UTF-8 encoded keys and an array of counts.
+    Both arrays can be memory-mapped, so processes using the same index share their pages.
+    """
+
+    def __init__(self, keys, values):
+        self.keys_array = keys
+        self.values_array = values
+        self._width = keys.dtype.itemsize
+
+    def _find(self, key):
+        if not isinstance(key, str):
+            return -1
+        encoded = key.encode("utf-8")
+        if len(encoded) > self._width:
+            return -1
+        position = int(self.keys_array.searchsorted(encoded))
+        if position < len(self.keys_array) and self.keys_array[position] == encoded:
+            return position
+        return -1
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def __getitem__(self, key):
+        position = self._find(key)
+        if position < 0:
+            raise KeyError(key)
+        return int(self.values_array[position])
+
+    def __len__(self):
+        return len(self.keys_array)
+
+    def __iter__(self):
+        return (key.decode("utf-8") for key in self.keys_array)
+
+
+class MappedDeletes(MappedCounts):
+    """
+    Read-only dictionary of delete -> list of words, stored as a sorted array of deletes, an array of offsets and a flat
+    array of indexes into the word array. The words of a delete keep the order in which SymSpell added them.
+    """
+
+    def __init__(self, keys, offsets, word_indexes, words):
+        super().__init__(keys, offsets)
+        self.word_indexes = word_indexes
+        self.words = words
+
+    def __getitem__(self, key):
+        position = self._find(key)
+        if position < 0:
+            raise KeyError(key)
+        start, end = self.values_array[position], self.values_array[position + 1]
+        return [self.words[index].decode("utf-8") for index in self.word_indexes[start:end]]
+
+
+def _sorted_keys(keys):
+    encoded = np.array([key.encode("utf-8") for key in keys])
+    order = np.argsort(encoded, kind="stable")
+    return encoded[order], order
+
+
+def save_index(sym_spell, index_dir):
+    """
+    Function which writes the dictionaries of a SymSpell instance as numpy arrays plus a json manifest. The directory is
+    written next to its final location and moved in place at the end, so a reader never sees half an index.
+    :param sym_spell: A SymSpell instance, i.e. the result of build_sym_spell.
+    :param index_dir: The directory in which to save the index.
+    """
+    words = list(sym_spell.words.keys())
+    word_keys, word_order = _sorted_keys(words)
+    word_counts = np.array([sym_spell.words[words[index]] for index in word_order], dtype=np.int64)
+    word_positions = {words[index]: position for position, index in enumerate(word_order)}
+
+    deletes = list(sym_spell.deletes.keys())
+    delete_keys, delete_order = _sorted_keys(deletes)
+    delete_lengths = np.array([len(sym_spell.deletes[deletes[index]]) for index in delete_order], dtype=np.int64)
+    delete_offsets = np.concatenate([[0], np.cumsum(delete_lengths)])
+    delete_words = np.array([word_positions[word] for index in delete_order
+                             for word in sym_spell.deletes[deletes[index]]], dtype=np.int32)
+
+    bigrams = list(sym_spell.bigrams.keys())
+    bigram_keys, bigram_order = _sorted_keys(bigrams)
+    bigram_counts = np.array([sym_spell.bigrams[bigrams[index]] for index in bigram_order], dtype=np.int64)
+
+    parent_dir = os.path.dirname(os.path.abspath(index_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent_dir)
+    arrays = {"word_keys": word_keys, "word_counts": word_counts, "delete_keys": delete_keys,
+              "delete_offsets": delete_offsets, "delete_words": delete_words, "bigram_keys": bigram_keys,
+              "bigram_counts": bigram_counts}
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, name + ".npy"), array)
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as manifest_file:
+        json.dump(_index_manifest(sym_spell), manifest_file)
+
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.replace(tmp_dir, index_dir)
+
+
+def _index_manifest(sym_spell=None):
+    manifest = {"format_version": INDEX_FORMAT_VERSION,
+                "max_dictionary_edit_distance": MAX_EDIT_DISTANCE,
+                "prefix_length": PREFIX_LENGTH,
+                "sources": [[os.path.basename(path), os.path.getsize(path)] for path in (DICTIONARY_PATH, BIGRAM_PATH)]}
+    if sym_spell is not None:
+        manifest["max_length"] = sym_spell._max_length
+    return manifest
+
+
+def load_index(index_dir):
+    """
+    Function which loads an index saved by save_index. The arrays are memory-mapped, so loading takes milliseconds and
+    the pages are only read from disk when a lookup needs them.
+    :param index_dir: The directory in which the index was saved.
+    :return: A SymSpell instance whose dictionaries are read-only, or None if there is no up to date index there.
+    """
+    manifest_path = os.path.join(index_dir, "manifest.json")
+    if not os.path.isfile(manifest_path):
+        return None
+    with open(manifest_path, "r") as manifest_file:
+        manifest = json.load(manifest_file)
+    max_length = manifest.pop("max_length", None)
+    if manifest != _index_manifest() or max_length is None:
+        return None
+
+    def load(name):
+        return np.load(os.path.join(index_dir, name + ".npy"), mmap_mode="r")
+
+    words = load("word_keys")
+    sym_spell = SymSpell(max_dictionary_edit_distance=MAX_EDIT_DISTANCE, prefix_length=PREFIX_LENGTH)
+    sym_spell._words = MappedCounts(words, load("word_counts"))
+    sym_spell._deletes = MappedDeletes(load("delete_keys"), load("delete_offsets"), load("delete_words"), words)
+    sym_spell._bigrams = MappedCounts(load("bigram_keys"), load("bigram_counts"))
+    sym_spell._max_length = max_length
+    return sym_spell
+
+
+def get_sym_spell(index_dir=DEFAULT_INDEX_DIR):
+    """
+    Function which returns a SymSpell instance, loading the prebuilt index from index_dir if it exists. Otherwise the
+    dictionaries are built and the index is saved for the next processes. If the index cannot be written, the built
+    instance is returned anyway.
+    :param index_dir: The directory of the prebuilt index.
+    :return: A SymSpell instance.
+    """
+    sym_spell = load_index(index_dir)
+    if sym_spell is not None:
+        return sym_spell
+
+    sym_spell = build_sym_spell()
+    try:
+        save_index(sym_spell, index_dir)
+    except OSError:
+        return sym_spell
+    return load_index(index_dir) or sym_spell
@@ -0,0 +1,371 @@
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from collections import Counter, deque
+from itertools import islice
+
+import pandas as pd
+
+from model_bundle import DEFAULT_DATA_DIR
+from preprocessing import TOKEN_REGEX, TokenMatcher
+from score_tickets import iter_records, iter_tickets
+
+# Two words of a token glued together, i.e. _NAME__ADDRESS_ is _NAME_ followed by _ADDRESS_
+GLUED_WORDS_REGEX = re.compile(r'(?<=[A-Z])__(?=[A-Z])')
+
+
+class TokenCounts:
+    """
+    Frequencies of the placeholder tokens of a set of tickets: the number of occurrences of every token and the number
+    of tickets containing it. Counts of separate chunks or files are merged by adding them, so an export can be counted
+    in parallel chunks, or in several runs whose counts are saved and merged afterwards.
+    """
+
+    def __init__(self, occurrences=None, tickets=None, ticket_total=0):
+        """
+        :param occurrences: A dictionary of the number of occurrences of every token.
+        :param tickets: A dictionary of the number of tickets containing every token.
+        :param ticket_total: The number of tickets counted.
+        """
+        self.occurrences = Counter(occurrences or {})
+        self.tickets = Counter(tickets or {})
+        self.ticket_total = ticket_total
+
+    def __len__(self):
+        return len(self.occurrences)
+
+    def add(self, text):
+        """
+        Count the tokens of one ticket text. A token is found like get_tokens does.
+        :param text: The ticket text.
+        """
+        # A token is made of upper case letters and underscores, so it can only be found inside a span of the form
+        # _[A-Z_]*_. Finding the spans first is twice as fast as running TOKEN_REGEX over the whole text.
+        tokens = [group[0] + group[1] + group[0] for span in TokenMatcher.span_regex.findall(text)
+                  for group in TOKEN_REGEX.findall(span)]
+        self.occurrences.update(tokens)
+        self.tickets.update(set(tokens))
+        self.ticket_total += 1
+
+    def update(self, texts):
+        """
+        :param texts: An iterable of ticket texts.
+        :return: The TokenCounts instance.
+        """
+        for text in texts:
+            self.add(text)
+        return self
+
+    def merge(self, other):
+        """
+        Add the counts of another TokenCounts instance to these ones.
+        :param other: A TokenCounts instance.
+        :return: The TokenCounts instance.
+        """
+        self.occurrences.update(other.occurrences)
+        self.tickets.update(other.tickets)
+        self.ticket_total += other.ticket_total
+        return self
+
+    def to_dict(self):
+        """
+        :return: The counts as a dictionary which can be saved as json and loaded back with from_dict.
+        """
+        return {"ticket_total": self.ticket_total, "occurrences": dict(self.occurrences.most_common()),
+                "tickets": dict(self.tickets)}
+
+    @classmethod
+    def from_dict(cls, counts_dict):
+        """
+        :param counts_dict: The output of to_dict.
+        :return: A TokenCounts instance.
+        """
+        return cls(counts_dict["occurrences"], counts_dict["tickets"], counts_dict["ticket_total"])
+
+
+def count_tokens(texts):
+    """
+    :param texts: A list of ticket texts.
+    :return: A TokenCounts instance with the tokens of the texts.
+    """
+    return TokenCounts().update(texts)
+
+
+def iter_chunks(iterable, chunk_size):
+    """
+    :param iterable: Any iterable.
+    :param chunk_size: Number of elements of a chunk.
+    :return: A generator of lists of chunk_size elements, the last one possibly shorter.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def discover_tokens(input_path, input_format=None, text_field="Description", chunk_size=10000, n_jobs=1, limit=None):
+    """
+    Function which counts the placeholder tokens of every ticket of a file. The tickets are streamed in chunks, counted
+    by a pool of processes and the counts of the chunks are merged, so the memory used does not depend on the size of
+    the file.
+    :param input_path: Path of a json array, jsonl or csv file.
+    :param input_format: "json", "jsonl" or "csv". Default is detect_format(input_path).
+    :param text_field: The field containing the ticket text. Default is "Description".
+    :param chunk_size: Number of tickets counted at once by a process.
+    :param n_jobs: Number of processes. -1 to use all the CPUs. Default is 1, count in the current process.
+    :param limit: Stop after this many tickets. Default is no limit.
+    :return: A TokenCounts instance.
+    """
+    texts = (text for _, text in islice(iter_tickets(iter_records(input_path, input_format), text_field), limit))
+    chunks = iter_chunks(texts, chunk_size)
+    counts = TokenCounts()
+    if n_jobs == 1:
+        for chunk in chunks:
+            counts.merge(count_tokens(chunk))
+        return counts
+
+    n_jobs = os.cpu_count() if n_jobs < 0 else n_jobs
+    with multiprocessing.Pool(n_jobs) as pool:
+        # Pool.imap would read the whole file ahead of the workers, so only two chunks per process are kept in flight
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(count_tokens, (chunk,)))
+            if len(pending) >= 2 * n_jobs:
+                counts.merge(pending.popleft().get())
+        while pending:
+            counts.merge(pending.popleft().get())
+    return counts
+
+
+def normalize_token(token):
+    """
+    Function which reduces a token to the form shared by its variants: without the underscores around it, with its
+    words separated by one underscore and without the plural s of its words, i.e. __PRODUCTS__NAMES__ gives
+    PRODUCT_NAME.
+    :param token: A token, i.e. _PRODUCT_NAME_.
+    :return: The normalized form of the token.
+    """
+    words = [word for word in token.upper().split("_") if word]
+    return "_".join(word[:-1] if len(word) > 2 and word.endswith("S") else word for word in words)
+
+
+def edit_distance(first, second):
+    """
+    :param first: A string.
+    :param second: A string.
+    :return: The Levenshtein distance between the two strings: the number of characters to insert, delete or
+    substitute to turn one into the other.
+    """
+    if len(first) < len(second):
+        first, second = second, first
+    previous_row = list(range(len(second) + 1))
+    for row, first_character in enumerate(first, 1):
+        current_row = [row]
+        for column, second_character in enumerate(second, 1):
+            current_row.append(min(previous_row[column] + 1, current_row[column - 1] + 1,
+                                   previous_row[column - 1] + (first_character != second_character)))
+        previous_row = current_row
+    return previous_row[-1]
+
+
+def closest_form(form, known_forms, max_edit_ratio=0.2):
+    """
+    Function which finds the known normalized form a form is a misspelling of, i.e. COMPANY for COMPANNY.
+    :param form: A normalized form, see normalize_token.
+    :param known_forms: An iterable of normalized forms.
+    :param max_edit_ratio: Largest edit distance allowed, as a share of the length of the longer form. With 0.2, forms
+    of 5 to 9 letters can differ by one edit, so short forms like NAME and DATE are never merged.
+    :return: A (known form, edit distance) tuple for the closest known form within the distance, or None.
+    """
+    candidates = []
+    for known_form in known_forms:
+        max_distance = int(max_edit_ratio * max(len(form), len(known_form)))
+        # The difference of lengths is a lower bound of the distance, which skips most forms without computing it
+        if abs(len(form) - len(known_form)) <= max_distance:
+            distance = edit_distance(form, known_form)
+            if distance <= max_distance:
+                candidates.append((distance, known_form))
+    if not candidates:
+        return None
+    distance, known_form = min(candidates)
+    return known_form, distance
+
+
+def clean_token(token):
+    """
+    :param token: A token, i.e. _NUMBER__.
+    :return: The token with as many underscores after it as before it, i.e. _NUMBER_.
+    """
+    underscores = "_" * min(2, len(token) - len(token.lstrip("_")))
+    return underscores + token.strip("_") + underscores
+
+
+def split_glued_token(token):
+    """
+    Function which splits a span of glued tokens into its tokens, i.e. _NAME__ADDRESS_ into _NAME_ and _ADDRESS_.
+    :param token: A token.
+    :return: A list of tokens, of one token if it is not glued. Every token has the underscores of the first one.
+    """
+    underscores = "_" * min(2, len(token) - len(token.lstrip("_")))
+    return [clean_token(underscores + word + underscores) for word in GLUED_WORDS_REGEX.split(token.strip("_"))]
+
+
+def propose_token_dictionary(counts, token_dictionary, min_count=5, max_edit_ratio=0.2, keep_unseen=True):
+    """
+    Function which builds a new token dictionary from the tokens found in an export. Every token found is put in a
+    group, in this order:
+     - the token is already in the token dictionary: it keeps its group.
+     - the token is already counted by a TokenMatcher of the token dictionary, i.e. _COMPANY___ contains _COMPANY_ and
+       underscores, or _DATE__PRODUCT_ is _DATE_ glued to _PRODUCT_: it is not added.
+     - its normalized form is the one of a token of the dictionary, i.e. _PRODUCTS_ for _PRODUCT_: that group.
+     - its normalized form is a misspelling of the one of a token of the dictionary, i.e. _COMPANNY_: that group.
+     - it is made of glued tokens which all get a group, i.e. _NAME__ADRRESS_: the tokens are added, not the span.
+     - otherwise, if it is found min_count times or more, it starts a new group named after its normalized form.
+    A token is added with as many underscores after it as before it, see clean_token: the TokenMatcher counts _NUMBER_
+    in _NUMBER__ as well.
+    The tokens are handled from the most frequent, so a misspelling joins the group of a new token found more often.
+    :param counts: A TokenCounts instance.
+    :param token_dictionary: The current dictionary of tokens, where the key is the actual token value and the value is
+    the group that the token is part of.
+    :param min_count: Number of occurrences from which a token starts a new group. A new group is a new manual feature.
+    :param max_edit_ratio: See closest_form.
+    :param keep_unseen: Flag. If set to True, the tokens of the dictionary which were not found are kept. Default is
+    True.
+    :return: A tuple of (the proposed token dictionary, a pandas.DataFrame with one row per token found: its counts,
+    normalized form, status, group, the token or form it was matched to and the tokens added for it).
+    """
+    matcher = TokenMatcher(token_dictionary)
+    group_by_form = dict()
+    for token, group in token_dictionary.items():
+        group_by_form.setdefault(normalize_token(token), group)
+    proposed = {token: group for token, group in token_dictionary.items()
+                if keep_unseen or counts.occurrences[token] > 0}
+
+    def match_group(token):
+        # Returns the group of a token which is not in the dictionary, the way it was matched and to what
+        form = normalize_token(token)
+        if form in group_by_form:
+            return group_by_form[form], "normalized", form
+        closest = closest_form(form, group_by_form, max_edit_ratio)
+        if closest is not None:
+            return group_by_form[closest[0]], "fuzzy", closest[0]
+        return None
+
+    rows = []
+    for token, occurrences in sorted(counts.occurrences.items(), key=lambda item: (-item[1], item[0])):
+        row = {"token": token, "occurrences": occurrences, "tickets": counts.tickets[token],
+               "normalized": normalize_token(token), "status": None, "group": None, "matched_to": None,
+               "added": None}
+        rows.append(row)
+        if token in token_dictionary:
+            row["status"], row["group"] = "existing", token_dictionary[token]
+            continue
+        stripped_text, group_counts = matcher.count_and_strip(token)
+        if not re.search(r'[A-Z]', stripped_text):
+            row["status"] = "covered"
+            row["group"] = "+".join(group for group, count in group_counts.items() if count)
+            continue
+
+        match = match_group(token)
+        if match is not None:
+            row["group"], row["status"], row["matched_to"] = match
+            row["added"] = clean_token(token)
+            proposed.setdefault(row["added"], row["group"])
+            continue
+
+        parts = split_glued_token(token)
+        part_groups = [proposed.get(part) or (match_group(part) or (None,))[0] for part in parts]
+        if len(parts) > 1 and all(part_groups):
+            row["status"], row["group"], row["matched_to"] = "glued", "+".join(part_groups), "+".join(parts)
+            row["added"] = "+".join(part for part in parts if part not in proposed)
+            for part, group in zip(parts, part_groups):
+                proposed.setdefault(part, group)
+            continue
+
+        if occurrences >= min_count:
+            row["status"] = "new"
+            row["group"] = row["normalized"].lower() + "_count"
+            group_by_form[row["normalized"]] = row["group"]
+            row["added"] = clean_token(token)
+            proposed.setdefault(row["added"], row["group"])
+        else:
+            row["status"] = "rare"
+    return proposed, pd.DataFrame(rows, columns=["token", "occurrences", "tickets", "normalized", "status", "group",
+                                                 "matched_to", "added"])
+
+
+def diff_token_dictionaries(current, proposed):
+    """
+    :param current: A token dictionary.
+    :param proposed: Another token dictionary, i.e. the output of propose_token_dictionary.
+    :return: A dictionary with the tokens added, removed and moved to another group, and the groups added and
+    removed. A change of the groups changes the manual features, so the model must be retrained with the new
+    dictionary.
+    """
+    return {"added": {token: group for token, group in proposed.items() if token not in current},
+            "removed": {token: group for token, group in current.items() if token not in proposed},
+            "regrouped": {token: {"from": group, "to": proposed[token]} for token, group in current.items()
+                          if token in proposed and proposed[token] != group},
+            "added_groups": sorted(set(proposed.values()) - set(current.values())),
+            "removed_groups": sorted(set(current.values()) - set(proposed.values()))}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count the placeholder tokens of a ticket export, group their "
+                                                 "variants and write a proposed token dictionary with its diff "
+                                                 "against the current one.")
+    parser.add_argument("input", nargs="*", help="Ticket files: json array, jsonl or csv.")
+    parser.add_argument("--format", choices=["json", "jsonl", "csv"], default=None,
+                        help="Format of the input files. Default is guessed from every file.")
+    parser.add_argument("--text-field", default="Description", help="The field containing the ticket text.")
+    parser.add_argument("--counts", nargs="*", default=[],
+                        help="Token counts saved by --save-counts, merged with the counts of the input files.")
+    parser.add_argument("--save-counts", default=None, help="Where to save the merged token counts as json.")
+    parser.add_argument("--token-dictionary", default=os.path.join(DEFAULT_DATA_DIR, "token_dictionary.json"),
+                        help="The current token dictionary.")
+    parser.add_argument("--output", default="proposed_token_dictionary.json",
+                        help="Where to write the proposed token dictionary.")
+    parser.add_argument("--diff", default=None, help="Where to write the diff. Default is the output followed by "
+                                                     ".diff.json.")
+    parser.add_argument("--min-count", type=int, default=5,
+                        help="Number of occurrences from which an unknown token starts a new group.")
+    parser.add_argument("--max-edit-ratio", type=float, default=0.2,
+                        help="Largest edit distance to a known token, as a share of its length.")
+    parser.add_argument("--drop-unseen", action="store_true",
+                        help="Drop the tokens of the current dictionary which were not found.")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Number of tickets counted at once.")
+    parser.add_argument("--jobs", type=int, default=-1, help="Number of processes. -1 to use all the CPUs.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    token_counts = TokenCounts()
+    for counts_path in args.counts:
+        with open(counts_path, "r") as counts_file:
+            token_counts.merge(TokenCounts.from_dict(json.load(counts_file)))
+    for input_path in args.input:
+        token_counts.merge(discover_tokens(input_path, args.format, args.text_field, args.chunk_size, args.jobs))
+    duration = time.perf_counter() - start
+    if args.save_counts:
+        with open(args.save_counts, "w") as counts_file:
+            json.dump(token_counts.to_dict(), counts_file)
+
+    with open(args.token_dictionary, "r") as token_dict_file:
+        current_dictionary = json.load(token_dict_file)
+    proposed_dictionary, token_report = propose_token_dictionary(token_counts, current_dictionary, args.min_count,
+                                                                 args.max_edit_ratio, not args.drop_unseen)
+    dictionary_diff = diff_token_dictionaries(current_dictionary, proposed_dictionary)
+    with open(args.output, "w") as output_file:
+        json.dump(proposed_dictionary, output_file)
+    with open(args.diff or os.path.splitext(args.output)[0] + ".diff.json", "w") as diff_file:
+        json.dump(dictionary_diff, diff_file, indent=1)
+
+    print(token_report.fillna("").to_string(index=False), file=sys.stderr)
+    print(json.dumps({"tickets": token_counts.ticket_total, "tokens": len(token_counts), "seconds": round(duration, 3),
+                      "tickets_per_second": round(token_counts.ticket_total / max(duration, 1e-9)),
+                      "diff": dictionary_diff}, indent=1))
@@ -0,0 +1,117 @@
+import os
+
+from googletrans import Translator
+
+from disk_cache import MISSING, DiskBackedCache, text_key
+from language_detection import get_language_detector
+
+# Default location of the translation cache. It can be moved with the TRANSLATION_CACHE_PATH environment variable.
+DEFAULT_CACHE_PATH = os.environ.get(
+    "TRANSLATION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data", "translation_cache.sqlite"))
+
+
+class GoogleTranslateBackend:
+    """
+    Translation backend which uses a LanguageDetector to detect the language and googletrans to translate into English.
+    Any object with a translate_to_en(text) method can be used as a backend instead, i.e. a local stub in tests.
+    """
+
+    def __init__(self, detector=None):
+        """
+        :param detector: The LanguageDetector to use. Default is the one of get_language_detector.
+        """
+        self.detector = detector
+        self._translator = None
+
+    def translate_to_en(self, text):
+        """
+        Detect the language of a text and translate it if it is not English.
+        :param text: Python text to be processed.
+        :return: The original text if the detected language is English, or if the language is not detected
+        confidently, and the translated text into English otherwise.
+        """
+        detector = self.detector if self.detector is not None else get_language_detector()
+        detected_language, confidence = detector.detect(text)
+        if not detector.should_translate(detected_language, confidence):
+            return text
+        if self._translator is None:
+            self._translator = Translator()
+        return self._translator.translate(text, src=detected_language, dest='en').text
+
+
+class TranslationCache(DiskBackedCache):
+    """
+    Content addressed cache of translations, kept in memory and optionally in a SQLite file shared between runs and
+    processes. Texts that are already English are stored with a None translation, to not keep a second copy of them.
+    """
+
+    TABLE = "translations"
+    VALUE_COLUMN = "translation"
+    VALUE_TYPE = "TEXT"
+
+    def get(self, text):
+        """
+        Look up the translation of a text.
+        :param text: The original text.
+        :return: The cached translation, None if the text is cached as already English, or MISSING if not cached.
+        """
+        return self.get_key(text_key(text))
+
+    def put(self, text, translation):
+        """
+        Store the translation of a text.
+        :param text: The original text.
+        :param translation: The translated text, or None if the text is already English.
+        """
+        self.put_key(text_key(text), translation)
+
+
+class CachedTranslator:
+    """
+    Translator which asks the cache first and only calls the backend for texts it has never seen.
+    """
+
+    def __init__(self, backend=None, cache=None):
+        """
+        :param backend: Object with a translate_to_en(text) method. Default is GoogleTranslateBackend.
+        :param cache: A TranslationCache instance. Default is an in-memory cache.
+        """
+        self.backend = backend if backend is not None else GoogleTranslateBackend()
+        self.cache = cache if cache is not None else TranslationCache()
+
+    def translate_to_en(self, text):
+        """
+        Translate a text into English, using the cached translation when there is one.
+        :param text: Python text to be processed.
+        :return: The original text if it is English, and the translated text into English otherwise.
+        """
+        translation = self.cache.get(text)
+        if translation is MISSING:
+            translation = self.backend.translate_to_en(text)
+            self.cache.put(text, None if translation == text else translation)
+        return text if translation is None else translation
+
+
+_default_translator = None
+
+
+def get_default_translator():
+    """
+    Function which returns the translator used by preprocessing.translate_to_en: the googletrans backend behind a cache
+    persisted in data/translation_cache.sqlite.
+    :return: A CachedTranslator instance.
+    """
+    global _default_translator
+    if _default_translator is None:
+        _default_translator = CachedTranslator(cache=TranslationCache(DEFAULT_CACHE_PATH))
+    return _default_translator
+
+
+def set_default_translator(translator):
+    """
+    Function which replaces the translator used by preprocessing.translate_to_en, i.e. to plug in another backend.
+    :param translator: A CachedTranslator instance, or None to go back to the default one.
+    """
+    global _default_translator
+    _default_translator = translator
@@ -0,0 +1,154 @@
+from unittest import TestCase
+from async_translation import AsyncTranslationClient, GoogleTranslateAsyncBackend, run_coroutine
+from translation import TranslationCache
+import asyncio
+from collections import defaultdict
+from types import SimpleNamespace
+
+
+class FakeTranslationBackend:
+    """
+    In-process fake of a translation backend. Translating tags a text with its destination language, translating back
+    to English removes the tag. Every request takes `latency` seconds and the first `failures` requests fail. The
+    event loop time at which every request starts is recorded per destination language.
+    """
+    def __init__(self, latency=0.01, failures=0):
+        self.latency = latency
+        self.failures = failures
+        self.batches = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.start_times = defaultdict(list)
+
+    async def translate_batch(self, texts, src, dest):
+        self.start_times[dest].append(asyncio.get_running_loop().time())
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.failures > 0:
+                self.failures -= 1
+                raise ConnectionError("Service unavailable")
+            self.batches.append((list(texts), src, dest))
+            if dest == 'en':
+                return [text.split("] ", 1)[-1] + " (from " + src + ")" for text in texts]
+            return ["[" + dest + "] " + text for text in texts]
+        finally:
+            self.in_flight -= 1
+
+
+class StubTranslator:
+    """
+    Local stand-in for googletrans.Translator, which upper-cases a text and counts the requests it receives.
+    """
+    def __init__(self):
+        self.requests = []
+
+    def translate(self, text, src='auto', dest='en'):
+        self.requests.append(text)
+        return SimpleNamespace(text=text.upper())
+
+
+class TestAsyncTranslation(TestCase):
+    def test_back_translate_keeps_order(self):
+        # Given
+        server = FakeTranslationBackend()
+        client = AsyncTranslationClient(server, batch_size=2)
+        texts = ["one", "two", "three"]
+
+        # When
+        back_translated = run_coroutine(client.back_translate(texts, ['de', 'fr']))
+
+        # Then
+        self.assertListEqual([["one (from de)", "two (from de)", "three (from de)"],
+                              ["one (from fr)", "two (from fr)", "three (from fr)"]], back_translated)
+        self.assertEqual(8, len(server.batches))
+        self.assertTrue(all(len(batch[0]) <= 2 for batch in server.batches))
+
+    def test_concurrency_is_bounded(self):
+        # Given
+        server = FakeTranslationBackend(latency=0.02)
+        client = AsyncTranslationClient(server, max_concurrency=3, batch_size=1)
+
+        # When
+        translated = run_coroutine(client.translate([str(x) for x in range(12)], 'en', 'de'))
+
+        # Then
+        self.assertEqual(3, server.max_in_flight)
+        self.assertEqual(0, server.in_flight)
+        self.assertEqual(12, len(server.batches))
+        self.assertEqual("[de] 11", translated[11])
+
+    def test_failed_requests_are_retried(self):
+        # Given
+        server = FakeTranslationBackend(failures=2)
+        client = AsyncTranslationClient(server, backoff=0.001, max_retries=2)
+
+        # When
+        translated = run_coroutine(client.translate(["hello"], 'en', 'ro'))
+
+        # Then
+        self.assertListEqual(["[ro] hello"], translated)
+        self.assertEqual(2, client.retries)
+
+    def test_error_raised_after_last_retry(self):
+        # Given
+        server = FakeTranslationBackend(failures=5)
+        client = AsyncTranslationClient(server, backoff=0.001, max_retries=1)
+
+        # When / Then
+        with self.assertRaises(ConnectionError):
+            run_coroutine(client.translate(["hello"], 'en', 'ro'))
+
+    def test_requests_are_rate_limited_per_language(self):
+        # Given
+        server = FakeTranslationBackend(latency=0)
+        client = AsyncTranslationClient(server, batch_size=1, requests_per_second=50)
+
+        # When
+        run_coroutine(client.translate_many([(["a", "b", "c", "d", "e"], 'en', 'de'),
+                                             (["a", "b", "c", "d", "e"], 'en', 'fr')]))
+
+        # Then
+        # The n-th request of a language starts at least n intervals of 20ms after its first one, and the languages
+        # do not wait for each other: every request of one language starts before the next one of the other
+        for language in ['de', 'fr']:
+            start_times = server.start_times[language]
+            self.assertEqual(5, len(start_times))
+            for position, start_time in enumerate(start_times):
+                self.assertGreaterEqual(start_time - start_times[0], position * 0.02 - 0.001)
+        for position in range(4):
+            self.assertLess(server.start_times['de'][position], server.start_times['fr'][position + 1])
+            self.assertLess(server.start_times['fr'][position], server.start_times['de'][position + 1])
+
+    def test_translate_to_en_uses_cache(self):
+        # Given
+        server = FakeTranslationBackend()
+        client = AsyncTranslationClient(server)
+        cache = TranslationCache()
+        texts = ["Hallo, ich möchte wissen, wo meine Bestellung ist", "Where is my order?"]
+
+        # When
+        first = run_coroutine(client.translate_to_en(texts, cache))
+        second = run_coroutine(client.translate_to_en(texts, cache))
+
+        # Then
+        self.assertListEqual(first, second)
+        self.assertEqual("Where is my order?", first[1])
+        self.assertEqual(1, len(server.batches))
+        self.assertEqual(2, cache.stats()["hits"])
+
+    def test_googletrans_backend_joins_a_batch_into_one_request(self):
+        # Given
+        translator = StubTranslator()
+        backend = GoogleTranslateAsyncBackend(translator, max_request_chars=30)
+
+        # When
+        translated = run_coroutine(backend.translate_batch(["hallo", "wo ist", "meine bestellung"], 'de', 'en'))
+        split_translated = run_coroutine(backend.translate_batch(["a ||| b", "c"], 'de', 'en'))
+
+        # Then
+        self.assertListEqual(["HALLO", "WO IST", "MEINE BESTELLUNG"], translated)
+        self.assertListEqual(["A ||| B", "C"], split_translated)
+        self.assertCountEqual(["hallo\n|||\nwo ist", "meine bestellung", "a ||| b\n|||\nc", "a ||| b", "c"],
+                              translator.requests)
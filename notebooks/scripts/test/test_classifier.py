@@ -0,0 +1,52 @@
+from unittest import TestCase
+from classifier import TicketClassifier, append_dense_columns
+from preprocessing import preprocess_text_series
+from scipy.sparse import csr_matrix, hstack
+import pandas as pd
+import numpy as np
+import warnings
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+TEXTS = ["Where is my order? I ordered 3 weeks ago __ORDER_NUMBER__ and still nothing",
+         "Hi. I went to your site and I have seen that my command _TRACKING_NUMBER_ is not coming. "
+         "Contact me at aaa.23@yahoo.com please",
+         "hi i want to register a coupon",
+         "Hi regarding my order __ORDER_NUMBER__ I just wanted to know if I can change __PRODUCT_NAME__ with "
+         "__PRODUCT_NAME__"]
+
+
+class TestClassifier(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            cls.classifier = TicketClassifier.from_directory(DATA_DIR)
+
+    def test_append_dense_columns(self):
+        # Given
+        sparse_matrix = csr_matrix(np.array([[0, 1.5, 0], [0, 0, 0], [2, 0, 3]]))
+        dense_matrix = np.array([[0.5, 0], [1, 2], [0, 0.25]])
+
+        # When
+        appended = append_dense_columns(sparse_matrix, dense_matrix)
+
+        # Then
+        np.testing.assert_array_equal(hstack((sparse_matrix, csr_matrix(dense_matrix))).toarray(), appended.toarray())
+
+    def test_predict_proba_matches_hand_wired_pipeline(self):
+        # Given
+        X_test = pd.Series(TEXTS)
+
+        # When
+        probabilities = self.classifier.predict_proba(TEXTS, translate=False)
+
+        # Then
+        X_test = preprocess_text_series(X_test, self.classifier.token_matcher.token_dictionary, True)
+        tfidf_text = self.classifier.tfidf_vec.transform(X_test['text'])
+        m_feats = X_test.drop(columns='text')
+        m_feats = pd.DataFrame(self.classifier.scaler.transform(m_feats), index=m_feats.index.values)
+        expected = self.classifier.model.predict_proba(hstack((tfidf_text, csr_matrix(m_feats))))
+        np.testing.assert_allclose(expected, probabilities)
+        self.assertEqual((4, 2), probabilities.shape)
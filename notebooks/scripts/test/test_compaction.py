@@ -0,0 +1,78 @@
+from unittest import TestCase
+from compaction import compact_components, evaluate_components, feature_importance, prune_components
+from model_bundle import default_bundle_dir, read_components
+from preprocessing import preprocess_text_batch
+import numpy as np
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+TEXTS = ["Where is my order? I ordered 3 weeks ago __ORDER_NUMBER__ and still nothing",
+         "hi i want to register a coupon",
+         "Hi regarding my order __ORDER_NUMBER__ I just wanted to know if I can change __PRODUCT_NAME__ with "
+         "__PRODUCT_NAME__",
+         "zzzzzz"]
+
+# A model with 4 terms and 1 manual feature, where "order" and "rare" are positive and "refund" negative
+COMPONENTS = {"vocabulary": {"coupon": 0, "order": 1, "refund": 2, "rare": 3},
+              "idf": np.array([2.0, 1.5, 2.0, 4.0]),
+              "coefficients": np.array([-0.1, 3.0, -2.0, 0.5, 0.2]),
+              "intercept": -1.0, "scaler_scale": np.array([1.0]), "scaler_min": np.array([0.0]),
+              "prob_a": -2.0, "prob_b": 0.0, "token_dictionary": {}}
+HOLDOUT = (["order", "order coupon", "refund", "refund coupon", "coupon rare", "order rare"],
+           np.zeros((6, 1)), np.array([1, 1, 0, 0, 1, 0]))
+
+
+class TestCompaction(TestCase):
+    def test_prune_components(self):
+        # When
+        pruned = prune_components(COMPONENTS, 2)
+
+        # Then
+        np.testing.assert_allclose(np.abs([-0.2, 4.5, -4.0, 2.0]) * np.exp([-1.0, -0.5, -1.0, -3.0]),
+                                   feature_importance(COMPONENTS))
+        self.assertDictEqual({"order": 0, "refund": 1}, pruned["vocabulary"])
+        np.testing.assert_array_equal([1.5, 2.0], pruned["idf"])
+        np.testing.assert_array_equal([3.0, -2.0, 0.2], pruned["coefficients"])
+        self.assertEqual(4, len(COMPONENTS["idf"]))
+
+    def test_compact_within_average_precision_budget(self):
+        # When
+        compacted, report = compact_components(COMPONENTS, max_average_precision_loss=0.0, holdout=HOLDOUT, steps=4)
+
+        # Then
+        self.assertListEqual([1, 2, 3, 4], report["term_count"].tolist())
+        self.assertDictEqual({"order": 0, "rare": 1, "refund": 2}, compacted["vocabulary"])
+        self.assertEqual([3], report.loc[report["selected"], "term_count"].tolist())
+        self.assertLess(report["average_precision_delta"].iloc[1], 0)
+        self.assertEqual(0, report["average_precision_delta"].iloc[-1])
+        self.assertEqual(evaluate_components(compacted, *HOLDOUT)["average_precision"],
+                         report.loc[report["selected"], "average_precision"].iloc[0])
+        with self.assertRaises(ValueError):
+            compact_components(COMPONENTS, max_average_precision_loss=0.01)
+
+    def test_compact_keeps_max_terms_when_the_budget_is_not_met(self):
+        # When
+        compacted, report = compact_components(COMPONENTS, max_terms=2, max_average_precision_loss=-1.0,
+                                               holdout=HOLDOUT, steps=4)
+
+        # Then
+        self.assertEqual(2, len(compacted["idf"]))
+        self.assertListEqual([1, 2], report["term_count"].tolist())
+        self.assertFalse(report["within_budget"].any())
+        self.assertListEqual([2], report.loc[report["selected"], "term_count"].tolist())
+
+    def test_pruning_nothing_keeps_the_scores(self):
+        # Given
+        components = read_components(default_bundle_dir(data_dir=DATA_DIR))
+        cleaned_texts, manual_features = preprocess_text_batch(TEXTS, components["token_dictionary"],
+                                                               dtype=np.float64)
+
+        # When
+        compacted, report = compact_components(components)
+
+        # Then
+        self.assertTrue(report.empty)
+        self.assertEqual(len(components["idf"]), len(compacted["idf"]))
+        self.assertDictEqual(evaluate_components(components, cleaned_texts, manual_features, [1, 0, 1, 0]),
+                             evaluate_components(compacted, cleaned_texts, manual_features, [1, 0, 1, 0]))
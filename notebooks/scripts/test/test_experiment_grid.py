@@ -0,0 +1,174 @@
+from unittest import TestCase
+from experiment_grid import build_feature_matrix, load_matrix, preprocess_cached, read_results, run_grid, save_matrix, \
+    estimator_hash, NO_SAMPLING
+from rebalancing import NearDuplicateWeighting
+from imblearn.over_sampling import RandomOverSampler
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.model_selection import RepeatedStratifiedKFold, cross_validate
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.preprocessing import MinMaxScaler
+from scipy.sparse import csr_matrix, hstack, random as sparse_random
+import numpy as np
+import tempfile
+import json
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+TEXTS = ["Where is my order? I ordered 3 weeks ago __ORDER_NUMBER__ and still nothing",
+         "hi i want to register a coupon",
+         "Hi regarding my order __ORDER_NUMBER__ I just wanted to know if I can change __PRODUCT_NAME__ with "
+         "__PRODUCT_NAME__"]
+
+fit_count = 0
+
+
+class CountingNB(MultinomialNB):
+    def fit(self, X, y, sample_weight=None):
+        global fit_count
+        fit_count += 1
+        return super().fit(X, y, sample_weight)
+
+
+class TestExperimentGrid(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmp_dir.name
+        self.results_path = os.path.join(self.cache_dir, "results.csv")
+        random_state = np.random.RandomState(0)
+        self.matrix = sparse_random(60, 30, density=0.3, format="csr", random_state=random_state)
+        self.labels = np.array([1] * 15 + [0] * 45, dtype=np.int8)
+        self.cv = RepeatedStratifiedKFold(n_splits=3, n_repeats=2, random_state=0)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_preprocess_cached(self):
+        # Given
+        with open(os.path.join(DATA_DIR, "token_dictionary.json"), "r") as file:
+            token_dictionary = json.load(file)
+        texts, manual_features = preprocess_cached(TEXTS, token_dictionary, self.cache_dir)
+
+        # When
+        cached_texts, cached_manual_features = preprocess_cached(TEXTS, token_dictionary, self.cache_dir)
+
+        # Then
+        self.assertEqual(1, len(os.listdir(os.path.join(self.cache_dir, "preprocessed"))))
+        self.assertListEqual(texts, cached_texts)
+        np.testing.assert_array_equal(manual_features, cached_manual_features)
+
+    def test_build_feature_matrix_matches_hstack(self):
+        # Given
+        cleaned_texts = ["order still noth", "regist coupon", "order chang product"]
+        manual_features = np.array([[70, 14, 4.1, 1], [30, 6, 4.2, 0], [100, 20, 4.5, 0]])
+
+        # When
+        matrix = build_feature_matrix(cleaned_texts, manual_features, True)
+
+        # Then
+        expected = hstack((TfidfVectorizer().fit_transform(cleaned_texts),
+                           csr_matrix(MinMaxScaler().fit_transform(manual_features))))
+        np.testing.assert_allclose(expected.toarray(), matrix.toarray())
+
+    def test_save_and_load_matrix(self):
+        # Given
+        directory = os.path.join(self.cache_dir, "matrix")
+
+        # When
+        save_matrix(directory, self.matrix, self.labels)
+        matrix, labels = load_matrix(directory)
+
+        # Then
+        # The arrays are read-only views of the memory-mapped files, not copies
+        self.assertFalse(matrix.data.flags.writeable)
+        np.testing.assert_array_equal(self.matrix.toarray(), matrix.toarray())
+        np.testing.assert_array_equal(self.labels, labels)
+
+    def test_run_grid_matches_cross_validate(self):
+        # Given
+        sampler = RandomOverSampler(random_state=42)
+        resampled_matrix, resampled_labels = sampler.fit_resample(self.matrix, self.labels)
+
+        # When
+        results_df = run_grid(self.matrix, self.labels, {NO_SAMPLING: None, "oversampling_random": sampler},
+                              {"Naive Bayes": MultinomialNB()}, self.results_path, cv=self.cv, n_jobs=1,
+                              cache_dir=self.cache_dir)
+
+        # Then
+        self.assertListEqual([NO_SAMPLING, "oversampling_random"], results_df["sampling_method"].to_list())
+        for row, (matrix, labels) in enumerate([(self.matrix, self.labels), (resampled_matrix, resampled_labels)]):
+            expected = cross_validate(MultinomialNB(), matrix, labels, scoring=["average_precision", "f1"],
+                                      return_train_score=True, cv=self.cv)
+            self.assertAlmostEqual(expected["test_average_precision"].mean(),
+                                   results_df.loc[row, "test_average_precision"])
+            self.assertAlmostEqual(expected["train_f1"].mean(), results_df.loc[row, "train_f1"])
+
+    def test_run_grid_resumes_from_partial_results(self):
+        # Given
+        global fit_count
+        models = {"Naive Bayes": CountingNB()}
+        expected_df = run_grid(self.matrix, self.labels, {NO_SAMPLING: None}, models, self.results_path, cv=self.cv,
+                               n_jobs=1, cache_dir=self.cache_dir)
+        with open(self.results_path, "r") as results_file:
+            lines = results_file.readlines()
+        with open(self.results_path, "w") as results_file:
+            results_file.writelines(lines[:3])
+        fit_count = 0
+
+        # When
+        results_df = run_grid(self.matrix, self.labels, {NO_SAMPLING: None}, models, self.results_path, cv=self.cv,
+                              n_jobs=1, cache_dir=self.cache_dir)
+
+        # Then
+        self.assertEqual(4, fit_count)
+        self.assertEqual(6, len(read_results(self.results_path)))
+        np.testing.assert_allclose(expected_df["test_average_precision"], results_df["test_average_precision"])
+
+    def test_run_grid_does_not_resume_other_parameters(self):
+        # Given
+        global fit_count
+        run_grid(self.matrix, self.labels, {NO_SAMPLING: None}, {"Naive Bayes": CountingNB()}, self.results_path,
+                 cv=self.cv, n_jobs=1, cache_dir=self.cache_dir)
+        fit_count = 0
+
+        # When
+        results_df = run_grid(self.matrix, self.labels, {NO_SAMPLING: None}, {"Naive Bayes": CountingNB(alpha=0.5)},
+                              self.results_path, cv=self.cv, n_jobs=1, cache_dir=self.cache_dir)
+
+        # Then
+        self.assertEqual(6, fit_count)
+        self.assertEqual(12, len(read_results(self.results_path)))
+        self.assertEqual(1, len(results_df))
+        with self.assertRaises(ValueError):
+            run_grid(self.matrix, self.labels, {NO_SAMPLING: None}, {"Naive Bayes": CountingNB()}, self.results_path,
+                     cv=self.cv, scoring=["recall"], n_jobs=1, cache_dir=self.cache_dir)
+
+    def test_run_grid_in_process_pool(self):
+        # Given
+        samplers = {NO_SAMPLING: None, "oversampling_random": RandomOverSampler(random_state=42)}
+        models = {"Naive Bayes": MultinomialNB()}
+        expected_df = run_grid(self.matrix, self.labels, samplers, models,
+                               os.path.join(self.cache_dir, "serial.csv"), cv=self.cv, n_jobs=1,
+                               cache_dir=self.cache_dir)
+
+        # When
+        results_df = run_grid(self.matrix, self.labels, samplers, models, self.results_path, cv=self.cv, n_jobs=2,
+                              cache_dir=os.path.join(self.cache_dir, "pool"))
+
+        # Then
+        self.assertListEqual(expected_df["sampling_method"].to_list(), results_df["sampling_method"].to_list())
+        np.testing.assert_allclose(expected_df["test_f1"], results_df["test_f1"])
+
+    def test_estimator_hash_sees_every_parameter(self):
+        # Given
+        groups = np.arange(5000)
+        other_groups = groups.copy()
+        other_groups[2500] = 0
+
+        # When / Then
+        self.assertEqual(repr(NearDuplicateWeighting(groups=groups)), repr(NearDuplicateWeighting(groups=other_groups)))
+        self.assertNotEqual(estimator_hash(NearDuplicateWeighting(groups=groups)),
+                            estimator_hash(NearDuplicateWeighting(groups=other_groups)))
+        self.assertEqual(estimator_hash(NearDuplicateWeighting(groups=groups)),
+                         estimator_hash(NearDuplicateWeighting(groups=groups.copy())))
+        self.assertNotEqual(estimator_hash(MultinomialNB()), estimator_hash(MultinomialNB(alpha=0.5)))
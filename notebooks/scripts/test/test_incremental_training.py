@@ -0,0 +1,85 @@
+from unittest import TestCase
+from incremental_training import IncrementalClassifier, parse_label, read_current_version, update_from_file
+import numpy as np
+import pandas as pd
+import tempfile
+import json
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+
+class TestIncrementalTraining(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        tickets_df = pd.read_csv(os.path.join(DATA_DIR, "labeled_tickets.csv"), index_col=0).head(300)
+        cls.texts = tickets_df["Description"].to_list()
+        cls.labels = tickets_df["is_about_order_status"].to_list()
+        with open(os.path.join(DATA_DIR, "token_dictionary.json"), "r") as token_dict_file:
+            cls.token_dictionary = json.load(token_dict_file)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.model_dir = os.path.join(self.tmp_dir.name, "incremental")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_running_statistics_match_a_single_batch(self):
+        # Given
+        single = IncrementalClassifier(self.token_dictionary, n_features=1 << 12)
+        batched = IncrementalClassifier(self.token_dictionary, n_features=1 << 12)
+
+        # When
+        single.partial_fit(self.texts, self.labels, translate=False)
+        for start in range(0, len(self.texts), 70):
+            batched.partial_fit(self.texts[start:start + 70], self.labels[start:start + 70], translate=False)
+
+        # Then
+        self.assertEqual(300, batched.document_count)
+        self.assertEqual(5, batched.updates)
+        np.testing.assert_array_equal(single.document_frequency, batched.document_frequency)
+        np.testing.assert_array_equal(single.manual_features_min, batched.manual_features_min)
+        np.testing.assert_array_equal(single.manual_features_max, batched.manual_features_max)
+        np.testing.assert_array_equal([300 - sum(self.labels), sum(self.labels)], batched.class_counts)
+
+    def test_save_and_load(self):
+        # Given
+        classifier = IncrementalClassifier(self.token_dictionary, n_features=1 << 12)
+        classifier.partial_fit(self.texts[:150], self.labels[:150], translate=False)
+        first_version = classifier.save(self.model_dir)
+        classifier.partial_fit(self.texts[150:], self.labels[150:], translate=False)
+        second_version = classifier.save(self.model_dir)
+        classifier.partial_fit(self.texts[:10], self.labels[:10], translate=False)
+
+        # When
+        third_version = classifier.save(self.model_dir)
+        loaded = IncrementalClassifier.load(self.model_dir)
+
+        # Then
+        self.assertEqual(third_version, read_current_version(self.model_dir))
+        self.assertTrue(os.path.isdir(os.path.join(self.model_dir, second_version)))
+        self.assertFalse(os.path.isdir(os.path.join(self.model_dir, first_version)))
+        self.assertEqual(3, loaded.updates)
+        np.testing.assert_allclose(classifier.predict_proba(self.texts[:20], translate=False),
+                                   loaded.predict_proba(self.texts[:20], translate=False))
+
+    def test_update_from_file(self):
+        # Given
+        input_path = os.path.join(self.tmp_dir.name, "new_tickets.jsonl")
+        with open(input_path, "w") as input_file:
+            for text, label in zip(self.texts, self.labels):
+                input_file.write(json.dumps({"Description": text, "is_about_order_status": bool(label)}) + "\n")
+
+        # When
+        update_from_file(input_path, self.model_dir, self.token_dictionary, batch_size=100, translate=False, log=None)
+        classifier = update_from_file(input_path, self.model_dir, batch_size=100, translate=False, log=None)
+
+        # Then
+        self.assertEqual(6, classifier.updates)
+        self.assertEqual(600, classifier.document_count)
+        self.assertEqual((3, 2), classifier.predict_proba(self.texts[:3], translate=False).shape)
+
+    def test_parse_label(self):
+        # When / Then
+        self.assertListEqual([1, 0, 1, 0, 1], [parse_label(value) for value in [1, "0", True, "False", "1.0"]])
@@ -0,0 +1,76 @@
+from unittest import TestCase
+from labeling import TagIndex, parse_tags
+import numpy as np
+import pandas as pd
+import tempfile
+import json
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+RECORDS = [{"id": 10, "Description": "Where is my order?", "tags": ["where-is-my-order", "ticket"]},
+           {"id": 11, "Description": "Wrong size", "tags": ["exchange"]},
+           {"id": 12, "Description": None, "tags": []},
+           {"id": 13, "Description": "Refund please", "tags": ["ticket", "ticket", "refund"]}]
+
+
+class TestLabeling(TestCase):
+    def test_from_records(self):
+        # When
+        tag_index = TagIndex.from_records(RECORDS)
+
+        # Then
+        self.assertListEqual(["where-is-my-order", "ticket", "exchange", "refund"], tag_index.tags)
+        self.assertEqual("csr", tag_index.matrix.format)
+        np.testing.assert_array_equal([[1, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 0], [0, 1, 0, 1]],
+                                      tag_index.matrix.toarray())
+        np.testing.assert_array_equal([10, 11, 12, 13], tag_index.ids)
+        self.assertListEqual(["Where is my order?", "Wrong size", "", "Refund please"], tag_index.texts)
+        pd.testing.assert_series_equal(pd.Series([1, 2, 1, 1], index=tag_index.tags), tag_index.tag_counts(),
+                                       check_dtype=False)
+
+    def test_queries_and_labels(self):
+        # Given
+        tag_index = TagIndex.from_records(RECORDS)
+
+        # When / Then
+        np.testing.assert_array_equal([True, False, False, True], tag_index.has_any(["ticket", "unknown-tag"]))
+        np.testing.assert_array_equal([2], tag_index.rows_with_none(["ticket", "exchange"]))
+        np.testing.assert_array_equal([0, 3], tag_index.rows_with_any("ticket"))
+        np.testing.assert_array_equal([2, 0, 0, 2], tag_index.matching_counts(["ticket", "where-is-my-order",
+                                                                               "refund"]))
+        np.testing.assert_array_equal([1, 0, 5, 0], tag_index.label([(["ticket"], 1), (["refund"], 0)],
+                                                                    labels=[0, 0, 5, 0]))
+
+    def test_from_file_matches_dense_columns(self):
+        # Given
+        tickets_df = pd.read_json(os.path.join(DATA_DIR, "technical_test_data.json"), orient="records")
+
+        # When
+        tag_index = TagIndex.from_file(os.path.join(DATA_DIR, "technical_test_data.json"))
+
+        # Then
+        np.testing.assert_array_equal(tickets_df["id"].to_numpy(), tag_index.ids)
+        for tag in tag_index.tags:
+            expected = tickets_df["tags"].apply(lambda tags: tag in tags).to_numpy()
+            np.testing.assert_array_equal(expected, tag_index.has_any(tag))
+
+    def test_from_csv_file(self):
+        # Given
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "tickets.csv")
+            pd.DataFrame({"id": [1, 2], "Description": ["a", "b"], "tags": [json.dumps(["x", "y"]), "[]"]}).to_csv(
+                path, index=False)
+
+            # When
+            tag_index = TagIndex.from_file(path)
+
+        # Then
+        self.assertListEqual(["x", "y"], tag_index.tags)
+        np.testing.assert_array_equal([[1, 1], [0, 0]], tag_index.matrix.toarray())
+
+    def test_parse_tags(self):
+        # When / Then
+        self.assertListEqual([], parse_tags(None))
+        self.assertListEqual(["a", "b"], parse_tags("['a', 'b', 'a']"))
+        self.assertListEqual(["a", "b"], parse_tags("a, b"))
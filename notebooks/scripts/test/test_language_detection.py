@@ -0,0 +1,91 @@
+from unittest import TestCase
+from language_detection import LanguageDetector
+from async_translation import AsyncTranslationClient, run_coroutine
+from translation import TranslationCache
+
+
+class RecordingBackend:
+    """
+    Local translation backend which records the texts it is asked to translate.
+    """
+    def __init__(self):
+        self.translated = []
+
+    async def translate_batch(self, texts, src, dest):
+        self.translated.extend(texts)
+        return ["[" + src + "] " + text for text in texts]
+
+
+class TestLanguageDetection(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.detector = LanguageDetector()
+
+    def test_english_shortcut(self):
+        # Given
+        detector = LanguageDetector()
+
+        # When
+        language, confidence = detector.detect("Where is my order __ORDER_NUMBER__? I have been waiting since _DATE_")
+
+        # Then
+        self.assertEqual(("en", 1.0), (language, confidence))
+        self.assertEqual(1, detector.shortcut_count)
+        self.assertEqual(0, detector.detector_count)
+
+    def test_token_only_text_is_not_detected(self):
+        # When / Then
+        self.assertEqual((None, 0.0), self.detector.detect("__NAME__ - __EMAIL__"))
+        self.assertEqual((None, 0.0), self.detector.detect(""))
+        self.assertFalse(self.detector.should_translate(*self.detector.detect("__NAME__ - __EMAIL__")))
+
+    def test_detection_is_deterministic(self):
+        # Given
+        text = "Hallo, ich möchte wissen, wo meine Bestellung ist"
+
+        # When
+        results = [LanguageDetector().detect(text) for _ in range(3)]
+
+        # Then
+        self.assertEqual("de", results[0][0])
+        self.assertGreater(results[0][1], 0.9)
+        self.assertListEqual(results[:1] * 3, results)
+        self.assertTrue(self.detector.should_translate(*results[0]))
+
+    def test_low_confidence_is_not_translated(self):
+        # Given
+        detector = LanguageDetector(min_confidence=1.1)
+
+        # When
+        language, confidence = detector.detect("Bonjour, je voudrais savoir où est ma commande")
+
+        # Then
+        self.assertEqual("fr", language)
+        self.assertFalse(detector.should_translate(language, confidence))
+
+    def test_detect_each_detects_a_text_once(self):
+        # Given
+        detector = LanguageDetector()
+        texts = ["Wo ist meine Bestellung bitte", "Where is my order please"] * 3
+
+        # When
+        results = detector.detect_each(texts)
+
+        # Then
+        self.assertListEqual([detector.detect(text) for text in texts[:2]] * 3, results)
+        self.assertEqual(2 + 2, detector.shortcut_count + detector.detector_count)
+
+    def test_client_only_translates_confident_foreign_texts(self):
+        # Given
+        backend = RecordingBackend()
+        client = AsyncTranslationClient(backend, detector=self.detector)
+        cache = TranslationCache()
+        texts = ["Hallo, ich möchte wissen, wo meine Bestellung ist", "Where is my order?", "__NAME__ - __EMAIL__"]
+
+        # When
+        translated = run_coroutine(client.translate_to_en(texts, cache))
+
+        # Then
+        self.assertListEqual(["[de] " + texts[0], texts[1], texts[2]], translated)
+        self.assertListEqual(texts[:1], backend.translated)
+        self.assertIsNone(cache.get(texts[2]))
@@ -0,0 +1,101 @@
+from unittest import TestCase
+from classifier import TicketClassifier
+from linear_scorer import LinearScorer, SortedVocabulary, couple_binary_probabilities, sigmoid_predict
+from preprocessing import preprocess_text_batch
+import numpy as np
+import warnings
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+TEXTS = ["Where is my order? I ordered 3 weeks ago __ORDER_NUMBER__ and still nothing",
+         "Hi. I went to your site and I have seen that my command _TRACKING_NUMBER_ is not coming. "
+         "Contact me at aaa.23@yahoo.com please",
+         "hi i want to register a coupon",
+         "Hi regarding my order __ORDER_NUMBER__ I just wanted to know if I can change __PRODUCT_NAME__ with "
+         "__PRODUCT_NAME__",
+         "zzzzzz"]
+
+
+class TestLinearScorer(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            cls.classifier = TicketClassifier.from_directory(DATA_DIR)
+        cls.scorer = LinearScorer.from_classifier(cls.classifier)
+
+    def test_predict_proba_matches_svc(self):
+        # Given
+        cleaned_texts, manual_features = preprocess_text_batch(TEXTS, self.classifier.token_matcher, dtype=np.float64)
+
+        # When
+        probabilities = self.scorer.predict_proba(TEXTS, translate=False)
+
+        # Then
+        expected = self.classifier.model.predict_proba(
+            self.classifier.transform_preprocessed(cleaned_texts, manual_features))
+        np.testing.assert_allclose(expected, probabilities, atol=1e-9)
+
+    def test_decision_function_matches_svc(self):
+        # Given
+        cleaned_texts, manual_features = preprocess_text_batch(TEXTS, self.classifier.token_matcher, dtype=np.float64)
+
+        # When
+        decision_values = self.scorer.decision_function(cleaned_texts, manual_features)
+
+        # Then
+        expected = self.classifier.model.decision_function(
+            self.classifier.transform_preprocessed(cleaned_texts, manual_features))
+        np.testing.assert_allclose(expected, decision_values, atol=1e-9)
+
+    def test_sigmoid_predict_does_not_overflow(self):
+        # Given
+        decision_values = np.array([-1e4, 0, 1e4])
+
+        # When
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            probabilities = sigmoid_predict(decision_values, -1.0, 0.0)
+
+        # Then
+        np.testing.assert_allclose([0, 0.5, 1], probabilities)
+
+    def test_couple_binary_probabilities_stay_close_to_sigmoid(self):
+        # Given
+        pairwise_probabilities = np.linspace(0, 1, 101)
+
+        # When
+        probabilities = couple_binary_probabilities(pairwise_probabilities)
+
+        # Then
+        np.testing.assert_allclose(1, probabilities.sum(axis=1))
+        np.testing.assert_allclose(pairwise_probabilities, probabilities[:, 0], atol=0.005)
+
+    def test_sorted_vocabulary_lookup(self):
+        # Given
+        vocabulary = SortedVocabulary.from_dict({"ab": 0, "order": 1, "ordered": 2, "été": 3})
+
+        # When
+        columns = vocabulary.lookup(["order", "zz", "été", "ordered", "orderedtoday", "a", "ab"])
+
+        # Then
+        np.testing.assert_array_equal([1, -1, 3, 2, -1, -1, 0], columns)
+        self.assertEqual(4, len(vocabulary))
+        self.assertListEqual(["ab", "order", "ordered", "été"], list(vocabulary))
+        self.assertIsNone(vocabulary.get("orde"))
+        self.assertIn("ordered", vocabulary)
+        with self.assertRaises(ValueError):
+            SortedVocabulary(np.array([b"b", b"a"]))
+
+    def test_sorted_vocabulary_counts_the_same_terms(self):
+        # Given
+        cleaned_texts, _ = preprocess_text_batch(TEXTS, self.classifier.token_matcher)
+        sorted_scorer = LinearScorer.from_classifier(self.classifier)
+        sorted_scorer.vocabulary = SortedVocabulary.from_dict(sorted_scorer.vocabulary)
+
+        # When
+        counts = sorted_scorer.count_terms(cleaned_texts)
+
+        # Then
+        self.assertEqual(0, (counts != self.scorer.count_terms(cleaned_texts)).nnz)
@@ -0,0 +1,94 @@
+from unittest import TestCase
+from classifier import TicketClassifier
+from linear_scorer import SortedVocabulary
+from model_bundle import default_bundle_dir, load_bundle, read_manifest, save_bundle, verify_bundle
+import numpy as np
+import tempfile
+import warnings
+import json
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+TEXTS = ["Where is my order? I ordered 3 weeks ago __ORDER_NUMBER__ and still nothing",
+         "hi i want to register a coupon",
+         "Hi regarding my order __ORDER_NUMBER__ I just wanted to know if I can change __PRODUCT_NAME__ with "
+         "__PRODUCT_NAME__"]
+
+
+class TestModelBundle(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            cls.classifier = TicketClassifier.from_directory(DATA_DIR)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.bundle_dir = os.path.join(self.tmp_dir.name, "bundle")
+        self.bundle_hash = save_bundle(self.classifier, self.bundle_dir)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_load_bundle_matches_classifier(self):
+        # Given
+        expected = self.classifier.predict_proba(TEXTS, translate=False)
+
+        # When
+        scorer = load_bundle(self.bundle_dir)
+
+        # Then
+        np.testing.assert_allclose(expected, scorer.predict_proba(TEXTS, translate=False), atol=1e-9)
+        self.assertEqual(self.bundle_hash, scorer.version)
+        self.assertIsInstance(scorer.idf, np.memmap)
+        self.assertIsInstance(scorer.term_weights, np.memmap)
+        self.assertIsInstance(scorer.manual_weights, np.memmap)
+
+    def test_float32_bundle_with_sorted_vocabulary(self):
+        # Given
+        expected = self.classifier.predict_proba(TEXTS, translate=False)
+        float32_dir = os.path.join(self.tmp_dir.name, "bundle_float32")
+        save_bundle(self.classifier, float32_dir, dtype=np.float32)
+
+        # When
+        scorer = load_bundle(float32_dir, sorted_vocabulary=True)
+
+        # Then
+        np.testing.assert_allclose(expected, scorer.predict_proba(TEXTS, translate=False), atol=1e-5)
+        self.assertIsInstance(scorer.vocabulary, SortedVocabulary)
+        self.assertIsInstance(scorer.vocabulary.terms, np.memmap)
+        self.assertEqual(np.float32, scorer.idf.dtype)
+        self.assertLess(os.path.getsize(os.path.join(float32_dir, "coefficients.npy")),
+                        os.path.getsize(os.path.join(self.bundle_dir, "coefficients.npy")))
+
+    def test_saved_bundle_is_up_to_date(self):
+        # When
+        manifest = read_manifest(default_bundle_dir(data_dir=DATA_DIR))
+
+        # Then
+        self.assertEqual(self.bundle_hash, manifest["hash"])
+        self.assertEqual([], verify_bundle(default_bundle_dir(data_dir=DATA_DIR)))
+
+    def test_verify_bundle_finds_modified_files(self):
+        # Given
+        np.save(os.path.join(self.bundle_dir, "idf.npy"), np.zeros(3))
+
+        # When
+        modified_files = verify_bundle(self.bundle_dir)
+
+        # Then
+        self.assertEqual(["idf.npy"], modified_files)
+
+    def test_load_bundle_rejects_other_format_versions(self):
+        # Given
+        manifest_path = os.path.join(self.bundle_dir, "manifest.json")
+        with open(manifest_path, "r") as manifest_file:
+            manifest = json.load(manifest_file)
+        manifest["format_version"] += 1
+        with open(manifest_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+
+        # When / Then
+        with self.assertRaises(ValueError):
+            load_bundle(self.bundle_dir)
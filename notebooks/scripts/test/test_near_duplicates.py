@@ -0,0 +1,144 @@
+from unittest import TestCase
+from near_duplicates import NearDuplicateIndex, deduplicate, duplicate_weights, near_duplicate_groups, shingles
+from result_cache import CachedScorer, ResultCache
+from preprocessing import TokenMatcher, preprocess_text_batch
+import numpy as np
+import tempfile
+import json
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+ORDER_TEXT = "hello want know order ship yet order number placehold thank much wait long time"
+ORDER_TEXT_VARIANT = ORDER_TEXT + " best"
+REFUND_TEXT = "pleas refund item broken arriv want money back today"
+
+
+class StubScorer:
+    """
+    Local scorer which gives every text a probability of the length of its cleaned text divided by 1000, and counts
+    the texts it scores.
+    """
+    def __init__(self, version="v1"):
+        self.version = version
+        with open(os.path.join(DATA_DIR, "token_dictionary.json"), "r") as token_dict_file:
+            self.token_matcher = TokenMatcher(json.load(token_dict_file))
+        self.scored_texts = []
+        self.raw_texts = []
+
+    def predict_proba(self, texts, translate=True):
+        self.raw_texts.extend(texts)
+        return self.predict_proba_preprocessed(*preprocess_text_batch(texts, self.token_matcher))
+
+    def predict_proba_preprocessed(self, cleaned_texts, manual_features):
+        self.scored_texts.extend(cleaned_texts)
+        probabilities = np.array([len(cleaned_text) / 1000 for cleaned_text in cleaned_texts])
+        return np.column_stack([1 - probabilities, probabilities])
+
+
+def cleaned_length(text, token_matcher):
+    return len(preprocess_text_batch([text], token_matcher)[0][0]) / 1000
+
+
+class TestNearDuplicates(TestCase):
+    def test_shingles(self):
+        # When / Then
+        self.assertSetEqual({"a b", "b c"}, shingles("a b c"))
+        self.assertSetEqual({"a"}, shingles("a"))
+        self.assertSetEqual({""}, shingles(""))
+
+    def test_query_finds_near_duplicates_only(self):
+        # Given
+        index = NearDuplicateIndex()
+        index.add(ORDER_TEXT, "order")
+        index.add(REFUND_TEXT, "refund")
+
+        # When
+        matches = index.query(ORDER_TEXT_VARIANT)
+
+        # Then
+        self.assertEqual(1, len(matches))
+        self.assertEqual((0, "order"), (matches[0][0], matches[0][2]))
+        self.assertGreaterEqual(matches[0][1], 0.8)
+        self.assertEqual([(1, 1.0, "refund")], index.query(REFUND_TEXT))
+        self.assertListEqual([], index.query("where my packag"))
+        np.testing.assert_array_equal(index.signature(ORDER_TEXT), NearDuplicateIndex().signature(ORDER_TEXT))
+
+    def test_save_and_load(self):
+        # Given
+        index = NearDuplicateIndex(num_perm=64, bands=8, version="v1")
+        index.add(ORDER_TEXT, [0.9, True])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "index")
+            index.save(path)
+            index.add(REFUND_TEXT, [0.1, True])
+            index.save(path)
+
+            # When
+            loaded_index = NearDuplicateIndex.load(path)
+
+        # Then
+        self.assertEqual(2, len(loaded_index))
+        self.assertEqual((64, 8, "v1"), (loaded_index.num_perm, loaded_index.bands, loaded_index.version))
+        np.testing.assert_array_equal(index.signatures, loaded_index.signatures)
+        self.assertEqual([(0, 1.0, [0.9, True])], loaded_index.query(ORDER_TEXT))
+
+    def test_groups_weights_and_deduplication(self):
+        # Given
+        cleaned_texts = [ORDER_TEXT, REFUND_TEXT, ORDER_TEXT_VARIANT, ORDER_TEXT, REFUND_TEXT]
+        labels = [1, 0, 1, 0, 0]
+
+        # When
+        groups = near_duplicate_groups(cleaned_texts)
+
+        # Then
+        np.testing.assert_array_equal([0, 1, 0, 0, 1], groups)
+        np.testing.assert_allclose([1 / 3, 1 / 2, 1 / 3, 1 / 3, 1 / 2], duplicate_weights(groups))
+        np.testing.assert_allclose([1 / 2, 1 / 2, 1 / 2, 1, 1 / 2], duplicate_weights(groups, labels))
+        np.testing.assert_array_equal([0, 1], deduplicate(groups))
+        np.testing.assert_array_equal([0, 1, 3], deduplicate(groups, labels))
+
+    def test_cached_scorer_reuses_near_duplicate_scores(self):
+        # Given
+        stub_scorer = StubScorer()
+        scorer = CachedScorer(stub_scorer, near_duplicates=NearDuplicateIndex(version="v1"))
+
+        # When
+        first_probabilities = scorer.predict_proba([ORDER_TEXT])
+        second_probabilities = scorer.predict_proba([ORDER_TEXT_VARIANT, REFUND_TEXT, ORDER_TEXT])
+        untranslated_probabilities = scorer.predict_proba([ORDER_TEXT_VARIANT], translate=False)
+
+        # Then
+        order, refund, variant = [cleaned_length(text, stub_scorer.token_matcher)
+                                  for text in (ORDER_TEXT, REFUND_TEXT, ORDER_TEXT_VARIANT)]
+        np.testing.assert_allclose([order], first_probabilities[:, 1])
+        np.testing.assert_allclose([order, refund, order], second_probabilities[:, 1])
+        np.testing.assert_allclose([variant], untranslated_probabilities[:, 1])
+        self.assertListEqual(preprocess_text_batch([ORDER_TEXT, REFUND_TEXT, ORDER_TEXT_VARIANT],
+                                                   stub_scorer.token_matcher)[0], stub_scorer.scored_texts)
+        self.assertListEqual([], stub_scorer.raw_texts)
+        self.assertEqual(3, len(scorer.near_duplicates))
+
+    def test_borrowed_scores_are_not_cached(self):
+        # Given
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "results.sqlite")
+            scorer = CachedScorer(StubScorer(), ResultCache(path), near_duplicates=NearDuplicateIndex(version="v1"))
+            scorer.predict_proba([ORDER_TEXT])
+            scorer.predict_proba([ORDER_TEXT_VARIANT])
+            exact_stub_scorer = StubScorer()
+            exact_scorer = CachedScorer(exact_stub_scorer, ResultCache(path))
+
+            # When
+            probabilities = exact_scorer.predict_proba([ORDER_TEXT, ORDER_TEXT_VARIANT])
+
+        # Then
+        order, variant = [cleaned_length(text, exact_stub_scorer.token_matcher)
+                          for text in (ORDER_TEXT, ORDER_TEXT_VARIANT)]
+        np.testing.assert_allclose([order, variant], probabilities[:, 1])
+        self.assertListEqual([ORDER_TEXT_VARIANT], exact_stub_scorer.raw_texts)
+
+    def test_cached_scorer_rejects_index_of_other_model_version(self):
+        # When / Then
+        with self.assertRaises(ValueError):
+            CachedScorer(StubScorer("v2"), near_duplicates=NearDuplicateIndex(version="v1"))
@@ -1,10 +1,17 @@
 from unittest import TestCase
 from preprocessing import get_avg_word_len, correct_spelling, translate_to_en, expand_contractions, \
     get_tokens, get_email_count, remove_emails, get_url_count, remove_urls, remove_single_characters, \
-    remove_special_characters, preprocess_raw_text
+    remove_special_characters, preprocess_raw_text, TokenMatcher, preprocess_text_series, preprocess_text_batch, \
+    get_manual_feature_names, get_pool, close_pool, MemoizedStemmer, ContractionExpander
+import preprocessing
+from contractions import contractions_dict
 import pandas as pd
+import numpy as np
 from nltk.stem import PorterStemmer
 import json
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
 
 TOKEN_DICTIONARY = {'_ADDRESS_': 'address_count',
                     '__ADDRESS__': 'address_count',
@@ -50,6 +57,10 @@ TOKEN_DICTIONARY = {'_ADDRESS_': 'address_count',
                     '__REFERENCE_NUMBER__': 'reference_number_count'}
 
 
+def has_spelling_dictionaries(_):
+    return preprocessing.sym_spell is not None
+
+
 class TestPreprocessing(TestCase):
     def test_translate_to_en(self):
         # Given
@@ -95,6 +106,33 @@ class TestPreprocessing(TestCase):
         self.assertEqual(expansion, "I will be right back with you I cannot wait to see you. "
                                     "I shall not forget and will not")
 
+    def test_contraction_expander_longest_match(self):
+        # Given
+        expander = ContractionExpander({"don't": "do not", "n't": "not", "y'all": "you all", "y'all'd": "you all would",
+                                        "gonna": "going to", "to cause": "to cause"})
+
+        # When / Then
+        self.assertEqual("I do notknow if you all would going to", expander.expand("I don'tknow if y'all'd gonna"))
+        self.assertEqual("we're going to", expander.expand("we're gonna"))
+        self.assertEqual("going to to cause", expander.expand("gonna to cause"))
+        self.assertEqual("nothing here", ContractionExpander({}).expand("nothing here"))
+
+    def test_expand_contractions_on_labeled_tickets(self):
+        # Given
+        tickets = pd.read_csv(os.path.join(DATA_DIR, "labeled_tickets.csv"), index_col=0)["Description"].astype(str)
+
+        # When
+        results = [expand_contractions(x) for x in tickets]
+
+        # Then
+        # The replace loop expanded "o'" before "who's", making "whofs". These are the only intended differences.
+        differences = [(expected, result) for expected, result in
+                       zip([_expand_contractions_one_by_one(x) for x in tickets], results) if expected != result]
+        self.assertEqual(2, len(differences))
+        for expected, result in differences:
+            self.assertIn("whofs", expected)
+            self.assertEqual(expected.replace("whofs", "who is"), result)
+
     def test_get_tokens(self):
         # Given
         tickets_series = pd.Series(
@@ -198,3 +236,151 @@ class TestPreprocessing(TestCase):
         self.assertEqual(0, processed_texts[1][1]["order_count"])
         self.assertEqual(1, processed_texts[1][1]["email_count"])
         self.assertEqual(3, processed_texts[1][1]["stop_word_count"])
+
+    def test_token_matcher_count_and_strip(self):
+        # Given
+        matcher = TokenMatcher(TOKEN_DICTIONARY)
+        texts = ["My order number is __ORDER_NUMBER__ , and __COMPANY__kept I contacted _COMPANY_and gave",
+                 "return my _PRODUCT_NAME__PRODUCT_NAME_  as it _DATE__PRODUCT__NAME__ and __DATE____ORDER_NUMBER__",
+                 "__NAME____ADDREDD__ _NAME__ADRRESS_ __ __ITEM_PHOTO_ ABC_URL_DEF no tokens here"]
+
+        # When
+        results = [matcher.count_and_strip(x) for x in texts]
+
+        # Then
+        for text, (stripped_text, counts) in zip(texts, results):
+            expected_text, expected_counts = _replace_tokens_one_by_one(text, TOKEN_DICTIONARY)
+            self.assertEqual(expected_text, stripped_text)
+            self.assertEqual(list(expected_counts.items()), list(counts.items()))
+
+    def test_token_matcher_on_labeled_tickets(self):
+        # Given
+        tickets = pd.read_csv(os.path.join(DATA_DIR, "labeled_tickets.csv"), index_col=0)["Description"].astype(str)
+        matcher = TokenMatcher.from_file(os.path.join(DATA_DIR, "token_dictionary.json"))
+
+        # When
+        results = [matcher.count_and_strip(x) for x in tickets]
+
+        # Then
+        for text, result in zip(tickets, results):
+            self.assertEqual(_replace_tokens_one_by_one(text, matcher.token_dictionary), result)
+
+    def test_token_matcher_rejects_malformed_tokens(self):
+        # Given
+        token_dictionary = {"__NAME__": "name_count", "NAME": "name_count"}
+
+        # When / Then
+        with self.assertRaises(ValueError):
+            TokenMatcher(token_dictionary)
+
+    def test_preprocess_text_batch(self):
+        # Given
+        tickets = pd.read_csv(os.path.join(DATA_DIR, "labeled_tickets.csv"), index_col=0)["Description"].astype(str)
+        tickets = tickets.iloc[:200]
+
+        # When
+        expected_df = preprocess_text_series(tickets, TOKEN_DICTIONARY)
+        texts, features = preprocess_text_batch(tickets, TOKEN_DICTIONARY)
+
+        # Then
+        self.assertEqual(np.float32, features.dtype)
+        self.assertListEqual(expected_df['text'].to_list(), texts)
+        self.assertListEqual(list(expected_df.columns[1:]), get_manual_feature_names(TOKEN_DICTIONARY))
+        np.testing.assert_allclose(expected_df.drop(columns='text').to_numpy(dtype=np.float64), features, rtol=1e-6)
+
+    def test_preprocess_text_series_as_matrix(self):
+        # Given
+        tickets = pd.Series(["Where is my order __ORDER_NUMBER__ ? I'm waiting since _DATE_", ""])
+
+        # When
+        texts, features = preprocess_text_series(tickets, TOKEN_DICTIONARY, as_matrix=True)
+
+        # Then
+        self.assertListEqual(["order wait", ""], texts)
+        self.assertEqual((2, 22), features.shape)
+        self.assertListEqual([0, 0, 0], features[1, :3].tolist())
+
+    def test_preprocess_empty_text_and_arguments(self):
+        # Given
+        tickets = pd.Series(["Where is my order __ORDER_NUMBER__ ?", ""])
+
+        # When
+        texts, features = preprocess_text_series(tickets, TOKEN_DICTIONARY, as_matrix=True,
+                                                 with_manual_features=False)
+        raw_text, manual_features = preprocess_raw_text("", TOKEN_DICTIONARY, MemoizedStemmer())
+
+        # Then
+        self.assertListEqual(["order"], texts[:1])
+        self.assertIsNone(features)
+        self.assertEqual("", raw_text)
+        self.assertEqual(0, manual_features["average_word_length"])
+        self.assertEqual(0, get_avg_word_len(" "))
+        with self.assertRaises(ValueError):
+            preprocess_text_series(tickets, TOKEN_DICTIONARY, n_jobs=0)
+
+    def test_preprocess_text_series_parallel(self):
+        # Given
+        tickets = pd.read_csv(os.path.join(DATA_DIR, "labeled_tickets.csv"), index_col=0)["Description"].astype(str)
+        tickets = tickets.iloc[:120].sample(frac=1, random_state=42)
+
+        # When
+        expected_df = preprocess_text_series(tickets, TOKEN_DICTIONARY)
+        parallel_df = preprocess_text_series(tickets, TOKEN_DICTIONARY, n_jobs=2, chunksize=7)
+        texts, features = preprocess_text_series(tickets, TOKEN_DICTIONARY, as_matrix=True, n_jobs=2, chunksize=7)
+        close_pool()
+        # The workers must not inherit the dictionaries loaded by the tests run in this process
+        preprocessing.sym_spell = None
+        workers_have_spelling_dictionaries = get_pool(2).map(has_spelling_dictionaries, range(2))
+        close_pool()
+
+        # Then
+        pd.testing.assert_frame_equal(expected_df, parallel_df)
+        self.assertListEqual(expected_df['text'].to_list(), texts)
+        self.assertEqual((120, 22), features.shape)
+        self.assertListEqual([True, True], workers_have_spelling_dictionaries)
+
+    def test_memoized_stemmer(self):
+        # Given
+        stemmer = MemoizedStemmer(max_entries=3)
+        stemmer.warm(["order", "return"])
+        words = ["ordered", "ordered", "returning", "order", "daughter"]
+
+        # When
+        stems = [stemmer.stem(word) for word in words]
+
+        # Then
+        self.assertListEqual([PorterStemmer().stem(word) for word in words], stems)
+        # "order" was the least recently used word when "returning" was added, so it was evicted
+        self.assertEqual({"hits": 1, "misses": 4, "entries": 3, "max_entries": 3}, stemmer.stats())
+
+    def test_preprocess_raw_text_removes_stop_words_before_special_characters(self):
+        # Given
+        text = "Can you call me, or email me at your convenience? a b"
+
+        # When
+        processed_text, manual_features = preprocess_raw_text(text, TOKEN_DICTIONARY, MemoizedStemmer())
+
+        # Then
+        # "me," is not a stop word because of the comma, so it is kept as "me" once the comma is removed
+        self.assertEqual("me email conveni", processed_text)
+        self.assertEqual(8, manual_features["stop_word_count"])
+
+
+def _replace_tokens_one_by_one(text, token_dictionary):
+    """
+    Reference implementation of the token step of preprocess_raw_text, counting and replacing one token at a time.
+    """
+    counts = dict()
+    for token in sorted(token_dictionary.keys(), key=len, reverse=True):
+        counts[token_dictionary[token]] = counts.get(token_dictionary[token], 0) + text.count(token)
+        text = text.replace(token, " ")
+    return text, counts
+
+
+def _expand_contractions_one_by_one(text):
+    """
+    Reference implementation of the former expand_contractions, replacing one contraction at a time.
+    """
+    for key, value in contractions_dict.items():
+        text = text.replace(key, value)
+    return text
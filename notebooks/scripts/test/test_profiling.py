@@ -0,0 +1,99 @@
+from unittest import TestCase
+from profiling import Histogram, PreprocessingProfiler
+from preprocessing import preprocess_text_series, close_pool
+import pandas as pd
+import json
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+STEPS = ["manual_features", "expand_contractions", "numeric_counts", "tokens", "lowercase", "emails", "urls",
+         "stop_words", "special_characters", "stemming"]
+
+
+class TestProfiling(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.text_series = pd.read_csv(os.path.join(DATA_DIR, "labeled_tickets.csv"), index_col=0)["Description"][:60]
+        with open(os.path.join(DATA_DIR, "token_dictionary.json"), "r") as token_dict_file:
+            cls.token_dictionary = json.load(token_dict_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        close_pool()
+
+    def test_profiled_preprocessing_gives_the_same_output(self):
+        # Given
+        expected_df = preprocess_text_series(self.text_series, self.token_dictionary)
+        expected_texts, expected_features = preprocess_text_series(self.text_series, self.token_dictionary,
+                                                                   as_matrix=True)
+        profiler = PreprocessingProfiler()
+
+        # When
+        text_df = preprocess_text_series(self.text_series, self.token_dictionary, profiler=profiler)
+        texts, features = preprocess_text_series(self.text_series, self.token_dictionary, as_matrix=True,
+                                                 profiler=profiler)
+
+        # Then
+        pd.testing.assert_frame_equal(expected_df, text_df)
+        self.assertListEqual(expected_texts, texts)
+        self.assertTrue((expected_features == features).all())
+        self.assertEqual(120, profiler.ticket_count)
+        self.assertListEqual(STEPS, list(profiler.step_seconds))
+        self.assertEqual(60, profiler.step_seconds["manual_features"].count)
+        self.assertEqual(120, profiler.step_seconds["stemming"].count)
+        self.assertEqual(2 * self.text_series.str.len().sum(), profiler.step_input_chars["expand_contractions"])
+
+    def test_pool_profilers_are_merged(self):
+        # Given
+        single_profiler = PreprocessingProfiler(outlier_seconds=0)
+        pool_profiler = PreprocessingProfiler(outlier_seconds=0)
+
+        # When
+        preprocess_text_series(self.text_series, self.token_dictionary, profiler=single_profiler)
+        preprocess_text_series(self.text_series, self.token_dictionary, n_jobs=2, chunksize=7, profiler=pool_profiler)
+
+        # Then
+        self.assertEqual(60, pool_profiler.ticket_count)
+        self.assertEqual(60, pool_profiler.outlier_count)
+        self.assertEqual(single_profiler.ticket_length.counts, pool_profiler.ticket_length.counts)
+        self.assertEqual(single_profiler.step_output_chars, pool_profiler.step_output_chars)
+        self.assertListEqual(list(range(60)), sorted(outlier["position"] for outlier in pool_profiler.outliers))
+
+    def test_outliers(self):
+        # Given
+        profiler = PreprocessingProfiler(outlier_seconds=0.1, max_outliers=2)
+
+        # When
+        for seconds in [0.05, 0.2, 0.5, 0.01, 0.3]:
+            profiler.record_ticket(seconds, 10, [("urls", seconds * 0.9, 10, 10), ("stemming", seconds * 0.1, 10, 5)])
+
+        # Then
+        self.assertEqual(3, profiler.outlier_count)
+        self.assertListEqual([2, 4], [outlier["position"] for outlier in profiler.outliers])
+        self.assertEqual("urls", profiler.outliers[0]["slowest_step"])
+
+    def test_export(self):
+        # Given
+        profiler = PreprocessingProfiler(outlier_seconds=None, seconds_buckets=[0.001, 0.01], length_buckets=[100])
+        profiler.record_ticket(0.002, 150, [("urls", 0.0005, 150, 120)])
+        profiler.record_ticket(0.02, 50, [("urls", 0.015, 50, 50)])
+
+        # When
+        prometheus_text = profiler.to_prometheus()
+        exported = json.loads(profiler.to_json())
+
+        # Then
+        self.assertIn('preprocessing_step_seconds_bucket{step="urls",le="0.001"} 1\n', prometheus_text)
+        self.assertIn('preprocessing_step_seconds_bucket{step="urls",le="0.01"} 1\n', prometheus_text)
+        self.assertIn('preprocessing_step_seconds_bucket{step="urls",le="+Inf"} 2\n', prometheus_text)
+        self.assertIn('preprocessing_step_seconds_count{step="urls"} 2\n', prometheus_text)
+        self.assertIn('preprocessing_step_input_chars_total{step="urls"} 200\n', prometheus_text)
+        self.assertIn('preprocessing_ticket_length_chars_bucket{le="100.0"} 1\n', prometheus_text)
+        self.assertEqual(2, exported["ticket_count"])
+        self.assertEqual([[0.001, 0], [0.01, 1], ["+Inf", 2]], exported["ticket_seconds"]["buckets"])
+
+    def test_histograms_with_different_buckets_cannot_be_merged(self):
+        # When / Then
+        with self.assertRaises(ValueError):
+            Histogram([1, 2]).merge(Histogram([1, 3]))
@@ -0,0 +1,114 @@
+from unittest import TestCase
+from rebalancing import chunked_kneighbors, ClassWeighting, HardNegativeUnderSampler, NearDuplicateWeighting, \
+    SparseSMOTE, SparseSMOTEENN
+from experiment_grid import run_grid
+from imblearn.combine import SMOTEENN
+from imblearn.over_sampling import SMOTE
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold, cross_validate
+from sklearn.neighbors import NearestNeighbors
+from scipy.sparse import random as sparse_random
+import numpy as np
+import tempfile
+import os
+
+
+class TestRebalancing(TestCase):
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.matrix = sparse_random(200, 50, density=0.2, format="csr", random_state=random_state)
+        self.labels = np.array([1] * 30 + [0] * 170)
+
+    def test_chunked_kneighbors_matches_nearest_neighbors(self):
+        # Given
+        expected_distances, expected_indices = NearestNeighbors(n_neighbors=4).fit(self.matrix).kneighbors()
+
+        # When
+        distances, indices = chunked_kneighbors(self.matrix, n_neighbors=4, working_memory=0.01)
+
+        # Then
+        np.testing.assert_allclose(expected_distances, distances, atol=1e-7)
+        np.testing.assert_array_equal(expected_indices, indices)
+
+    def test_sparse_smote_matches_imblearn(self):
+        # Given
+        expected_matrix, expected_labels = SMOTE(random_state=42).fit_resample(self.matrix, self.labels)
+
+        # When
+        matrix, labels = SparseSMOTE(random_state=42, working_memory=0.01).fit_resample(self.matrix, self.labels)
+
+        # Then
+        self.assertEqual("csr", matrix.format)
+        np.testing.assert_allclose(expected_matrix.toarray(), matrix.toarray())
+        np.testing.assert_array_equal(expected_labels, labels)
+
+    def test_sparse_smoteenn_matches_imblearn(self):
+        # Given
+        expected_matrix, expected_labels = SMOTEENN(random_state=42).fit_resample(self.matrix, self.labels)
+
+        # When
+        matrix, labels = SparseSMOTEENN(random_state=42).fit_resample(self.matrix, self.labels)
+
+        # Then
+        np.testing.assert_allclose(expected_matrix.toarray(), matrix.toarray())
+        np.testing.assert_array_equal(expected_labels, labels)
+
+    def test_hard_negative_under_sampler(self):
+        # Given
+        sampler = HardNegativeUnderSampler(sampling_strategy=0.5, hard_fraction=0.5, random_state=0)
+        distances, _ = chunked_kneighbors(self.matrix[30:], self.matrix[:30], n_neighbors=1)
+        hardest_rows = 30 + np.argsort(distances[:, 0], kind="stable")[:30]
+
+        # When
+        matrix, labels = sampler.fit_resample(self.matrix, self.labels)
+
+        # Then
+        self.assertEqual(90, matrix.shape[0])
+        np.testing.assert_array_equal([60, 30], np.bincount(labels))
+        kept_rows = {tuple(row) for row in matrix.toarray()}
+        for row in list(range(30)) + list(hardest_rows):
+            self.assertIn(tuple(self.matrix[row].toarray()[0]), kept_rows)
+
+    def test_class_weighting_in_run_grid(self):
+        # Given
+        cv = StratifiedKFold(n_splits=3)
+        model = LogisticRegression()
+        expected = cross_validate(model, self.matrix, self.labels, scoring=["f1"], cv=cv,
+                                  fit_params={"sample_weight": np.where(self.labels == 1, 200 / 60, 200 / 340)})
+
+        # When
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results_df = run_grid(self.matrix, self.labels, {"class_weighting": ClassWeighting()},
+                                  {"Logistic Regression": model}, os.path.join(tmp_dir, "results.csv"), cv=cv,
+                                  scoring=["f1"], n_jobs=1, cache_dir=tmp_dir)
+
+        # Then
+        self.assertAlmostEqual(expected["test_f1"].mean(), results_df.loc[0, "test_f1"])
+
+    def test_rebalancing_needs_two_classes(self):
+        # When / Then
+        with self.assertRaises(ValueError):
+            SparseSMOTE().fit_resample(self.matrix, np.zeros(200))
+
+    def test_near_duplicate_weighting(self):
+        # Given
+        groups = np.arange(200)
+        groups[[1, 2]] = 0
+        groups[[31, 32]] = 30
+
+        # When
+        weighting = NearDuplicateWeighting(groups)
+        weighted_matrix, weighted_labels = weighting.fit_resample(self.matrix, self.labels)
+        sampler = NearDuplicateWeighting(groups, deduplicate=True)
+        deduplicated_matrix, deduplicated_labels = sampler.fit_resample(self.matrix, self.labels)
+
+        # Then
+        self.assertEqual(self.matrix.shape, weighted_matrix.shape)
+        expected_weights = np.ones(200)
+        expected_weights[[0, 1, 2, 30, 31, 32]] = 1 / 3
+        np.testing.assert_allclose(expected_weights, weighting.sample_weight_)
+        self.assertEqual(200 - 4, deduplicated_matrix.shape[0])
+        self.assertIsNone(sampler.sample_weight_)
+        np.testing.assert_array_equal(self.labels[np.setdiff1d(np.arange(200), [1, 2, 31, 32])], deduplicated_labels)
+        with self.assertRaises(ValueError):
+            NearDuplicateWeighting(groups[:10]).fit_resample(self.matrix, self.labels)
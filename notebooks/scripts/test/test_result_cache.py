@@ -0,0 +1,77 @@
+from unittest import TestCase
+from disk_cache import MISSING
+from result_cache import CachedScorer, ResultCache
+import numpy as np
+import tempfile
+import os
+
+
+class StubScorer:
+    """
+    Local scorer which gives every text a probability of its length divided by 100, and counts the texts it scores.
+    """
+    def __init__(self, version="v1"):
+        self.version = version
+        self.scored_texts = []
+
+    def predict_proba(self, texts, translate=True):
+        texts = list(texts)
+        self.scored_texts.extend(texts)
+        probabilities = np.array([len(text) / 100 for text in texts])
+        return np.column_stack([1 - probabilities, probabilities])
+
+
+class TestResultCache(TestCase):
+    def test_cached_scorer_scores_every_text_once(self):
+        # Given
+        stub_scorer = StubScorer()
+        scorer = CachedScorer(stub_scorer)
+        texts = ["Where is my order?", "hi", "Where is my order?"]
+
+        # When
+        first_probabilities = scorer.predict_proba(texts)
+        second_probabilities = scorer.predict_proba(texts + ["refund"])
+
+        # Then
+        np.testing.assert_allclose([0.18, 0.02, 0.18], first_probabilities[:, 1])
+        np.testing.assert_allclose([0.18, 0.02, 0.18, 0.06], second_probabilities[:, 1])
+        np.testing.assert_allclose(1, second_probabilities.sum(axis=1))
+        self.assertListEqual(["Where is my order?", "hi", "refund"], stub_scorer.scored_texts)
+        self.assertEqual(3, scorer.cache.stats()["hits"])
+        self.assertEqual("v1", scorer.version)
+
+    def test_cache_is_keyed_by_model_version_and_translate_flag(self):
+        # Given
+        cache = ResultCache()
+
+        # When
+        cache.put("Where is my order?", "v1", 0.9)
+
+        # Then
+        self.assertEqual(0.9, cache.get("Where is my order?", "v1"))
+        self.assertIs(MISSING, cache.get("Where is my order?", "v2"))
+        self.assertIs(MISSING, cache.get("Where is my order?", "v1", translate=False))
+
+    def test_cache_is_shared_through_sqlite_file(self):
+        # Given
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "results.sqlite")
+            first_scorer = CachedScorer(StubScorer(), ResultCache(path))
+            first_scorer.predict_proba(["Where is my order?"])
+            first_scorer.cache.close()
+
+            # When
+            stub_scorer = StubScorer()
+            second_scorer = CachedScorer(stub_scorer, ResultCache(path))
+            probabilities = second_scorer.predict_proba(["Where is my order?"])
+            second_scorer.cache.close()
+
+        # Then
+        self.assertListEqual([], stub_scorer.scored_texts)
+        self.assertAlmostEqual(0.18, probabilities[0, 1])
+        self.assertEqual(1, second_scorer.cache.stats()["disk_hits"])
+
+    def test_cached_scorer_needs_a_version(self):
+        # When / Then
+        with self.assertRaises(ValueError):
+            CachedScorer(StubScorer(version=None))
@@ -0,0 +1,87 @@
+from unittest import TestCase
+from model_bundle import load_bundle, default_bundle_dir
+from score_tickets import detect_format, iter_json_array, iter_records, iter_tickets, score_file
+import numpy as np
+import tempfile
+import warnings
+import json
+import io
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+RECORDS = [{"id": 10, "Description": "Where is my order? I ordered 3 weeks ago __ORDER_NUMBER__ and still nothing"},
+           {"id": 11, "Description": "hi i want to register a coupon"},
+           {"id": 12, "Description": None},
+           {"id": 13, "Description": "Hi regarding my order __ORDER_NUMBER__ I just wanted to know if I can change "
+                                     "__PRODUCT_NAME__ with __PRODUCT_NAME__"},
+           {"id": 14, "Description": "Can I get a refund for my order?"}]
+
+
+class TestScoreTickets(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            cls.scorer = load_bundle(default_bundle_dir(data_dir=DATA_DIR))
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.tmp_dir.name, "tickets.json")
+        with open(self.input_path, "w") as input_file:
+            json.dump(RECORDS, input_file)
+        self.output_path = os.path.join(self.tmp_dir.name, "scores.jsonl")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read_output(self):
+        with open(self.output_path, "r") as output_file:
+            return [json.loads(line) for line in output_file]
+
+    def test_iter_json_array_with_small_chunks(self):
+        # Given
+        text = json.dumps(RECORDS + [1.25, "a, ] b", [], -30])
+
+        # When
+        elements = list(iter_json_array(io.StringIO(text), chunk_size=3))
+
+        # Then
+        self.assertEqual(json.loads(text), elements)
+
+    def test_iter_tickets_from_csv(self):
+        # When
+        tickets = list(iter_tickets(iter_records(os.path.join(DATA_DIR, "labeled_tickets.csv"))))
+
+        # Then
+        self.assertEqual("csv", detect_format(os.path.join(DATA_DIR, "labeled_tickets.csv")))
+        self.assertEqual("json", detect_format(os.path.join(DATA_DIR, "technical_test_data.json")))
+        self.assertEqual(1433, len(tickets))
+        self.assertEqual("0", tickets[0][0])
+        self.assertTrue(tickets[0][1].startswith("- __EMAIL__ Hi"))
+
+    def test_score_file(self):
+        # When
+        stats = score_file(self.input_path, self.output_path, self.scorer, batch_size=2, translate=False, log=None)
+
+        # Then
+        texts = [record["Description"] or "" for record in RECORDS]
+        expected = self.scorer.predict_proba(texts, translate=False)[:, 1]
+        output = self.read_output()
+        self.assertEqual(5, stats["records"])
+        self.assertEqual([record["id"] for record in RECORDS], [line["id"] for line in output])
+        np.testing.assert_allclose(expected, [line["probability"] for line in output], atol=1e-6)
+        self.assertEqual([int(probability >= 0.5) for probability in expected], [line["label"] for line in output])
+
+    def test_score_file_resumes_from_checkpoint(self):
+        # Given
+        score_file(self.input_path, self.output_path, self.scorer, batch_size=2, translate=False, limit=4, log=None)
+        with open(self.output_path, "a") as output_file:
+            output_file.write('{"id": 14, "probabil')
+
+        # When
+        stats = score_file(self.input_path, self.output_path, self.scorer, batch_size=2, translate=False, log=None)
+
+        # Then
+        self.assertEqual({"records": 1, "skipped": 4}, {key: stats[key] for key in ["records", "skipped"]})
+        self.assertEqual([record["id"] for record in RECORDS], [line["id"] for line in self.read_output()])
@@ -0,0 +1,150 @@
+from unittest import TestCase
+from model_bundle import load_bundle, default_bundle_dir
+from scoring_service import LatencyRecorder, MicroBatcher, ScoringService, HttpError, read_request
+import numpy as np
+import http.client
+import warnings
+import asyncio
+import json
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+
+TEXTS = ["Where is my order? I ordered 3 weeks ago __ORDER_NUMBER__ and still nothing",
+         "hi i want to register a coupon",
+         "Hi regarding my order __ORDER_NUMBER__ I just wanted to know if I can change __PRODUCT_NAME__ with "
+         "__PRODUCT_NAME__"]
+
+
+def request(port, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+class TestScoringService(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            cls.scorer = load_bundle(default_bundle_dir(data_dir=DATA_DIR))
+
+    def test_latency_recorder_percentiles(self):
+        # Given
+        recorder = LatencyRecorder(window=100)
+
+        # When
+        for milliseconds in range(1, 201):
+            recorder.record(milliseconds / 1000)
+
+        # Then
+        self.assertEqual(200, recorder.count)
+        self.assertAlmostEqual(150.5, recorder.percentiles()["p50"])
+
+    def test_micro_batcher_coalesces_concurrent_requests(self):
+        # Given
+        batches = []
+
+        def score_function(texts):
+            batches.append(list(texts))
+            return [len(text) for text in texts]
+
+        async def submit_all():
+            batcher = MicroBatcher(score_function, max_batch_size=10, max_wait=0.05)
+            batcher.start()
+            try:
+                return await asyncio.gather(*[batcher.submit(["a" * size] * 2) for size in range(1, 6)])
+            finally:
+                await batcher.stop()
+
+        # When
+        results = asyncio.run(submit_all())
+
+        # Then
+        self.assertEqual([[size, size] for size in range(1, 6)], results)
+        self.assertEqual([10], [len(batch) for batch in batches])
+
+    def test_micro_batcher_isolates_a_failing_request(self):
+        # Given
+        batches = []
+
+        def score_function(texts):
+            batches.append(list(texts))
+            if "poison" in texts:
+                raise ValueError("Cannot score poison")
+            return [len(text) for text in texts]
+
+        async def submit_all():
+            batcher = MicroBatcher(score_function, max_batch_size=10, max_wait=0.05)
+            batcher.start()
+            try:
+                return await asyncio.gather(batcher.submit(["ok", "fine"]), batcher.submit(["poison"]),
+                                            return_exceptions=True)
+            finally:
+                await batcher.stop()
+
+        # When
+        healthy, poisoned = asyncio.run(submit_all())
+
+        # Then
+        self.assertEqual([2, 4], healthy)
+        self.assertIsInstance(poisoned, ValueError)
+        self.assertEqual([["ok", "fine", "poison"], ["ok", "fine"], ["poison"]], batches)
+
+    def test_classify_over_http(self):
+        # Given
+        service = ScoringService(self.scorer, max_wait=0.001, translate=False)
+
+        async def run_requests():
+            server = await service.start(port=0)
+            port = server.sockets[0].getsockname()[1]
+            loop = asyncio.get_running_loop()
+            try:
+                return await asyncio.gather(
+                    loop.run_in_executor(None, request, port, "POST", "/classify", json.dumps({"texts": TEXTS})),
+                    loop.run_in_executor(None, request, port, "POST", "/classify", json.dumps({"text": TEXTS[0]})),
+                    loop.run_in_executor(None, request, port, "POST", "/classify", "not json"),
+                    loop.run_in_executor(None, request, port, "GET", "/classify"),
+                    loop.run_in_executor(None, request, port, "GET", "/unknown"))
+            finally:
+                metrics = service.metrics()
+                await service.stop(server)
+                self.assertEqual(2, service.latencies.count)
+                self.assertEqual(3, metrics["errors"])
+
+        # When
+        many, single, bad_json, wrong_method, unknown = asyncio.run(run_requests())
+
+        # Then
+        expected = self.scorer.predict_proba(TEXTS, translate=False)[:, 1]
+        self.assertEqual(200, many[0])
+        np.testing.assert_allclose(expected, [result["probability"] for result in many[1]["results"]])
+        self.assertEqual(self.scorer.version, many[1]["model_version"])
+        self.assertEqual(200, single[0])
+        self.assertAlmostEqual(expected[0], single[1]["probability"])
+        self.assertEqual(int(expected[0] >= 0.5), single[1]["label"])
+        self.assertEqual([400, 405, 404], [bad_json[0], wrong_method[0], unknown[0]])
+
+    def test_read_request_rejects_malformed_lengths(self):
+        # Given
+        async def read(data, limit=1 << 16):
+            reader = asyncio.StreamReader(limit=limit)
+            reader.feed_data(data)
+            reader.feed_eof()
+            return await read_request(reader)
+
+        requests = [b"POST /classify HTTP/1.1\r\nContent-Length: -5\r\n\r\nhello",
+                    b"POST /classify HTTP/1.1\r\nX-Long: " + b"a" * 200 + b"\r\n\r\n"]
+
+        for data in requests:
+            # When / Then
+            with self.assertRaises(HttpError) as context:
+                asyncio.run(read(data, limit=100))
+            self.assertEqual(400, context.exception.status)
+            self.assertTrue(context.exception.close)
+        self.assertEqual(("POST", "/classify", True, b"hello"),
+                         asyncio.run(read(b"POST /classify HTTP/1.1\r\nContent-Length: 5\r\n\r\nhello")))
@@ -0,0 +1,55 @@
+from unittest import TestCase
+from spelling import save_index, load_index, MappedCounts
+from symspellpy import SymSpell
+import numpy as np
+import tempfile
+import os
+
+
+class TestSpelling(TestCase):
+    def setUp(self):
+        self.sym_spell = SymSpell(max_dictionary_edit_distance=2, prefix_length=7)
+        for word, count in [("receipt", 500), ("clear", 900), ("broke", 300), ("invest", 200), ("not", 5000),
+                            ("drive", 400), ("hop", 100), ("in", 9000)]:
+            self.sym_spell.create_dictionary_entry(word, count)
+        self.sym_spell._bigrams.update({"not drive": 50, "hop in": 20})
+
+    def test_load_index_without_index(self):
+        # Given
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # When
+            sym_spell = load_index(os.path.join(tmp_dir, "spelling_index"))
+
+        # Then
+        self.assertIsNone(sym_spell)
+
+    def test_saved_index_gives_same_corrections(self):
+        # Given
+        text = "reciept notdrive cleer hopin borke inveat"
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_dir = os.path.join(tmp_dir, "spelling_index")
+
+            # When
+            save_index(self.sym_spell, index_dir)
+            mapped_sym_spell = load_index(index_dir)
+
+            # Then
+            self.assertIsInstance(mapped_sym_spell.words, MappedCounts)
+            self.assertDictEqual(dict(self.sym_spell.words), dict(mapped_sym_spell.words))
+            self.assertDictEqual({key: list(value) for key, value in self.sym_spell.deletes.items()},
+                                 dict(mapped_sym_spell.deletes))
+            self.assertEqual(self.sym_spell.lookup_compound(text, max_edit_distance=2)[0].term,
+                             mapped_sym_spell.lookup_compound(text, max_edit_distance=2)[0].term)
+
+    def test_mapped_counts_missing_keys(self):
+        # Given
+        counts = MappedCounts(np.array([b"abc", b"abd"]), np.array([1, 2]))
+
+        # When / Then
+        self.assertNotIn("abcd", counts)
+        self.assertNotIn("ab", counts)
+        self.assertNotIn(3, counts)
+        self.assertEqual(2, counts["abd"])
+        with self.assertRaises(KeyError):
+            counts["zzz"]
@@ -0,0 +1,87 @@
+from unittest import TestCase
+from token_discovery import TokenCounts, count_tokens, discover_tokens, normalize_token, closest_form, \
+    split_glued_token, propose_token_dictionary, diff_token_dictionaries
+from preprocessing import get_tokens
+import pandas as pd
+import tempfile
+import json
+import os
+
+TOKEN_DICTIONARY = {"_COMPANY_": "company_name_count",
+                    "__COMPANY__": "company_name_count",
+                    "_NAME_": "name_count",
+                    "__ADDRESS__": "address_count",
+                    "_DATE_": "date_count",
+                    "_PRODUCT_NAME_": "product_count",
+                    "__ORDER_NUMBER__": "order_count"}
+
+TEXTS = ["My order number is __ORDER_NUMBER__ , and __COMPANY__kept I contacted _COMPANNY_and gave",
+         "I bought __PRODUCTS__ at _COMPANY___ on _DATE__NAME_, send it to _NAME__ADRRESS_",
+         "_COMPANNY_ _COMPANNY_ __ACCOUNT_ID__ __ACCOUNT_IDS__",
+         "Nothing here", "", "__ACCOUNT_ID__"]
+
+
+class TestTokenDiscovery(TestCase):
+    def test_count_and_merge_tokens(self):
+        # When
+        counts = count_tokens(TEXTS[:3]).merge(count_tokens(TEXTS[3:]))
+
+        # Then
+        self.assertEqual(len(TEXTS), counts.ticket_total)
+        self.assertSetEqual(get_tokens(pd.Series(TEXTS)), set(counts.occurrences))
+        self.assertEqual(3, counts.occurrences["_COMPANNY_"])
+        self.assertEqual(2, counts.tickets["_COMPANNY_"])
+        self.assertEqual(2, counts.occurrences["__ACCOUNT_ID__"])
+        loaded_counts = TokenCounts.from_dict(json.loads(json.dumps(counts.to_dict())))
+        self.assertEqual(counts.occurrences, loaded_counts.occurrences)
+        self.assertEqual(counts.tickets, loaded_counts.tickets)
+
+    def test_discover_tokens_in_parallel_chunks(self):
+        # Given
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "tickets.jsonl")
+            with open(path, "w") as ticket_file:
+                for position, text in enumerate(TEXTS * 10):
+                    ticket_file.write(json.dumps({"id": position, "Description": text}) + "\n")
+
+            # When
+            counts = discover_tokens(path, chunk_size=7, n_jobs=2)
+
+        # Then
+        expected_counts = count_tokens(TEXTS * 10)
+        self.assertEqual(expected_counts.ticket_total, counts.ticket_total)
+        self.assertDictEqual(dict(expected_counts.occurrences), dict(counts.occurrences))
+        self.assertDictEqual(dict(expected_counts.tickets), dict(counts.tickets))
+
+    def test_normalize_and_match_tokens(self):
+        # When / Then
+        self.assertEqual("PRODUCT_NAME", normalize_token("__PRODUCTS__NAMES__"))
+        self.assertEqual("COMPANY", normalize_token("_COMPANY___"))
+        self.assertEqual(("COMPANY", 1), closest_form("COMPANNY", ["NAME", "COMPANY", "COMPANY_NAME"]))
+        self.assertEqual(("ADDRES", 1), closest_form(normalize_token("_ADRRESS_"), ["ADDRES"]))
+        self.assertIsNone(closest_form("NAME", ["DATE"]))
+        self.assertListEqual(["_NAME_", "_ADRRESS_"], split_glued_token("_NAME__ADRRESS_"))
+        self.assertListEqual(["_NUMBER_"], split_glued_token("_NUMBER__"))
+
+    def test_propose_token_dictionary(self):
+        # Given
+        counts = count_tokens(TEXTS)
+
+        # When
+        proposed, report = propose_token_dictionary(counts, TOKEN_DICTIONARY, min_count=2, keep_unseen=False)
+        diff = diff_token_dictionaries(TOKEN_DICTIONARY, proposed)
+
+        # Then
+        statuses = dict(zip(report["token"], report["status"]))
+        self.assertDictEqual({"__ORDER_NUMBER__": "existing", "__COMPANY__": "existing", "_COMPANNY_": "fuzzy",
+                              "__PRODUCTS__": "rare", "_COMPANY___": "covered", "_DATE__NAME_": "covered",
+                              "_NAME__ADRRESS_": "glued", "__ACCOUNT_ID__": "new", "__ACCOUNT_IDS__": "normalized"},
+                             statuses)
+        self.assertDictEqual({"_COMPANNY_": "company_name_count", "_ADRRESS_": "address_count",
+                              "__ACCOUNT_ID__": "account_id_count", "__ACCOUNT_IDS__": "account_id_count"},
+                             diff["added"])
+        self.assertDictEqual({"_COMPANY_": "company_name_count", "__ADDRESS__": "address_count", "_DATE_": "date_count",
+                              "_PRODUCT_NAME_": "product_count"}, diff["removed"])
+        self.assertListEqual(["account_id_count"], diff["added_groups"])
+        self.assertListEqual(["date_count", "product_count"], diff["removed_groups"])
+        self.assertDictEqual({}, diff["regrouped"])
@@ -0,0 +1,87 @@
+from unittest import TestCase
+from translation import TranslationCache, CachedTranslator, MISSING
+import tempfile
+import os
+
+
+class StubBackend:
+    """
+    Local translation backend which "translates" by upper casing every text that starts with "Hallo".
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def translate_to_en(self, text):
+        self.calls += 1
+        return text.upper() if text.startswith("Hallo") else text
+
+
+class TestTranslation(TestCase):
+    def test_translator_calls_backend_once_per_text(self):
+        # Given
+        backend = StubBackend()
+        translator = CachedTranslator(backend)
+        texts = ["Where is my order?", "Hallo, wo ist meine Bestellung?"] * 3
+
+        # When
+        translated_texts = [translator.translate_to_en(x) for x in texts]
+
+        # Then
+        self.assertListEqual(["Where is my order?", "HALLO, WO IST MEINE BESTELLUNG?"] * 3, translated_texts)
+        self.assertEqual(2, backend.calls)
+        self.assertEqual(4, translator.cache.stats()["hits"])
+        self.assertEqual(2, translator.cache.stats()["misses"])
+
+    def test_cache_persists_between_instances(self):
+        # Given
+        texts = ["Where is my order?", "Hallo, wo ist meine Bestellung?"]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "translations.sqlite")
+            first_translator = CachedTranslator(StubBackend(), TranslationCache(path))
+            for text in texts:
+                first_translator.translate_to_en(text)
+            first_translator.cache.close()
+
+            # When
+            second_backend = StubBackend()
+            second_translator = CachedTranslator(second_backend, TranslationCache(path))
+            translated_texts = [second_translator.translate_to_en(x) for x in texts]
+            second_translator.cache.close()
+
+        # Then
+        self.assertEqual(0, second_backend.calls)
+        self.assertListEqual(["Where is my order?", "HALLO, WO IST MEINE BESTELLUNG?"], translated_texts)
+        self.assertEqual(2, second_translator.cache.stats()["disk_hits"])
+
+    def test_cache_evicts_least_recently_used(self):
+        # Given
+        cache = TranslationCache(max_memory_entries=2)
+
+        # When
+        cache.put("a", "A")
+        cache.put("b", None)
+        cache.get("a")
+        cache.put("c", "C")
+        results = [cache.get(x) for x in ["a", "b", "c"]]
+
+        # Then
+        self.assertListEqual(["A", MISSING, "C"], results)
+        self.assertEqual(1, cache.stats()["evictions"])
+
+    def test_cache_bounds_disk_entries(self):
+        # Given
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "translations.sqlite")
+            cache = TranslationCache(path, max_memory_entries=1, max_disk_entries=2)
+
+            # When
+            for text in ["a", "b", "c"]:
+                cache.put(text, text.upper())
+            cache.close()
+            new_cache = TranslationCache(path)
+            results = [new_cache.get(x) for x in ["a", "b", "c"]]
+            new_cache.close()
+
+        # Then
+        self.assertListEqual([MISSING, "B", "C"], results)
@@ -1,5 +1,8 @@
 import unittest
-from experiment import enhance_text
+from experiment import enhance_text, enhance_series
+from async_translation import AsyncTranslationClient
+from test_async_translation import FakeTranslationBackend
+import pandas as pd
 
 
 class MyTestCase(unittest.TestCase):
@@ -17,3 +20,15 @@ class MyTestCase(unittest.TestCase):
             self.assertNotEqual(original_text, text)
         # print('\n'.join(enhanced_texts))
 
+    def test_enhance_series(self):
+        # Given
+        texts = pd.Series(["Where is my order?", "My parcel never arrived"])
+        client = AsyncTranslationClient(FakeTranslationBackend())
+
+        # When
+        enhanced_texts = enhance_series(texts, ['de', 'fr'], client)
+
+        # Then
+        self.assertListEqual(["Where is my order? (from de)", "Where is my order? (from fr)",
+                              "My parcel never arrived (from de)", "My parcel never arrived (from fr)"],
+                             enhanced_texts.to_list())